@@ -1,11 +1,17 @@
 import os
 import sys
+import threading
 
 # Add project root directory to Python path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 
+from src.database.archive import DataArchiver
+from src.database.backup_job import DatabaseBackupJob
 from src.database.database_system import DatabaseManager
+from src.database.event_journal import DatabaseEventJournal
+from src.database.passwords import CredentialVerifier
+from src.database.usage_quota import UsageQuotaEngine
 from src.speech.baidu_speech_integration import SpeechInteractionManager
 from src.emotion.emotion_recognition import EmotionRecognitionSystem
 from src.speech.speech_module_integration import integrate_speech_module
@@ -16,13 +22,40 @@ class MainProgram:
     def __init__(self):
         """Initialize main program"""
         # Initialize database
-        self.database = DatabaseManager()
+        # Pooled mode keeps one warm connection per thread (UI, recording, emotion);
+        # WAL lets the parent dashboard read while the child side is writing;
+        # repeated user/child/settings/habit lookups are served from a small cache
+        self.database = DatabaseManager(pool_size=4, storage_profile="wal", cache_size=256)
         self.database.initialize_database()
         
+        # Usage/habit/progress events are written behind the GUI thread
+        self.event_journal = DatabaseEventJournal(self.database)
+        self.event_journal.start()
+        
+        # Daily time limits and disabled periods, answered from memory and checkpointed every minute
+        self.quota_engine = UsageQuotaEngine(self.database, checkpoint_interval=60)
+        self.event_journal.quota_engine = self.quota_engine
+        self.quota_engine.start()
+        self.database.changes.subscribe(lambda change: self.quota_engine.reload_settings(change.row['child_id']),
+                                        tables=['parental_control_settings'])
+        
+        # Password checks (scrypt) run on a worker thread, never on the GUI thread
+        self.credential_verifier = CredentialVerifier(self.database)
+        
+        # Daily compressed snapshot, copied in small steps so the child UI never stalls
+        self.backup_job = DatabaseBackupJob(self.database.database_path, compress=True, keep=7)
+        
+        # Usage and habit records older than half a year move to monthly archives
+        # (joined on exit, so a run is never cut off between writing an archive and deleting the rows)
+        self.archiver = DataArchiver(self.database, horizon_days=180)
+        self.archiver_thread = threading.Thread(target=self.archiver.run, name="DataArchiver")
+        self.archiver_thread.start()
+        
         # Initialize speech interaction system
         # Note: When actually using, need to replace with real API keys
         # self.speech_system = SpeechInteractionManager("your_app_id", "your_api_key", "your_secret_key")
         self.speech_system = SpeechInteractionManager("6632791", "u3Rn2MPnawYg6y1GvxDtuAPk","v3bvbSHK3hLmsKnoMkPTk8ApqlPBvPtB")
+        self.speech_system.event_journal = self.event_journal
         # Initialize emotion recognition system
         self.emotion_system = EmotionRecognitionSystem()
         
@@ -48,11 +81,29 @@ class MainProgram:
 
         # 修改后的代码
         window = ChildrenMainInterface()
+        window.event_journal = self.event_journal
+        window.attach_backup_job(self.backup_job)
+        window.attach_credential_verifier(self.credential_verifier)
+        window.attach_quota_engine(self.quota_engine)
+        self.backup_job.schedule(24 * 60 * 60)
         integrate_speech_module(window, self.speech_system)  # 添加了这一行
         window.show()
         
         # Run application
-        sys.exit(app.exec_())
+        exit_code = app.exec_()
+        self.archiver.stop()
+        self.archiver_thread.join()
+        self.event_journal.close()
+        self.quota_engine.stop()
+        self.backup_job.stop()
+        # Once per install: older databases switch to incremental auto-vacuum so
+        # the archiver can shrink the file (a full VACUUM, done while nothing writes)
+        self.archiver.convert_to_incremental_vacuum()
+        self.credential_verifier.shutdown(wait=False)
+        self.database.close_pool()
+        if self.database.profiler:
+            self.database.profiler.write_report()
+        sys.exit(exit_code)
 
 if __name__ == "__main__":
     # Create and start main program
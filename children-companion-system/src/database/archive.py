@@ -0,0 +1,317 @@
+import os
+import csv
+import gzip
+import sqlite3
+import threading
+
+from src.database.usage_rollup import rollup_complete
+
+# Retention and archival of old activity rows
+#
+# usage_records and habit_completion_records older than the retention
+# horizon are moved out of the live database into one archive per month,
+# either a SQLite file (archive_YYYY_MM.db, same table definitions) or a
+# gzipped CSV per table (usage_records_YYYY_MM.csv.gz).
+#
+# Rows are only archived once nothing live needs them anymore:
+#   - usage records must be finished and already folded into
+#     usage_daily_rollup, which keeps answering get_usage_statistics;
+#   - habit completions were already counted into habit_stats when they were
+#     recorded, so get_habit_list keeps its counts and streaks.
+#
+# Every batch is first written to the archive and only then deleted from the
+# live database, in one transaction with the catalog update. An
+# interrupted run therefore at worst writes a batch to the archive twice;
+# readers skip such duplicates by primary key.
+#
+# New databases are created with auto_vacuum=INCREMENTAL (see
+# MigrationRunner.upgrade), and their freed pages are returned to the file
+# system in small incremental_vacuum steps. Older databases keep freed pages
+# on the freelist, where SQLite reuses them for new rows. Switching them over
+# needs one full VACUUM, which blocks every writer for its duration, so it
+# is never done by run(). convert_to_incremental_vacuum() does it as a
+# separate maintenance step; main.py calls it at shutdown, once the archiver,
+# journal and quota engine have stopped writing, and it is a no-op after the
+# first conversion.
+#
+# run() checks stop() between batches, so the application can end a run
+# quickly at shutdown and join the archiver thread.
+
+CREATE_ARCHIVE_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS archived_months (
+        table_name TEXT NOT NULL,
+        month TEXT NOT NULL,  -- YYYY-MM
+        location TEXT NOT NULL,  -- archive file holding the rows
+        row_count INTEGER NOT NULL DEFAULT 0,
+        archive_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (table_name, month)
+    ) WITHOUT ROWID
+    """,
+]
+
+# Archivable tables: primary key, timestamp column, extra condition on live rows
+# and the index created in SQLite archives
+ARCHIVED_TABLES = {
+    'usage_records': {
+        'key': 'record_id',
+        'time_column': 'start_time',
+        'condition': "duration IS NOT NULL",
+        'archive_index': "(user_id, start_time)",
+    },
+    'habit_completion_records': {
+        'key': 'record_id',
+        'time_column': 'completion_time',
+        'condition': "1=1",
+        'archive_index': "(habit_id, completion_time)",
+    },
+}
+
+ARCHIVE_FORMATS = ('sqlite', 'csv')
+
+
+def incremental_vacuum_enabled(connection):
+    return connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def enable_incremental_vacuum(connection):
+    """Switch a database to auto_vacuum=INCREMENTAL, returns True if a VACUUM was needed"""
+    if incremental_vacuum_enabled(connection):
+        return False
+    connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    connection.execute("VACUUM")  # the mode of an existing database only changes on VACUUM
+    return True
+
+
+class DataArchiver:
+    """Move old usage and habit completion rows into per-month archives and read them back"""
+
+    def __init__(self, database, archive_directory="data/archive", horizon_days=180, archive_format="sqlite",
+                 batch_size=2000, pause=0.01, vacuum_pages=256):
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format: {archive_format}")
+        self.database = database  # DatabaseManager of the live database
+        self.archive_directory = archive_directory
+        self.horizon_days = horizon_days
+        self.archive_format = archive_format
+        self.batch_size = batch_size
+        self.pause = pause  # seconds between batches, lets waiting writers in
+        self.vacuum_pages = vacuum_pages  # pages freed per incremental_vacuum step
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Make a running run() return after its current batch"""
+        self._stop.set()
+
+    def run(self):
+        """Archive everything older than the horizon, returns {table: rows archived}"""
+        if not os.path.exists(self.archive_directory):
+            os.makedirs(self.archive_directory)
+        if not self.database.connect_database():
+            return {}
+
+        archived = {}
+        try:
+            for table in ARCHIVED_TABLES:
+                if self._stop.is_set():
+                    break
+                if table == 'usage_records' and not rollup_complete(self.database.cursor):
+                    print("Usage rollup backfill not finished, usage records are not archived yet")
+                    continue
+                archived[table] = self._archive_table(table)
+            if incremental_vacuum_enabled(self.database.connection):
+                self._incremental_vacuum()
+            print(f"Archived rows older than {self.horizon_days} days: {archived}")
+            return archived
+        except (sqlite3.Error, OSError) as e:
+            print(f"Archive data error: {e}")
+            if self.database.connection.in_transaction:
+                self.database.connection.rollback()
+            return archived
+        finally:
+            self.database.close_connection()
+
+    def _archive_table(self, table):
+        settings = ARCHIVED_TABLES[table]
+        cursor = self.database.cursor
+        total = 0
+        while not self._stop.is_set():
+            cursor.execute(
+                f"""SELECT * FROM {table}
+                WHERE {settings['time_column']} < datetime('now', ?) AND {settings['condition']}
+                ORDER BY {settings['key']} LIMIT ?""",
+                (f"-{int(self.horizon_days)} days", self.batch_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return total
+            columns = [description[0] for description in cursor.description]
+            key_index = columns.index(settings['key'])
+            time_index = columns.index(settings['time_column'])
+
+            months = {}
+            for row in rows:
+                months.setdefault(str(row[time_index])[:7], []).append(row)
+            locations = {month: self._write_month(table, month, columns, month_rows)
+                         for month, month_rows in months.items()}
+
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                for month, month_rows in months.items():
+                    cursor.execute(
+                        """INSERT INTO archived_months (table_name, month, location, row_count)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT (table_name, month) DO UPDATE SET
+                        row_count = row_count + excluded.row_count, archive_time = CURRENT_TIMESTAMP""",
+                        (table, month, locations[month], len(month_rows))
+                    )
+                cursor.executemany(f"DELETE FROM {table} WHERE {settings['key']} = ?",
+                                   [(row[key_index],) for row in rows])
+                self.database.connection.commit()
+            except sqlite3.Error:
+                self.database.connection.rollback()
+                raise
+            total += len(rows)
+            if self.pause:
+                self._stop.wait(self.pause)
+        return total
+
+    def _archive_path(self, table, month, archive_format=None):
+        month_suffix = month.replace('-', '_')
+        if (archive_format or self.archive_format) == 'sqlite':
+            return os.path.join(self.archive_directory, f"archive_{month_suffix}.db")
+        return os.path.join(self.archive_directory, f"{table}_{month_suffix}.csv.gz")
+
+    def _write_month(self, table, month, columns, rows):
+        """Append rows to the month's archive, returns the archive path"""
+        path = self._archive_path(table, month)
+        if self.archive_format == 'csv':
+            new_file = not os.path.exists(path)
+            # Appending adds a gzip member; gzip readers see one continuous stream
+            with gzip.open(path, 'at', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(columns)
+                writer.writerows(rows)
+            return path
+
+        self.database.cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        create_sql = self.database.cursor.fetchone()[0].replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1)
+        archive = sqlite3.connect(path)
+        try:
+            with archive:
+                archive.execute(create_sql)
+                # Archives created before a migration added columns get them now
+                archived_columns = {row[1] for row in archive.execute(f"PRAGMA table_info({table})")}
+                for column in columns:
+                    if column not in archived_columns:
+                        archive.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+                archive.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_archive ON {table} "
+                                f"{ARCHIVED_TABLES[table]['archive_index']}")
+                placeholders = ', '.join('?' for column in columns)
+                archive.executemany(
+                    f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows
+                )
+        finally:
+            archive.close()
+        return path
+
+    def _incremental_vacuum(self):
+        """Return free pages to the file system a few at a time"""
+        cursor = self.database.cursor
+        while not self._stop.is_set():
+            cursor.execute("PRAGMA freelist_count")
+            if not cursor.fetchone()[0]:
+                return
+            cursor.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})")
+            cursor.fetchall()
+            if self.pause:
+                self._stop.wait(self.pause)
+
+    def convert_to_incremental_vacuum(self):
+        """One-off maintenance: switch an older database to incremental auto-vacuum
+
+        Runs a full VACUUM, which rewrites the whole file and blocks all
+        writers meanwhile; call it when nothing else writes, e.g. at
+        shutdown as main.py does, never on startup.
+        Returns True if the database was converted, False if it already was
+        (or on error).
+        """
+        if not self.database.connect_database():
+            return False
+        try:
+            converted = enable_incremental_vacuum(self.database.connection)
+            if converted:
+                print("Database converted to incremental auto-vacuum")
+            return converted
+        except sqlite3.Error as e:
+            print(f"Convert to incremental auto-vacuum error: {e}")
+            return False
+        finally:
+            self.database.close_connection()
+
+    def archived_months(self, table=None):
+        """Archived months as dicts (table_name, month, location, row_count, archive_time)"""
+        if not self.database.connect_database(read_only=True):
+            return []
+        try:
+            query = "SELECT * FROM archived_months"
+            params = []
+            if table:
+                query += " WHERE table_name = ?"
+                params.append(table)
+            self.database.cursor.execute(query + " ORDER BY table_name, month", params)
+            column_names = [description[0] for description in self.database.cursor.description]
+            return [dict(zip(column_names, row)) for row in self.database.cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Get archived months error: {e}")
+            return []
+        finally:
+            self.database.close_connection()
+
+    def iter_archived_rows(self, table, month, **filters):
+        """Yield the archived rows of one table and month as dicts
+
+        filters are column=value equality conditions, e.g. user_id=5.
+        """
+        if table not in ARCHIVED_TABLES:
+            raise ValueError(f"Table is not archived: {table}")
+        key = ARCHIVED_TABLES[table]['key']
+        # A month may have been archived under either format
+        paths = [self._archive_path(table, month, archive_format) for archive_format in ARCHIVE_FORMATS]
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            return
+        path = paths[0]
+
+        if path.endswith('.db'):
+            archive = sqlite3.connect(path)
+            try:
+                conditions = ''.join(f" AND {column} = ?" for column in filters)
+                cursor = archive.execute(f"SELECT * FROM {table} WHERE 1=1{conditions} ORDER BY {key}",
+                                         list(filters.values()))
+                column_names = [description[0] for description in cursor.description]
+                for row in cursor:
+                    yield dict(zip(column_names, row))
+            except sqlite3.OperationalError:
+                return  # this month's archive holds only the other table
+            finally:
+                archive.close()
+            return
+
+        seen = set()
+        with gzip.open(path, 'rt', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row[key] in seen:
+                    continue
+                seen.add(row[key])
+                if all(row[column] == ('' if value is None else str(value)) for column, value in filters.items()):
+                    yield row
+
+    def get_archived_usage_records(self, user_id, month):
+        """A user's archived usage records of one month (YYYY-MM)"""
+        return list(self.iter_archived_rows('usage_records', month, user_id=user_id))
+
+    def get_archived_habit_completions(self, habit_id, month):
+        """A habit's archived completion records of one month (YYYY-MM)"""
+        return list(self.iter_archived_rows('habit_completion_records', month, habit_id=habit_id))
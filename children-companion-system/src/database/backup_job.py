@@ -0,0 +1,188 @@
+import os
+import glob
+import gzip
+import time
+import shutil
+import sqlite3
+import threading
+from datetime import datetime
+
+
+class BackupCancelled(Exception):
+    """Raised inside the backup progress callback to abort a running copy"""
+
+
+def online_backup(source, target, pages_per_step=256, step_pause=0.05, progress=None, cancelled=None):
+    """Copy source into target pages_per_step pages at a time
+
+    Between steps the source is unlocked for step_pause seconds, so writers
+    are only blocked for one short step instead of the whole copy.
+    progress(copied_pages, total_pages) is called after every step;
+    cancelled() returning True aborts the copy with BackupCancelled.
+    """
+    def on_step(status, remaining, total):
+        if progress:
+            progress(total - remaining, total)
+        if cancelled and cancelled():
+            raise BackupCancelled()
+        if remaining and step_pause:
+            time.sleep(step_pause)
+
+    source.backup(target, pages=pages_per_step, progress=on_step)
+
+
+class DatabaseBackupJob:
+    """Background online backup of the SQLite database with compression and rotation
+
+    Each run copies the live database into backup_directory in small steps
+    (see online_backup) on its own connection, optionally gzips the copy and
+    keeps only the newest `keep` snapshots. run_now() starts one run on the
+    job thread, schedule(interval) repeats it every interval seconds.
+
+    Callbacks run on the job thread: progress(copied_pages, total_pages) and
+    finished(snapshot path, or None if the run failed or was cancelled).
+    The Qt interface turns them into signals, see
+    ChildrenMainInterface.attach_backup_job.
+
+    Note: writes by other connections make SQLite restart the copy, so on a
+    busy database a run takes longer but never blocks the writers.
+    """
+
+    def __init__(self, database_path, backup_directory="backup", pages_per_step=256, step_pause=0.05,
+                 compress=True, keep=7, prefix="children_companion_backup"):
+        self.database_path = database_path
+        self.backup_directory = backup_directory
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause  # unit: seconds
+        self.compress = compress
+        self.keep = keep  # number of snapshots kept, None keeps all
+        self.prefix = prefix
+        self.last_backup_path = None
+
+        self._progress_callbacks = []
+        self._finished_callbacks = []
+        self._thread = None
+        self._interval = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._run_requested = False
+        self._lock = threading.Lock()
+
+    def add_progress_callback(self, callback):
+        self._progress_callbacks.append(callback)
+
+    def add_finished_callback(self, callback):
+        self._finished_callbacks.append(callback)
+
+    def run_now(self):
+        """Start one backup in the background (after the current one, if a backup is running)"""
+        with self._lock:
+            self._run_requested = True
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def schedule(self, interval, run_immediately=False):
+        """Back up every interval seconds until stop()"""
+        with self._lock:
+            self._interval = interval
+            self._run_requested = self._run_requested or run_immediately
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        """Cancel a running copy and stop the job thread"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None and not self._stopping.is_set():
+                self._thread = threading.Thread(target=self._run, name="DatabaseBackupJob", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        next_run = None
+        while not self._stopping.is_set():
+            with self._lock:
+                run_requested, self._run_requested = self._run_requested, False
+                interval = self._interval
+            if interval and next_run is None:
+                next_run = time.monotonic() + interval
+            if run_requested or (next_run is not None and time.monotonic() >= next_run):
+                self.backup()
+                next_run = time.monotonic() + interval if interval else None
+                continue
+            self._wakeup.wait(None if next_run is None else max(next_run - time.monotonic(), 0))
+            self._wakeup.clear()
+
+    def backup(self):
+        """Run one backup on the calling thread, return the snapshot path or None"""
+        if not os.path.exists(self.backup_directory):
+            os.makedirs(self.backup_directory)
+        name = f"{self.prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+        snapshot_path = os.path.join(self.backup_directory, name + (".gz" if self.compress else ""))
+        partial_path = os.path.join(self.backup_directory, name + ".partial")
+
+        source = None
+        target = None
+        try:
+            source = sqlite3.connect(self.database_path)
+            target = sqlite3.connect(partial_path)
+            online_backup(source, target, self.pages_per_step, self.step_pause,
+                          progress=self._report_progress, cancelled=self._stopping.is_set)
+            target.close()
+            target = None
+
+            if self.compress:
+                with open(partial_path, 'rb') as raw, gzip.open(snapshot_path + ".partial", 'wb') as packed:
+                    shutil.copyfileobj(raw, packed)
+                os.remove(partial_path)
+                partial_path = snapshot_path + ".partial"
+            os.replace(partial_path, snapshot_path)
+
+            self.last_backup_path = snapshot_path
+            self.rotate()
+            print(f"Database has been backed up to: {snapshot_path}")
+        except BackupCancelled:
+            print("Database backup cancelled")
+            snapshot_path = None
+        except (sqlite3.Error, OSError) as e:
+            print(f"Backup database error: {e}")
+            snapshot_path = None
+        finally:
+            if target:
+                target.close()
+            if source:
+                source.close()
+            if snapshot_path is None and os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        for callback in self._finished_callbacks:
+            callback(snapshot_path)
+        return snapshot_path
+
+    def snapshots(self):
+        """Existing snapshots, oldest first"""
+        pattern = os.path.join(self.backup_directory, f"{self.prefix}_*.db")
+        return sorted(glob.glob(pattern) + glob.glob(pattern + ".gz"))
+
+    def rotate(self):
+        """Delete all but the newest `keep` snapshots"""
+        if self.keep is None:
+            return
+        snapshots = self.snapshots()
+        for path in snapshots[:max(len(snapshots) - self.keep, 0)]:
+            os.remove(path)
+
+    def _report_progress(self, copied_pages, total_pages):
+        for callback in self._progress_callbacks:
+            callback(copied_pages, total_pages)
+
+
+def restore_snapshot(snapshot_path, database_path):
+    """Write a (possibly gzipped) snapshot back to database_path, only while the application is not running"""
+    opener = gzip.open if snapshot_path.endswith(".gz") else open
+    with opener(snapshot_path, 'rb') as snapshot, open(database_path, 'wb') as database:
+        shutil.copyfileobj(snapshot, database)
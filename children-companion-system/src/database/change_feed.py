@@ -0,0 +1,110 @@
+import asyncio
+import itertools
+import threading
+from collections import namedtuple
+
+# Change feed
+#
+# DatabaseManager reports every row its mutator methods write as a
+# ChangeEvent, so live views (the parent dashboard, the usage quota engine)
+# can update incrementally instead of polling and re-running aggregates.
+# Python's sqlite3 module has no update_hook, so the events come from the
+# mutator methods themselves: each records what it wrote once its
+# transaction has committed, and the events are published when the
+# method hands its connection back. Rolled-back writes never produce an
+# event. Subscribers run on the writing thread (often the event journal
+# writer); they must be quick and may call back into the DatabaseManager.
+#
+# Rows moved out by the archiver (archive.py) are not reported: for live
+# views they are still part of the history, just stored elsewhere.
+
+ChangeEvent = namedtuple('ChangeEvent', ['sequence', 'table', 'op', 'primary_key', 'changed_columns', 'row'])
+ChangeEvent.__doc__ = """One committed row change
+
+op is 'insert', 'update' or 'upsert' (an insert that may have updated an
+existing row, e.g. learning_progress); changed_columns are the columns the
+statement wrote; row holds the values the writer knows (never passwords).
+sequence increases with every event of a feed.
+"""
+
+CHANGE_OPS = ('insert', 'update', 'upsert')
+
+
+class ChangeFeed:
+    """Publish/subscribe hub for ChangeEvents"""
+
+    def __init__(self):
+        self._subscribers = []  # (callback, tables or None)
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback, tables=None):
+        """Call callback(event) for changes of the given tables (all tables when None), returns callback"""
+        with self._lock:
+            self._subscribers = self._subscribers + [(callback, frozenset(tables) if tables else None)]
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [entry for entry in self._subscribers if entry[0] is not callback]
+
+    @property
+    def active(self):
+        """Whether anybody listens; writers skip building events otherwise"""
+        return bool(self._subscribers)
+
+    def event(self, table, op, primary_key, changed_columns, row):
+        return ChangeEvent(next(self._sequence), table, op, primary_key, tuple(changed_columns), row)
+
+    def publish(self, events):
+        subscribers = self._subscribers
+        for event in events:
+            for callback, tables in subscribers:
+                if tables is not None and event.table not in tables:
+                    continue
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"Change feed subscriber error: {e}")
+
+
+class AsyncioChangeQueue:
+    """Change feed adapter delivering events into an asyncio.Queue
+
+    Create it from a coroutine (or pass the loop); writers on any thread
+    hand their events over with call_soon_threadsafe. With a bounded queue,
+    events arriving while it is full are counted in dropped_events and
+    discarded, a dashboard then re-reads its aggregates.
+
+        changes = AsyncioChangeQueue(database.changes, tables=['usage_records'])
+        async for event in changes:
+            ...
+    """
+
+    def __init__(self, feed, tables=None, maxsize=0, loop=None):
+        self.feed = feed
+        self.loop = loop or asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped_events = 0
+        feed.subscribe(self._on_change, tables)
+
+    def _on_change(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped_events += 1
+
+    async def get(self):
+        return await self.queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.feed.unsubscribe(self._on_change)
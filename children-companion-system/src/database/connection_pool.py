@@ -0,0 +1,85 @@
+import threading
+import sqlite3
+
+
+class ConnectionPool:
+    """Pool of long-lived SQLite connections, one per thread
+
+    Each thread keeps its own connection for the lifetime of the pool so the
+    page cache stays warm between calls. At most ``pool_size`` connections are
+    kept open; threads beyond that limit get a temporary connection that is
+    closed again on release.
+    """
+
+    def __init__(self, connection_factory, pool_size=5, on_close=None):
+        """Initialize pool with a callable that opens a new connection
+
+        on_close(connection) is called just before the pool closes one of
+        its connections.
+        """
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        self.connection_factory = connection_factory
+        self.pool_size = pool_size
+        self.on_close = on_close
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = {}  # thread ident -> connection
+
+    def acquire(self):
+        """Get the calling thread's connection, opening one if necessary"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            return connection
+
+        with self._lock:
+            if len(self._connections) >= self.pool_size:
+                self._discard_dead_threads()
+            pooled = len(self._connections) < self.pool_size
+
+        connection = self.connection_factory()
+        if pooled:
+            with self._lock:
+                self._connections[threading.get_ident()] = connection
+            self._local.connection = connection
+        return connection
+
+    def release(self, connection):
+        """Return a connection to the pool after use"""
+        # Never leave a half-finished transaction on a long-lived connection
+        if connection.in_transaction:
+            connection.rollback()
+        if connection is not getattr(self._local, 'connection', None):
+            self._close(connection)
+
+    def close_all(self):
+        """Close every pooled connection"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            try:
+                self._close(connection)
+            except sqlite3.Error as e:
+                print(f"Close pooled connection error: {e}")
+        self._local = threading.local()
+
+    def size(self):
+        """Number of connections currently held by the pool"""
+        with self._lock:
+            return len(self._connections)
+
+    def _discard_dead_threads(self):
+        """Close connections whose owning thread has exited (lock must be held)"""
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in list(self._connections):
+            if ident not in alive:
+                try:
+                    self._close(self._connections.pop(ident))
+                except sqlite3.Error as e:
+                    print(f"Close pooled connection error: {e}")
+
+    def _close(self, connection):
+        if self.on_close:
+            self.on_close(connection)
+        connection.close()
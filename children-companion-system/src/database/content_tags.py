@@ -0,0 +1,58 @@
+# Normalized content tags
+#
+# content_resources.tags stays the comma-separated display string; every
+# individual tag is also stored in content_tags so tag filters are exact
+# index lookups ("forest" no longer matches "rainforest"). The WITHOUT ROWID
+# primary key (tag, resource_id) is itself the covering index for filtering.
+
+CREATE_CONTENT_TAGS_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS content_tags (
+        tag TEXT NOT NULL,
+        resource_id INTEGER NOT NULL,
+        PRIMARY KEY (tag, resource_id),
+        FOREIGN KEY (resource_id) REFERENCES content_resources(resource_id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """,
+    # Reverse lookup, used when a resource's tags are replaced or deleted
+    "CREATE INDEX IF NOT EXISTS idx_content_tags_resource ON content_tags (resource_id, tag)",
+]
+
+
+def split_tags(tags):
+    """Split a comma-separated tag string (or a list of tags) into normalized unique tags"""
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        tags = tags.replace('，', ',').split(',')  # accept full-width commas too
+    normalized = []
+    for tag in tags:
+        tag = tag.strip().lower()
+        if tag and tag not in normalized:
+            normalized.append(tag)
+    return normalized
+
+
+def replace_resource_tags(cursor, resource_id, tags):
+    """Make content_tags hold exactly the given tags for one resource"""
+    cursor.execute("DELETE FROM content_tags WHERE resource_id = ?", (resource_id,))
+    cursor.executemany(
+        "INSERT OR IGNORE INTO content_tags (tag, resource_id) VALUES (?, ?)",
+        [(tag, resource_id) for tag in split_tags(tags)]
+    )
+
+
+def tag_filter_statement(match="all"):
+    """SQL condition on content_resources.resource_id for a tag filter
+
+    The tags are passed as a JSON array in :tags, so the statement text does
+    not depend on the number of tags and one prepared statement serves every
+    tag filter of a match mode. match='all' requires every tag (AND), 'any'
+    at least one (OR).
+    """
+    if match == "any":
+        return "resource_id IN (SELECT resource_id FROM content_tags WHERE tag IN (SELECT value FROM json_each(:tags)))"
+    if match != "all":
+        raise ValueError(f"Unknown tag match mode: {match}")
+    return ("resource_id IN (SELECT resource_id FROM content_tags WHERE tag IN (SELECT value FROM json_each(:tags)) "
+            "GROUP BY resource_id HAVING COUNT(*) = json_array_length(:tags))")
@@ -0,0 +1,565 @@
+# Database benchmarks
+# Run from the project root, e.g.:
+#   python -m src.database.database_benchmark indexes --children 1000 --days 365
+#   python -m src.database.database_benchmark bulk --events 5000
+#   python -m src.database.database_benchmark rows --rows 100000
+#   python -m src.database.database_benchmark suite --scales small medium --output report.json
+#   python -m src.database.database_benchmark compare before.json after.json
+#   python -m src.database.database_benchmark generate data/synthetic.db --parents 500 --months 6
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import platform
+import itertools
+import subprocess
+import tempfile
+import tracemalloc
+import contextlib
+from datetime import datetime, timedelta
+
+from src.database.content_search import register_content_functions
+from src.database.database_system import DatabaseManager
+from src.database.indexes import drop_indexes, ensure_indexes
+from src.database.row_types import ROW_TYPES
+from src.database.synthetic_data import PASSWORD, SyntheticDataGenerator
+from src.database.usage_rollup import ROLLUP_RECORD_RANGE_SQL
+
+ACTIVITY_TYPES = ['browse', 'play', 'learn', 'game']
+SUBJECTS = ['literacy', 'arithmetic', 'english']
+HABITS = ['brush teeth', 'reading', 'tidy up toys']
+CONTENT_TYPES = ['story', 'song', 'game', 'learning']
+
+
+def seed_year_of_activity(database_path, children=1000, days=365, sessions_per_day=3, content_count=200, seed=42):
+    """Fill a freshly initialized database with synthetic families and a period of activity
+
+    Writes straight through sqlite3 executemany so seeding a year for a
+    thousand children takes seconds rather than hours.
+    Returns the list of (parent_id, child_id) pairs.
+    """
+    rng = random.Random(seed)
+    connection = sqlite3.connect(database_path)
+    register_content_functions(connection)  # content_bigrams triggers
+    connection.execute("PRAGMA synchronous = OFF")
+    cursor = connection.cursor()
+
+    # Two children per parent
+    families = []
+    parent_id = None
+    for index in range(children):
+        if index % 2 == 0:
+            cursor.execute("INSERT INTO users (username, password, user_type) VALUES (?, ?, 'parent')",
+                           (f"bench_parent_{index // 2}", "password"))
+            parent_id = cursor.lastrowid
+        cursor.execute("INSERT INTO users (username, password, user_type) VALUES (?, ?, 'child')",
+                       (f"bench_child_{index}", "password"))
+        child_id = cursor.lastrowid
+        families.append((parent_id, child_id))
+
+    cursor.executemany(
+        "INSERT INTO children_info (child_id, parent_id, name, age, gender, interests) VALUES (?, ?, ?, ?, ?, ?)",
+        [(child_id, parent_id, f"Child {child_id}", rng.randint(3, 9), rng.choice(['male', 'female']), "stories")
+         for parent_id, child_id in families]
+    )
+
+    cursor.executemany(
+        "INSERT INTO content_resources (title, type, content_path, tags) VALUES (?, ?, ?, ?)",
+        [(f"Content {index}", rng.choice(CONTENT_TYPES), f"content/{index}.json", "bench")
+         for index in range(content_count)]
+    )
+
+    start_day = datetime.now() - timedelta(days=days)
+    for parent_id, child_id in families:
+        usage_rows = []
+        for day in range(days):
+            date = start_day + timedelta(days=day)
+            for session in range(sessions_per_day):
+                start = date.replace(hour=8 + session * 4, minute=rng.randint(0, 59), second=0, microsecond=0)
+                duration = rng.randint(60, 1800)
+                usage_rows.append((
+                    child_id, rng.randint(1, content_count), rng.choice(ACTIVITY_TYPES),
+                    start.strftime('%Y-%m-%d %H:%M:%S'),
+                    (start + timedelta(seconds=duration)).strftime('%Y-%m-%d %H:%M:%S'),
+                    duration, 'completed'
+                ))
+        cursor.executemany(
+            "INSERT INTO usage_records (user_id, resource_id, activity_type, start_time, end_time, duration, completion_status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            usage_rows
+        )
+
+        cursor.executemany(
+            "INSERT INTO learning_progress (child_id, subject, topic, level, completion_rate) VALUES (?, ?, ?, ?, ?)",
+            [(child_id, subject, f"topic {topic}", topic % 5 + 1, rng.randint(0, 100))
+             for subject in SUBJECTS for topic in range(10)]
+        )
+
+        for habit_name in HABITS:
+            cursor.execute("INSERT INTO habit_formation (child_id, habit_name, frequency) VALUES (?, ?, 'daily')",
+                           (child_id, habit_name))
+            habit_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT INTO habit_completion_records (habit_id, completion_time, completion_status) VALUES (?, ?, ?)",
+                [(habit_id, (start_day + timedelta(days=day, hours=20)).strftime('%Y-%m-%d %H:%M:%S'),
+                  rng.choice(['completed', 'completed', 'partially completed', 'not completed']))
+                 for day in range(days)]
+            )
+
+        cursor.execute(
+            "INSERT INTO parental_control_settings (parent_id, child_id, daily_time_limit, content_filter_level) VALUES (?, ?, ?, ?)",
+            (parent_id, child_id, 120, 'medium')
+        )
+
+    # Seeding bypasses DatabaseManager, so fold the records into the daily rollup here
+    max_record_id = cursor.execute("SELECT MAX(record_id) FROM usage_records").fetchone()[0] or 0
+    cursor.execute(ROLLUP_RECORD_RANGE_SQL, {'start_key': 0, 'end_key': max_record_id})
+
+    connection.commit()
+    connection.close()
+    return families
+
+
+def time_calls(function, argument_list):
+    """Call function once per argument tuple, return mean milliseconds per call"""
+    started = time.perf_counter()
+    for arguments in argument_list:
+        function(*arguments)
+    return (time.perf_counter() - started) * 1000 / max(len(argument_list), 1)
+
+
+def run_read_queries(database, samples, days):
+    """Time the indexed read paths of DatabaseManager on a sample of families"""
+    end_date = datetime.now().strftime('%Y-%m-%d')
+    start_date = (datetime.now() - timedelta(days=min(days, 30))).strftime('%Y-%m-%d')
+    return {
+        'get_usage_statistics': time_calls(database.get_usage_statistics,
+                                           [(child_id, start_date, end_date) for parent_id, child_id in samples]),
+        'get_learning_progress': time_calls(database.get_learning_progress,
+                                            [(child_id, 'arithmetic') for parent_id, child_id in samples]),
+        'get_habit_list': time_calls(database.get_habit_list,
+                                     [(child_id,) for parent_id, child_id in samples]),
+        'get_parental_control_settings': time_calls(database.get_parental_control_settings, samples),
+        'get_parent_children_list': time_calls(database.get_parent_children_list,
+                                               [(parent_id,) for parent_id, child_id in samples]),
+    }
+
+
+def benchmark_indexes(children=1000, days=365, sessions_per_day=3, samples=50, database_path=None):
+    """Compare read-path latency without and with the managed index set"""
+    if database_path is None:
+        database_path = os.path.join(tempfile.mkdtemp(), "index_benchmark.db")
+
+    database = DatabaseManager(database_path, pool_size=1)
+    database.initialize_database()
+
+    print(f"Seeding {children} children x {days} days ...")
+    started = time.perf_counter()
+    families = seed_year_of_activity(database_path, children, days, sessions_per_day)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    sample = random.Random(7).sample(families, min(samples, len(families)))
+
+    database.connect_database()
+    drop_indexes(database.cursor)
+    database.connection.commit()
+    database.close_connection()
+    without_indexes = run_read_queries(database, sample, days)
+
+    database.connect_database()
+    started = time.perf_counter()
+    ensure_indexes(database.cursor)
+    database.connection.commit()
+    index_build_seconds = time.perf_counter() - started
+    database.close_connection()
+    with_indexes = run_read_queries(database, sample, days)
+    database.close_pool()
+
+    print(f"Index build: {index_build_seconds:.1f}s")
+    print(f"{'query':32s} {'no index (ms)':>14s} {'indexed (ms)':>14s} {'speedup':>9s}")
+    for name in without_indexes:
+        before, after = without_indexes[name], with_indexes[name]
+        print(f"{name:32s} {before:14.2f} {after:14.2f} {before / max(after, 1e-6):8.1f}x")
+
+    return {
+        'database_path': database_path,
+        'index_build_seconds': index_build_seconds,
+        'without_indexes_ms': without_indexes,
+        'with_indexes_ms': with_indexes,
+    }
+
+
+def benchmark_bulk_insert(events=5000, storage_profile="default", database_path=None):
+    """Compare per-row inserts with the bulk APIs, in events per second"""
+    if database_path is None:
+        database_path = os.path.join(tempfile.mkdtemp(), "bulk_benchmark.db")
+
+    database = DatabaseManager(database_path, pool_size=1, storage_profile=storage_profile)
+    database.initialize_database()
+    parent_id = database.add_user("bench_parent", "password", "parent")
+    child_id = database.add_user("bench_child", "password", "child")
+    database.add_child_info(child_id, parent_id, "Bench child")
+    habit_id = database.add_habit(child_id, "brush teeth", "daily")
+
+    usage_events = [(child_id, None, ACTIVITY_TYPES[index % len(ACTIVITY_TYPES)]) for index in range(events)]
+    habit_events = [(habit_id, 'completed', f"day {index}") for index in range(events)]
+    progress_events = [(child_id, SUBJECTS[index % len(SUBJECTS)], f"topic {index}", index % 20 + 1, index % 100)
+                       for index in range(events)]
+
+    cases = [
+        ('usage records', database.add_usage_record, database.add_usage_records_bulk, usage_events),
+        ('habit completions', database.record_habit_completion, database.record_habit_completions_bulk, habit_events),
+        ('learning progress', database.add_learning_progress, database.upsert_learning_progress_bulk, progress_events),
+    ]
+
+    results = {}
+    # The per-row methods print one line per call; keep that out of the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, single, bulk, rows in cases:
+            started = time.perf_counter()
+            for row in rows:
+                single(*row)
+            single_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            bulk(rows)
+            bulk_seconds = time.perf_counter() - started
+            results[name] = {
+                'per_row_events_per_second': events / single_seconds,
+                'bulk_events_per_second': events / bulk_seconds,
+            }
+    database.close_pool()
+
+    print(f"{'events':20s} {'per-row (ev/s)':>15s} {'bulk (ev/s)':>15s} {'speedup':>9s}")
+    for name, result in results.items():
+        single_rate, bulk_rate = result['per_row_events_per_second'], result['bulk_events_per_second']
+        print(f"{name:20s} {single_rate:15.0f} {bulk_rate:15.0f} {bulk_rate / single_rate:8.1f}x")
+    return results
+
+
+def benchmark_row_types(rows=100000, repeats=3, database_path=None):
+    """Compare time and memory of reading rows as dicts, sqlite3.Row and namedtuples"""
+    if database_path is None:
+        database_path = os.path.join(tempfile.mkdtemp(), "row_benchmark.db")
+
+    database = DatabaseManager(database_path, pool_size=1)
+    database.initialize_database()
+    connection = sqlite3.connect(database_path)
+    register_content_functions(connection)  # content_bigrams triggers
+    connection.executemany(
+        "INSERT INTO content_resources (title, type, subtype, content_path, description, age_range, tags) "
+        "VALUES (?, ?, 'bench', ?, ?, '3-6', 'bench')",
+        [(f"Content {index}", CONTENT_TYPES[index % len(CONTENT_TYPES)], f"content/{index}.json",
+          f"Description of content {index}") for index in range(rows)]
+    )
+    connection.commit()
+    connection.close()
+
+    results = {}
+    for row_type in ROW_TYPES:
+        read = lambda: database.get_content_resources(limit=rows, row_type=row_type)
+        read()  # warm the page cache
+        best_seconds = None
+        for repeat in range(repeats):
+            started = time.perf_counter()
+            read()
+            elapsed = time.perf_counter() - started
+            best_seconds = elapsed if best_seconds is None else min(best_seconds, elapsed)
+
+        tracemalloc.start()
+        result = read()
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[row_type] = {
+            'rows': len(result),
+            'read_ms': best_seconds * 1000,
+            'retained_mb': current_bytes / 2 ** 20,
+            'peak_mb': peak_bytes / 2 ** 20,
+        }
+        del result
+    database.close_pool()
+
+    print(f"{rows} content_resources rows, best of {repeats}")
+    print(f"{'row type':10s} {'read (ms)':>10s} {'retained (MB)':>14s} {'peak (MB)':>10s}")
+    for row_type, result in results.items():
+        print(f"{row_type:10s} {result['read_ms']:10.1f} {result['retained_mb']:14.1f} {result['peak_mb']:10.1f}")
+    return results
+
+# Data scales of the method suite: SyntheticDataGenerator sizes
+SCALES = {
+    'small': {'parents': 20, 'children_per_parent': 2, 'content_count': 200, 'months': 1},
+    'medium': {'parents': 200, 'children_per_parent': 2, 'content_count': 2000, 'months': 3},
+    'large': {'parents': 1000, 'children_per_parent': 2, 'content_count': 10000, 'months': 6},
+}
+
+
+def summarize_timings(timings_ms):
+    """Mean and percentiles of a list of call times"""
+    ordered = sorted(timings_ms)
+    percentile = lambda fraction: ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+    return {
+        'calls': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered),
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'max_ms': ordered[-1],
+    }
+
+
+def method_cases(database, data, samples, rng):
+    """(method name, [argument tuples]) for every public DatabaseManager method
+
+    Reads come first, then writes, so the reads see exactly the generated
+    data set. Arguments are drawn from the generated rows.
+    """
+    families = rng.sample(data['families'], min(samples, len(data['families'])))
+    resources = rng.sample(data['resource_ids'], min(samples, len(data['resource_ids'])))
+    habits = [rng.choice(data['habit_ids'][child_id]) for parent_id, child_id in families
+              if data['habit_ids'][child_id]]
+    end_date = datetime.now().strftime('%Y-%m-%d')
+    start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    content_types = ['story', 'song', 'game', 'learning']
+    keywords = ['forest', 'rabbit', 'moon', '恐龙', 'classic', 'bedtime']
+
+    def first_pages(**filters):
+        return list(itertools.islice(database.iter_content_resources(**filters), 100))
+
+    def second_page(type):
+        page = database.get_content_resources_page(type=type)
+        return database.get_content_resources_page(type=type, after=page['next_cursor'])
+
+    reads = [
+        ('get_user_info', [(data['usernames'][child_id],) for parent_id, child_id in families]),
+        ('get_child_info', [(child_id,) for parent_id, child_id in families]),
+        ('get_parent_children_list', [(parent_id,) for parent_id, child_id in families]),
+        ('get_content_resources', [(rng.choice(content_types),) for family in families]),
+        ('get_content_resources (tags)', [(None, None, None, rng.sample(['classic', 'animals', 'forest'], 2), 10, 'any')
+                                          for family in families]),
+        ('get_content_resources_page', [(rng.choice(content_types),) for family in families]),
+        ('iter_content_resources', [() for family in families[:max(len(families) // 5, 1)]]),
+        ('get_usage_statistics', [(child_id, start_date, end_date) for parent_id, child_id in families]),
+        ('get_learning_progress', [(child_id,) for parent_id, child_id in families]),
+        ('get_habit_list', [(child_id,) for parent_id, child_id in families]),
+        ('get_parental_control_settings', families),
+        ('search_content', [(rng.choice(keywords),) for family in families]),
+        ('authenticate_user', [(data['usernames'][child_id], PASSWORD)
+                               for parent_id, child_id in families[:max(len(families) // 5, 1)]]),
+    ]
+    calls = {
+        'get_content_resources (tags)': database.get_content_resources,
+        'get_content_resources_page': second_page,
+        'iter_content_resources': first_pages,
+    }
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    writes = [
+        ('add_content_resource', [(f"Benchmark content {index}", rng.choice(content_types), f"content/bench/{index}.json",
+                                   None, "benchmark", None, "4-6 years", "benchmark,classic")
+                                  for index in range(len(families))]),
+        ('add_usage_record', [(child_id, rng.choice(resources), 'play') for parent_id, child_id in families]),
+        ('update_usage_record', None),  # closes the records opened by add_usage_record
+        ('add_learning_progress', [(child_id, 'arithmetic', 'benchmark topic', 1, rng.randint(0, 100))
+                                   for parent_id, child_id in families]),
+        ('add_habit', [(child_id, 'benchmark habit', 'daily') for parent_id, child_id in families]),
+        ('record_habit_completion', [(habit_id, 'completed') for habit_id in habits]),
+        ('set_parental_control', [(parent_id, child_id, rng.choice([60, 120])) for parent_id, child_id in families]),
+        ('add_usage_records_bulk', [([(child_id, rng.choice(resources), 'learn', now, now, 0, 'completed')
+                                      for parent_id, child_id in families],)]),
+        ('record_habit_completions_bulk', [([(habit_id, 'completed') for habit_id in habits],)]),
+        ('upsert_learning_progress_bulk', [([(child_id, 'english', 'benchmark topic', 1, 50)
+                                             for parent_id, child_id in families],)]),
+        ('add_user', [(f"benchmark_user_{index}_{rng.random()}", PASSWORD, 'parent')
+                      for index in range(max(len(families) // 5, 1))]),
+        ('backup_database', [(os.path.join(tempfile.mkdtemp(), "backup.db"),)]),
+    ]
+    return reads, writes, calls
+
+
+def run_method_suite(database, data, samples, seed):
+    """Time every case of method_cases, return {method: timing summary}"""
+    rng = random.Random(seed)
+    reads, writes, calls = method_cases(database, data, samples, rng)
+    results = {}
+    opened_records = []
+    # The methods print one line per call; keep that out of the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, argument_list in reads + writes:
+            if name == 'update_usage_record':
+                argument_list = [(record_id, None, 'completed') for record_id in opened_records]
+            function = calls.get(name) or getattr(database, name)
+            timings_ms = []
+            for arguments in argument_list:
+                started = time.perf_counter()
+                result = function(*arguments)
+                timings_ms.append((time.perf_counter() - started) * 1000)
+                if name == 'add_usage_record':
+                    opened_records.append(result)
+                if name == 'backup_database':
+                    shutil.rmtree(os.path.dirname(arguments[0]), ignore_errors=True)
+            if timings_ms:
+                results[name] = summarize_timings(timings_ms)
+    return results
+
+
+def git_revision():
+    """Commit of the working tree the benchmark ran on, None outside a git checkout"""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                  check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ("-dirty" if dirty else "")
+
+
+def benchmark_suite(scales=('small', 'medium'), samples=50, seed=42, pool_size=1, storage_profile="wal",
+                    output=None, keep_databases=False):
+    """Time each public DatabaseManager method on generated data sets of several sizes
+
+    Every scale gets a fresh database filled by SyntheticDataGenerator with
+    the same seed, so reports of different commits measure the same data.
+    Returns the report dict and writes it as JSON to output when given.
+    """
+    report = {
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'settings': {'samples': samples, 'seed': seed, 'pool_size': pool_size, 'storage_profile': storage_profile},
+        'scales': {},
+    }
+    for scale in scales:
+        sizes = SCALES[scale] if isinstance(scale, str) else scale
+        name = scale if isinstance(scale, str) else "x".join(str(value) for value in sizes.values())
+        directory = tempfile.mkdtemp(prefix=f"benchmark_{name}_")
+        database_path = os.path.join(directory, "benchmark.db")
+
+        generator = SyntheticDataGenerator(seed=seed, **sizes)
+        database = DatabaseManager(database_path, pool_size=pool_size, storage_profile=storage_profile)
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.initialize_database()
+        print(f"[{name}] generating {generator.sizes()} ...")
+        started = time.perf_counter()
+        data = generator.populate(database_path)
+        generate_seconds = time.perf_counter() - started
+        print(f"[{name}] generated in {generate_seconds:.1f}s: {data['rows']}")
+
+        methods = run_method_suite(database, data, samples, seed)
+        database.close_pool()
+        report['scales'][name] = {
+            'sizes': generator.sizes(),
+            'rows': data['rows'],
+            'database_bytes': os.path.getsize(database_path),
+            'generate_seconds': generate_seconds,
+            'methods': methods,
+        }
+        print(f"{'method':32s} {'calls':>6s} {'mean (ms)':>10s} {'p95 (ms)':>10s}")
+        for method, timing in methods.items():
+            print(f"{method:32s} {timing['calls']:6d} {timing['mean_ms']:10.3f} {timing['p95_ms']:10.3f}")
+        if keep_databases:
+            report['scales'][name]['database_path'] = database_path
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Benchmark report written to: {output}")
+    return report
+
+
+def compare_reports(baseline_path, current_path, metric='p50_ms', threshold=1.2):
+    """Print per-method ratios between two suite reports, return the methods slower than threshold"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_path, encoding='utf-8') as f:
+        current = json.load(f)
+
+    print(f"{baseline.get('git_revision')} -> {current.get('git_revision')} ({metric})")
+    regressions = []
+    for scale, scale_report in current['scales'].items():
+        baseline_methods = baseline['scales'].get(scale, {}).get('methods', {})
+        print(f"[{scale}]")
+        print(f"{'method':32s} {'before':>10s} {'after':>10s} {'ratio':>7s}")
+        for method, timing in scale_report['methods'].items():
+            if method not in baseline_methods:
+                continue
+            before, after = baseline_methods[method][metric], timing[metric]
+            ratio = after / max(before, 1e-6)
+            flag = " !" if ratio > threshold else ""
+            print(f"{method:32s} {before:10.3f} {after:10.3f} {ratio:6.2f}x{flag}")
+            if flag:
+                regressions.append((scale, method, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DatabaseManager benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    index_parser = subparsers.add_parser("indexes", help="query time with and without secondary indexes")
+    index_parser.add_argument("--children", type=int, default=1000)
+    index_parser.add_argument("--days", type=int, default=365)
+    index_parser.add_argument("--sessions-per-day", type=int, default=3)
+    index_parser.add_argument("--samples", type=int, default=50)
+    index_parser.add_argument("--database", default=None, help="path of the seeded database (default: temp file)")
+
+    bulk_parser = subparsers.add_parser("bulk", help="per-row inserts versus the bulk insert APIs")
+    bulk_parser.add_argument("--events", type=int, default=5000)
+    bulk_parser.add_argument("--profile", default="default", help="storage profile, e.g. default or wal")
+    bulk_parser.add_argument("--database", default=None, help="path of the benchmark database (default: temp file)")
+
+    rows_parser = subparsers.add_parser("rows", help="dict versus sqlite3.Row versus namedtuple result rows")
+    rows_parser.add_argument("--rows", type=int, default=100000)
+    rows_parser.add_argument("--repeats", type=int, default=3)
+    rows_parser.add_argument("--database", default=None, help="path of the benchmark database (default: temp file)")
+
+    suite_parser = subparsers.add_parser("suite", help="time every public method at several data scales")
+    suite_parser.add_argument("--scales", nargs="+", default=["small", "medium"], choices=list(SCALES))
+    suite_parser.add_argument("--samples", type=int, default=50, help="calls per method and scale")
+    suite_parser.add_argument("--seed", type=int, default=42)
+    suite_parser.add_argument("--profile", default="wal", help="storage profile, e.g. default or wal")
+    suite_parser.add_argument("--output", default=None, help="JSON report path")
+    suite_parser.add_argument("--keep-databases", action="store_true")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two suite reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--metric", default="p50_ms", choices=["mean_ms", "p50_ms", "p95_ms", "max_ms"])
+    compare_parser.add_argument("--threshold", type=float, default=1.2, help="ratio reported as a regression")
+
+    generate_parser = subparsers.add_parser("generate", help="fill a database with seeded synthetic data")
+    generate_parser.add_argument("database")
+    generate_parser.add_argument("--parents", type=int, default=100)
+    generate_parser.add_argument("--children-per-parent", type=int, default=2)
+    generate_parser.add_argument("--content", type=int, default=500)
+    generate_parser.add_argument("--months", type=int, default=3)
+    generate_parser.add_argument("--seed", type=int, default=42)
+
+    args = parser.parse_args(argv)
+    if args.benchmark == "indexes":
+        benchmark_indexes(args.children, args.days, args.sessions_per_day, args.samples, args.database)
+    elif args.benchmark == "bulk":
+        benchmark_bulk_insert(args.events, args.profile, args.database)
+    elif args.benchmark == "rows":
+        benchmark_row_types(args.rows, args.repeats, args.database)
+    elif args.benchmark == "suite":
+        benchmark_suite(args.scales, args.samples, args.seed, storage_profile=args.profile, output=args.output,
+                        keep_databases=args.keep_databases)
+    elif args.benchmark == "compare":
+        return 1 if compare_reports(args.baseline, args.current, args.metric, args.threshold) else 0
+    elif args.benchmark == "generate":
+        DatabaseManager(args.database).initialize_database()
+        generator = SyntheticDataGenerator(args.parents, args.children_per_parent, args.content, args.months,
+                                           seed=args.seed)
+        print(generator.populate(args.database)['rows'])
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
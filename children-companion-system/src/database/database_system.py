@@ -1,29 +1,144 @@
 import os
 import sys
+import json
 import sqlite3
-from datetime import datetime
+import threading
+from datetime import date, datetime, timedelta
 
-class DatabaseManager:
+from src.database.backup_job import online_backup
+from src.database.change_feed import ChangeFeed
+from src.database.connection_pool import ConnectionPool
+from src.database.content_search import (BIGRAM_KEYWORD_LENGTH, BIGRAM_SEARCH_SQL, LIKE_SEARCH_SQL,
+                                         MIN_INDEXED_KEYWORD_LENGTH, SEARCH_SQL, content_search_available,
+                                         fts_phrase, register_content_functions)
+from src.database.content_tags import replace_resource_tags, split_tags, tag_filter_statement
+from src.database.habit_stats import HABIT_LIST_SQL
+from src.database.migrations import MigrationRunner
+from src.database.passwords import PasswordHasher, SessionCache
+from src.database.query_cache import QueryCache
+from src.database.query_profiler import QueryProfiler
+from src.database.query_registry import STATEMENT_CACHE_SIZE, QueryRegistry
+from src.database.row_types import DEFAULT_ROW_TYPE, ROW_TYPES, convert_rows, row_converter
+from src.database.usage_rollup import (ROLLUP_RECORD_RANGE_SQL, ROLLUP_SESSION_SQL, USAGE_STATISTICS_QUERIES,
+                                       rollup_complete, rollup_covers)
+from src.database.storage_backend import StorageBackend
+from src.database.storage_profile import ReadOnlyConnection, apply_storage_profile, resolve_storage_profile
+
+class DatabaseManager(StorageBackend):
     """Database management class, responsible for all database operations"""
     
-    def __init__(self, database_path="data/children_companion.db"):
-        """Initialize database connection"""
+    # Field order of tuple items passed to the bulk methods
+    USAGE_RECORD_FIELDS = ('user_id', 'resource_id', 'activity_type', 'start_time', 'end_time', 'duration',
+                           'completion_status')
+    HABIT_COMPLETION_FIELDS = ('habit_id', 'completion_status', 'notes', 'completion_time')
+    LEARNING_PROGRESS_FIELDS = ('child_id', 'subject', 'topic', 'level', 'completion_rate', 'last_learning_time')
+    
+    def __init__(self, database_path="data/children_companion.db", pool_size=None, storage_profile="default", cache_size=0, cache_ttl=30.0, row_type=DEFAULT_ROW_TYPE, profile=None, password_hasher=None, session_ttl=300.0, change_feed=None):
+        """Initialize database connection
+
+        When pool_size is given, each thread keeps a long-lived connection
+        (up to pool_size of them) instead of opening one per call.
+        storage_profile names a PRAGMA set from storage_profile.STORAGE_PROFILES
+        (e.g. 'wal') or is a dict of overrides.
+        cache_size > 0 enables a read-through LRU cache (entries expire after
+        cache_ttl seconds) for user, child, parental control and habit lookups.
+        row_type is the default representation of rows returned by the list
+        methods: 'dict', 'row' (sqlite3.Row) or 'tuple' (namedtuple per table),
+        see row_types.py; every list method can override it per call.
+        profile turns on the query profiler (True, a dict of QueryProfiler
+        options or a QueryProfiler); None leaves it to the
+        CHILDREN_COMPANION_DB_PROFILE environment variable.
+        password_hasher sets the scrypt cost of new password hashes (a
+        passwords.PasswordHasher); successful logins are remembered for
+        session_ttl seconds, see authenticate_user.
+        Committed writes are published on self.changes (change_feed.py);
+        pass change_feed to share one feed between several managers.
+        """
         self.database_path = database_path
         self.ensure_directory_exists()
-        self.connection = None
-        self.cursor = None
+        self.storage_settings = resolve_storage_profile(storage_profile)
+        # connection/cursor are per thread so the UI and worker threads never share one
+        self._local = threading.local()
+        self.pool = None
+        self.reader_pool = None
+        self._content_search = None  # full-text index present, looked up on first search
+        self.cache = QueryCache(cache_size, cache_ttl) if cache_size else None
+        self.queries = QueryRegistry()  # canonical listing statements, see query_stats()
+        if row_type not in ROW_TYPES:
+            raise ValueError(f"Unknown row type: {row_type}")
+        self.row_type = row_type
+        self.password_hasher = password_hasher or PasswordHasher()
+        self.sessions = SessionCache(session_ttl)
+        self.changes = change_feed or ChangeFeed()
+        if pool_size:
+            self.pool = ConnectionPool(self._open_connection, pool_size, on_close=self.queries.forget_connection)
+            self.reader_pool = ConnectionPool(lambda: self._open_connection(read_only=True), pool_size,
+                                              on_close=self.queries.forget_connection)
+        
+        if profile is None:
+            self.profiler = QueryProfiler.from_environment()
+        elif profile is True:
+            self.profiler = QueryProfiler()
+        elif isinstance(profile, dict):
+            self.profiler = QueryProfiler(**profile)
+        else:
+            self.profiler = profile or None
+        if self.profiler:
+            self.profiler.instrument(self)
+    
+    @property
+    def connection(self):
+        return getattr(self._local, 'connection', None)
+    
+    @connection.setter
+    def connection(self, value):
+        self._local.connection = value
+    
+    @property
+    def cursor(self):
+        return getattr(self._local, 'cursor', None)
+    
+    @cursor.setter
+    def cursor(self, value):
+        self._local.cursor = value
         
     def ensure_directory_exists(self):
         """Ensure database directory exists"""
         directory = os.path.dirname(self.database_path)
-        if not os.path.exists(directory):
+        if directory and not os.path.exists(directory):
             os.makedirs(directory)
     
-    def connect_database(self):
-        """Connect to SQLite database"""
+    def _open_connection(self, read_only=False):
+        """Open a new SQLite connection with the configured storage profile"""
+        # Pooled connections may be closed from another thread by close_pool()
+        check_same_thread = self.pool is None
+        if read_only:
+            connection = ReadOnlyConnection(self.database_path, check_same_thread=check_same_thread,
+                                            cached_statements=STATEMENT_CACHE_SIZE)
+        else:
+            connection = sqlite3.connect(self.database_path, check_same_thread=check_same_thread,
+                                         cached_statements=STATEMENT_CACHE_SIZE)
+        connection.execute("PRAGMA foreign_keys = ON")  # Enable foreign key constraints
+        register_content_functions(connection)
+        apply_storage_profile(connection, self.storage_settings, read_only)
+        if self.profiler:
+            connection.set_trace_callback(self.profiler.trace)
+        return connection
+    
+    def connect_database(self, read_only=False):
+        """Connect to SQLite database
+
+        read_only connections are meant for statistics queries; they never
+        take the write lock, so under the 'wal' profile they run concurrently
+        with writers.
+        """
         try:
-            self.connection = sqlite3.connect(self.database_path)
-            self.connection.execute("PRAGMA foreign_keys = ON")  # Enable foreign key constraints
+            pool = self.reader_pool if read_only else self.pool
+            if pool:
+                self.connection = pool.acquire()
+            else:
+                self.connection = self._open_connection(read_only)
+            self._local.pool = pool
             self.cursor = self.connection.cursor()
             return True
         except sqlite3.Error as e:
@@ -31,167 +146,134 @@ class DatabaseManager:
             return False
     
     def close_connection(self):
-        """Close database connection"""
+        """Close database connection (or hand it back to the pool)"""
         if self.connection:
-            self.connection.close()
+            pool = getattr(self._local, 'pool', None)
+            if pool:
+                self.cursor.close()
+                pool.release(self.connection)
+            else:
+                self.queries.forget_connection(self.connection)
+                self.connection.close()
             self.connection = None
             self.cursor = None
+            self._local.pool = None
+        # Committed changes go out once the connection is back, so subscribers may use the manager
+        changes = getattr(self._local, 'changes', None)
+        if changes:
+            self._local.changes = []
+            self.changes.publish(changes)
+    
+    def _record_change(self, table, op, primary_key, changed_columns, row):
+        """Queue a change event of a committed write, published by close_connection"""
+        if not self.changes.active:
+            return
+        if getattr(self._local, 'changes', None) is None:
+            self._local.changes = []
+        self._local.changes.append(self.changes.event(table, op, primary_key, changed_columns, row))
     
-    def initialize_database(self):
-        """Create all necessary tables"""
+    def _rows(self, rows, row_type, name):
+        """Convert rows fetched with self.cursor, row_type None meaning the manager default"""
+        return convert_rows(self.cursor, rows, row_type or self.row_type, name)
+    
+    def _cache_get(self, key):
+        """Return (found, value) from the read-through cache"""
+        if self.cache is None:
+            return False, None
+        return self.cache.get(key)
+    
+    def _cache_put(self, key, value):
+        # None results are not cached, so a later insert needs no invalidation
+        if self.cache is not None and value is not None:
+            self.cache.put(key, value)
+    
+    def _cache_evict(self, *keys):
+        if self.cache is not None:
+            self.cache.invalidate(*keys)
+    
+    def _evict_habit_lists(self, habit_ids):
+        """Evict cached habit lists of the children owning these habits"""
+        if self.cache is None or not habit_ids:
+            return
+        habit_ids = list(set(habit_ids))
+        placeholders = ', '.join('?' for habit_id in habit_ids)
+        self.cursor.execute(f"SELECT DISTINCT child_id FROM habit_formation WHERE habit_id IN ({placeholders})", habit_ids)
+        self._cache_evict(*[('habits', row[0]) for row in self.cursor.fetchall()])
+    
+    def cache_stats(self):
+        """Hit/miss counters of the read-through cache, None when caching is off"""
+        return self.cache.stats() if self.cache is not None else None
+    
+    def close_pool(self):
+        """Close all pooled connections, e.g. on application exit"""
+        if self.pool:
+            self.pool.close_all()
+            self.reader_pool.close_all()
+            self.queries.forget_connection()
+    
+    def initialize_database(self, background_backfill=False):
+        """Create all necessary tables by applying pending schema migrations
+
+        Data backfills of new migrations run in small batches afterwards,
+        on a background thread when background_backfill is True.
+        """
         if not self.connect_database():
             return False
         
         try:
-            # Create users table
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                password TEXT NOT NULL,
-                user_type TEXT NOT NULL,  -- 'child' or 'parent'
-                creation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
-            
-            # Create children information table
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS children_info (
-                child_id INTEGER PRIMARY KEY,
-                parent_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                age INTEGER,
-                gender TEXT,
-                interests TEXT,
-                FOREIGN KEY (child_id) REFERENCES users(user_id) ON DELETE CASCADE,
-                FOREIGN KEY (parent_id) REFERENCES users(user_id) ON DELETE CASCADE
-            )
-            ''')
-            
-            # Create content resources table
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS content_resources (
-                resource_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                type TEXT NOT NULL,  -- 'story', 'song', 'game', 'learning'
-                subtype TEXT,  -- like 'fairy tale', 'fable' etc.
-                description TEXT,
-                content_path TEXT NOT NULL,
-                thumbnail_path TEXT,
-                age_range TEXT,  -- like '2-4 years', '5-7 years' etc.
-                tags TEXT,
-                creation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
+            runner = MigrationRunner(self.connection)
+            applied_versions = runner.upgrade()
+            if applied_versions:
+                print(f"Applied schema migrations: {applied_versions}, schema version: {runner.current_version()}")
             
-            # Create usage records table
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS usage_records (
-                record_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                resource_id INTEGER,
-                activity_type TEXT NOT NULL,  -- 'browse', 'play', 'learn', 'game' etc.
-                start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                end_time TIMESTAMP,
-                duration INTEGER,  -- unit: seconds
-                completion_status TEXT,  -- 'completed', 'interrupted', 'abandoned' etc.
-                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
-                FOREIGN KEY (resource_id) REFERENCES content_resources(resource_id) ON DELETE SET NULL
-            )
-            ''')
-            
-            # Create learning progress table
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS learning_progress (
-                progress_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                child_id INTEGER NOT NULL,
-                subject TEXT NOT NULL,  -- 'literacy', 'arithmetic', 'english' etc.
-                topic TEXT NOT NULL,
-                level INTEGER NOT NULL,
-                completion_rate REAL DEFAULT 0,  -- 0-100 percentage
-                last_learning_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (child_id) REFERENCES children_info(child_id) ON DELETE CASCADE
-            )
-            ''')
-            
-            # Create habit formation table
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS habit_formation (
-                habit_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                child_id INTEGER NOT NULL,
-                habit_name TEXT NOT NULL,
-                description TEXT,
-                frequency TEXT NOT NULL,  -- 'daily', 'weekly' etc.
-                reminder_time TEXT,
-                creation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (child_id) REFERENCES children_info(child_id) ON DELETE CASCADE
-            )
-            ''')
-            
-            # Create habit completion records table
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS habit_completion_records (
-                record_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                habit_id INTEGER NOT NULL,
-                completion_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                completion_status TEXT NOT NULL,  -- 'completed', 'partially completed', 'not completed'
-                notes TEXT,
-                FOREIGN KEY (habit_id) REFERENCES habit_formation(habit_id) ON DELETE CASCADE
-            )
-            ''')
-            
-            # Create parental control settings table
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS parental_control_settings (
-                setting_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                parent_id INTEGER NOT NULL,
-                child_id INTEGER NOT NULL,
-                daily_time_limit INTEGER,  -- unit: minutes
-                disabled_periods TEXT,  -- JSON format storing multiple time periods
-                content_filter_level TEXT,  -- 'low', 'medium', 'high'
-                allowed_content_types TEXT,  -- JSON format storing allowed content types
-                update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (parent_id) REFERENCES users(user_id) ON DELETE CASCADE,
-                FOREIGN KEY (child_id) REFERENCES children_info(child_id) ON DELETE CASCADE
-            )
-            ''')
-            
-            # Create system settings table
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS system_settings (
-                setting_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                setting_type TEXT NOT NULL,  -- 'interface', 'sound', 'notification' etc.
-                setting_name TEXT NOT NULL,
-                setting_value TEXT NOT NULL,
-                update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-            )
-            ''')
-            
-            self.connection.commit()
             print("Database initialized successfully")
-            return True
-            
         except sqlite3.Error as e:
             print(f"Database initialization error: {e}")
             self.connection.rollback()
             return False
         finally:
             self.close_connection()
+        
+        if background_backfill:
+            threading.Thread(target=self.run_pending_backfills, daemon=True).start()
+        else:
+            self.run_pending_backfills()
+        return True
+    
+    def run_pending_backfills(self):
+        """Run unfinished migration backfills in small committed batches"""
+        if not self.connect_database():
+            return False
+        
+        try:
+            MigrationRunner(self.connection).run_backfills()
+            return True
+        except sqlite3.Error as e:
+            print(f"Migration backfill error: {e}")
+            self.connection.rollback()
+            return False
+        finally:
+            self.close_connection()
     
     def add_user(self, username, password, user_type):
-        """Add new user"""
+        """Add new user, the password is stored as a scrypt hash
+
+        Hashing costs one scrypt derivation on the calling thread; the GUI
+        goes through passwords.CredentialVerifier.create_account instead.
+        """
+        password_hash = self.password_hasher.hash(password)
         if not self.connect_database():
             return False
         
         try:
             self.cursor.execute(
                 "INSERT INTO users (username, password, user_type) VALUES (?, ?, ?)",
-                (username, password, user_type)
+                (username, password_hash, user_type)
             )
             self.connection.commit()
             user_id = self.cursor.lastrowid
+            self._record_change('users', 'insert', user_id, ('username', 'password', 'user_type'),
+                                {'user_id': user_id, 'username': username, 'user_type': user_type})
             print(f"User added successfully, ID: {user_id}")
             return user_id
         except sqlite3.Error as e:
@@ -212,6 +294,11 @@ class DatabaseManager:
                 (child_id, parent_id, name, age, gender, interests)
             )
             self.connection.commit()
+            self._cache_evict(('child', child_id))
+            self._record_change('children_info', 'insert', child_id,
+                                ('parent_id', 'name', 'age', 'gender', 'interests'),
+                                {'child_id': child_id, 'parent_id': parent_id, 'name': name, 'age': age,
+                                 'gender': gender, 'interests': interests})
             print(f"Child information added successfully, ID: {child_id}")
             return True
         except sqlite3.Error as e:
@@ -231,8 +318,15 @@ class DatabaseManager:
                 "INSERT INTO content_resources (title, type, subtype, description, content_path, thumbnail_path, age_range, tags) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
                 (title, type, subtype, description, content_path, thumbnail_path, age_range, tags)
             )
-            self.connection.commit()
             resource_id = self.cursor.lastrowid
+            replace_resource_tags(self.cursor, resource_id, tags)
+            self.connection.commit()
+            self._record_change('content_resources', 'insert', resource_id,
+                                ('title', 'type', 'subtype', 'description', 'content_path', 'thumbnail_path',
+                                 'age_range', 'tags'),
+                                {'resource_id': resource_id, 'title': title, 'type': type, 'subtype': subtype,
+                                 'description': description, 'content_path': content_path,
+                                 'thumbnail_path': thumbnail_path, 'age_range': age_range, 'tags': tags})
             print(f"Content resource added successfully, ID: {resource_id}")
             return resource_id
         except sqlite3.Error as e:
@@ -254,6 +348,9 @@ class DatabaseManager:
             )
             self.connection.commit()
             record_id = self.cursor.lastrowid
+            self._record_change('usage_records', 'insert', record_id, ('user_id', 'resource_id', 'activity_type'),
+                                {'record_id': record_id, 'user_id': user_id, 'resource_id': resource_id,
+                                 'activity_type': activity_type})
             print(f"Usage record added successfully, ID: {record_id}")
             return record_id
         except sqlite3.Error as e:
@@ -274,7 +371,10 @@ class DatabaseManager:
                 end_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             
             # Get start time
-            self.cursor.execute("SELECT start_time FROM usage_records WHERE record_id = ?", (record_id,))
+            self.cursor.execute(
+                "SELECT start_time, user_id, activity_type, resource_id, duration FROM usage_records WHERE record_id = ?",
+                (record_id,)
+            )
             result = self.cursor.fetchone()
             if not result:
                 print(f"Record ID not found: {record_id}")
@@ -288,7 +388,21 @@ class DatabaseManager:
                 "UPDATE usage_records SET end_time = ?, duration = ?, completion_status = ? WHERE record_id = ?",
                 (end_time, duration, completion_status, record_id)
             )
+            
+            # Fold the session into the daily rollup; a re-closed session only adds the difference
+            user_id, activity_type, resource_id, previous_duration = result[1:]
+            if rollup_covers(self.cursor, record_id):
+                if previous_duration is None:
+                    self.cursor.execute(ROLLUP_SESSION_SQL, (user_id, result[0], activity_type, resource_id, duration, 1))
+                else:
+                    self.cursor.execute(ROLLUP_SESSION_SQL, (user_id, result[0], activity_type, resource_id, duration - previous_duration, 0))
+            
             self.connection.commit()
+            self._record_change('usage_records', 'update', record_id, ('end_time', 'duration', 'completion_status'),
+                                {'record_id': record_id, 'user_id': user_id, 'resource_id': resource_id,
+                                 'activity_type': activity_type, 'start_time': result[0], 'end_time': end_time,
+                                 'duration': duration, 'previous_duration': previous_duration,
+                                 'completion_status': completion_status})
             print(f"Usage record updated successfully, ID: {record_id}")
             return True
         except sqlite3.Error as e:
@@ -302,42 +416,44 @@ class DatabaseManager:
             self.close_connection()
     
     def add_learning_progress(self, child_id, subject, topic, level, completion_rate=0):
-        """Add or update learning progress"""
+        """Add or update learning progress
+
+        Single atomic upsert on (child_id, subject, topic, level); the stored
+        completion rate only ever goes up.
+        """
         if not self.connect_database():
             return False
         
         try:
-            # Check if progress record already exists
             self.cursor.execute(
-                "SELECT progress_id, completion_rate FROM learning_progress WHERE child_id = ? AND subject = ? AND topic = ? AND level = ?",
-                (child_id, subject, topic, level)
+                """INSERT INTO learning_progress (child_id, subject, topic, level, completion_rate)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (child_id, subject, topic, level) DO UPDATE SET
+                completion_rate = excluded.completion_rate, last_learning_time = CURRENT_TIMESTAMP
+                WHERE excluded.completion_rate > completion_rate
+                RETURNING progress_id""",
+                (child_id, subject, topic, level, completion_rate)
             )
-            
+            # No row comes back when the existing rate is not lower, i.e. nothing was written
             result = self.cursor.fetchone()
-            
-            if result:
-                # If exists, update only if new completion rate is higher
-                progress_id, current_completion_rate = result
-                if completion_rate > current_completion_rate:
-                    self.cursor.execute(
-                        "UPDATE learning_progress SET completion_rate = ?, last_learning_time = CURRENT_TIMESTAMP WHERE progress_id = ?",
-                        (completion_rate, progress_id)
-                    )
-                    self.connection.commit()
-                    print(f"Learning progress updated successfully, ID: {progress_id}")
-                else:
-                    print(f"Learning progress not updated, current rate is higher: {current_completion_rate} > {completion_rate}")
-                return progress_id
-            else:
-                # If not exists, add new record
+            if result is None:
                 self.cursor.execute(
-                    "INSERT INTO learning_progress (child_id, subject, topic, level, completion_rate) VALUES (?, ?, ?, ?, ?)",
-                    (child_id, subject, topic, level, completion_rate)
+                    "SELECT progress_id, completion_rate FROM learning_progress WHERE child_id = ? AND subject = ? AND topic = ? AND level = ?",
+                    (child_id, subject, topic, level)
                 )
+                progress_id, current_completion_rate = self.cursor.fetchone()
                 self.connection.commit()
-                progress_id = self.cursor.lastrowid
-                print(f"Learning progress added successfully, ID: {progress_id}")
+                print(f"Learning progress not updated, current rate is not lower: {current_completion_rate} >= {completion_rate}")
                 return progress_id
+            
+            progress_id = result[0]
+            self.connection.commit()
+            self._record_change('learning_progress', 'upsert', progress_id,
+                                ('completion_rate', 'last_learning_time'),
+                                {'progress_id': progress_id, 'child_id': child_id, 'subject': subject,
+                                 'topic': topic, 'level': level, 'completion_rate': completion_rate})
+            print(f"Learning progress saved successfully, ID: {progress_id}")
+            return progress_id
         except sqlite3.Error as e:
             print(f"Add learning progress error: {e}")
             self.connection.rollback()
@@ -357,6 +473,11 @@ class DatabaseManager:
             )
             self.connection.commit()
             habit_id = self.cursor.lastrowid
+            self._cache_evict(('habits', child_id))
+            self._record_change('habit_formation', 'insert', habit_id,
+                                ('child_id', 'habit_name', 'description', 'frequency', 'reminder_time'),
+                                {'habit_id': habit_id, 'child_id': child_id, 'habit_name': habit_name,
+                                 'description': description, 'frequency': frequency, 'reminder_time': reminder_time})
             print(f"Habit added successfully, ID: {habit_id}")
             return habit_id
         except sqlite3.Error as e:
@@ -378,6 +499,11 @@ class DatabaseManager:
             )
             self.connection.commit()
             record_id = self.cursor.lastrowid
+            self._evict_habit_lists([habit_id])
+            self._record_change('habit_completion_records', 'insert', record_id,
+                                ('habit_id', 'completion_status', 'notes'),
+                                {'record_id': record_id, 'habit_id': habit_id,
+                                 'completion_status': completion_status, 'notes': notes})
             print(f"Habit completion recorded successfully, ID: {record_id}")
             return record_id
         except sqlite3.Error as e:
@@ -388,49 +514,202 @@ class DatabaseManager:
             self.close_connection()
     
     def set_parental_control(self, parent_id, child_id, daily_time_limit=None, disabled_periods=None, content_filter_level=None, allowed_content_types=None):
-        """Set parental control settings"""
+        """Set parental control settings
+
+        Single atomic upsert on (parent_id, child_id); settings passed as
+        None keep their stored value.
+        """
         if not self.connect_database():
             return False
         
         try:
-            # Check if settings already exist
             self.cursor.execute(
-                "SELECT setting_id FROM parental_control_settings WHERE parent_id = ? AND child_id = ?",
-                (parent_id, child_id)
+                """INSERT INTO parental_control_settings 
+                (parent_id, child_id, daily_time_limit, disabled_periods, content_filter_level, allowed_content_types) 
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (parent_id, child_id) DO UPDATE SET
+                daily_time_limit = COALESCE(excluded.daily_time_limit, daily_time_limit),
+                disabled_periods = COALESCE(excluded.disabled_periods, disabled_periods),
+                content_filter_level = COALESCE(excluded.content_filter_level, content_filter_level),
+                allowed_content_types = COALESCE(excluded.allowed_content_types, allowed_content_types),
+                update_time = CURRENT_TIMESTAMP
+                RETURNING setting_id""",
+                (parent_id, child_id, daily_time_limit, disabled_periods, content_filter_level, allowed_content_types)
             )
+            setting_id = self.cursor.fetchone()[0]
+            self.connection.commit()
+            self._cache_evict(('parental_control', parent_id, child_id))
+            settings = {'daily_time_limit': daily_time_limit, 'disabled_periods': disabled_periods,
+                        'content_filter_level': content_filter_level, 'allowed_content_types': allowed_content_types}
+            self._record_change('parental_control_settings', 'upsert', setting_id,
+                                [column for column, value in settings.items() if value is not None] + ['update_time'],
+                                dict(settings, setting_id=setting_id, parent_id=parent_id, child_id=child_id))
+            print(f"Parental control settings saved successfully, ID: {setting_id}")
+            return setting_id
+        except sqlite3.Error as e:
+            print(f"Set parental control error: {e}")
+            self.connection.rollback()
+            return False
+        finally:
+            self.close_connection()
+    
+    @staticmethod
+    def _bulk_rows(items, fields):
+        """Normalize bulk input (dicts or tuples in field order) to dicts with every field present"""
+        rows = []
+        for item in items:
+            values = item if isinstance(item, dict) else dict(zip(fields, item))
+            rows.append({field: values.get(field) for field in fields})
+        return rows
+    
+    def _insert_bulk(self, sql, rows, after_insert=None):
+        """executemany an INSERT in one transaction and return the assigned row IDs
+
+        The write lock is held for the whole batch and no explicit IDs are
+        inserted, so AUTOINCREMENT hands out one contiguous block ending at
+        last_insert_rowid(). after_insert(first_id, last_id) runs in the same
+        transaction.
+        """
+        self.cursor.execute("BEGIN IMMEDIATE")
+        self.cursor.executemany(sql, rows)
+        last_id = self.cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        first_id = last_id - len(rows) + 1
+        if after_insert:
+            after_insert(first_id, last_id)
+        self.connection.commit()
+        return list(range(first_id, last_id + 1))
+    
+    def _rollup_usage_range(self, first_id, last_id):
+        """Add finished usage records in an ID range to the daily rollup"""
+        # New IDs lie beyond the backfill's reach until it has completed
+        if rollup_complete(self.cursor):
+            self.cursor.execute(ROLLUP_RECORD_RANGE_SQL, {'start_key': first_id, 'end_key': last_id})
+    
+    def add_usage_records_bulk(self, records):
+        """Add many usage records in a single transaction, return their IDs in input order
+
+        Each record is a dict (or tuple in this order) with user_id, resource_id,
+        activity_type and optionally start_time, end_time, duration and
+        completion_status. Missing start_time defaults to now; missing duration
+        is derived from start_time and end_time.
+        """
+        rows = self._bulk_rows(records, self.USAGE_RECORD_FIELDS)
+        if not rows:
+            return []
+        if not self.connect_database():
+            return False
+        
+        try:
+            record_ids = self._insert_bulk("""
+            INSERT INTO usage_records (user_id, resource_id, activity_type, start_time, end_time, duration, completion_status)
+            VALUES (:user_id, :resource_id, :activity_type, COALESCE(:start_time, CURRENT_TIMESTAMP), :end_time,
+                    COALESCE(:duration, CASE WHEN :end_time IS NOT NULL
+                        THEN strftime('%s', :end_time) - strftime('%s', COALESCE(:start_time, CURRENT_TIMESTAMP)) END),
+                    :completion_status)
+            """, rows, after_insert=self._rollup_usage_range)
+            for record_id, row in zip(record_ids, rows):
+                self._record_change('usage_records', 'insert', record_id,
+                                    [column for column in row if row[column] is not None], dict(row, record_id=record_id))
+            print(f"{len(record_ids)} usage records added successfully")
+            return record_ids
+        except sqlite3.Error as e:
+            print(f"Add usage records in bulk error: {e}")
+            self.connection.rollback()
+            return False
+        finally:
+            self.close_connection()
+    
+    def record_habit_completions_bulk(self, completions):
+        """Record many habit completions in a single transaction, return their IDs in input order
+
+        Each completion is a dict (or tuple in this order) with habit_id,
+        completion_status and optionally notes and completion_time.
+        """
+        rows = self._bulk_rows(completions, self.HABIT_COMPLETION_FIELDS)
+        if not rows:
+            return []
+        if not self.connect_database():
+            return False
+        
+        try:
+            record_ids = self._insert_bulk("""
+            INSERT INTO habit_completion_records (habit_id, completion_status, notes, completion_time)
+            VALUES (:habit_id, :completion_status, :notes, COALESCE(:completion_time, CURRENT_TIMESTAMP))
+            """, rows)
+            self._evict_habit_lists([row['habit_id'] for row in rows])
+            for record_id, row in zip(record_ids, rows):
+                self._record_change('habit_completion_records', 'insert', record_id,
+                                    [column for column in row if row[column] is not None], dict(row, record_id=record_id))
+            print(f"{len(record_ids)} habit completions recorded successfully")
+            return record_ids
+        except sqlite3.Error as e:
+            print(f"Record habit completions in bulk error: {e}")
+            self.connection.rollback()
+            return False
+        finally:
+            self.close_connection()
+    
+    def upsert_learning_progress_bulk(self, progress_items):
+        """Add or update many learning progress rows in a single transaction
+
+        Each item is a dict (or tuple in this order) with child_id, subject,
+        topic, level, completion_rate and optionally last_learning_time.
+        As in add_learning_progress, an existing row is only updated when the
+        new completion rate is higher. Returns the progress IDs in input order.
+        """
+        rows = self._bulk_rows(progress_items, self.LEARNING_PROGRESS_FIELDS)
+        if not rows:
+            return []
+        if not self.connect_database():
+            return False
+        
+        try:
+            for row in rows:
+                if row['completion_rate'] is None:
+                    row['completion_rate'] = 0
             
-            result = self.cursor.fetchone()
+            self.cursor.execute("BEGIN IMMEDIATE")
+            # Rates before the upsert, so only rows it actually changed produce change events
+            keys = [(row['child_id'], row['subject'], row['topic'], row['level']) for row in rows]
+            stored_rates = {}
+            if self.changes.active:
+                for key in set(keys):
+                    self.cursor.execute(
+                        "SELECT completion_rate FROM learning_progress WHERE child_id = ? AND subject = ? AND topic = ? AND level = ?",
+                        key
+                    )
+                    result = self.cursor.fetchone()
+                    if result:
+                        stored_rates[key] = result[0]
+            self.cursor.executemany("""
+            INSERT INTO learning_progress (child_id, subject, topic, level, completion_rate, last_learning_time)
+            VALUES (:child_id, :subject, :topic, :level, :completion_rate, COALESCE(:last_learning_time, CURRENT_TIMESTAMP))
+            ON CONFLICT (child_id, subject, topic, level) DO UPDATE SET
+            last_learning_time = CASE WHEN excluded.completion_rate > completion_rate
+                THEN excluded.last_learning_time ELSE last_learning_time END,
+            completion_rate = MAX(completion_rate, excluded.completion_rate)
+            """, rows)
             
-            if result:
-                # If exists, update
-                setting_id = result[0]
+            # executemany cannot return rows, look the IDs up by unique key
+            key_ids = {}
+            for key in set(keys):
                 self.cursor.execute(
-                    """UPDATE parental_control_settings SET 
-                    daily_time_limit = COALESCE(?, daily_time_limit),
-                    disabled_periods = COALESCE(?, disabled_periods),
-                    content_filter_level = COALESCE(?, content_filter_level),
-                    allowed_content_types = COALESCE(?, allowed_content_types),
-                    update_time = CURRENT_TIMESTAMP
-                    WHERE setting_id = ?""",
-                    (daily_time_limit, disabled_periods, content_filter_level, allowed_content_types, setting_id)
+                    "SELECT progress_id FROM learning_progress WHERE child_id = ? AND subject = ? AND topic = ? AND level = ?",
+                    key
                 )
-                self.connection.commit()
-                print(f"Parental control settings updated successfully, ID: {setting_id}")
-                return setting_id
-            else:
-                # If not exists, add new record
-                self.cursor.execute(
-                    """INSERT INTO parental_control_settings 
-                    (parent_id, child_id, daily_time_limit, disabled_periods, content_filter_level, allowed_content_types) 
-                    VALUES (?, ?, ?, ?, ?, ?)""",
-                    (parent_id, child_id, daily_time_limit, disabled_periods, content_filter_level, allowed_content_types)
-                )
-                self.connection.commit()
-                setting_id = self.cursor.lastrowid
-                print(f"Parental control settings added successfully, ID: {setting_id}")
-                return setting_id
+                key_ids[key] = self.cursor.fetchone()[0]
+            progress_ids = [key_ids[key] for key in keys]
+            self.connection.commit()
+            for progress_id, key, row in zip(progress_ids, keys, rows):
+                if key in stored_rates and row['completion_rate'] <= stored_rates[key]:
+                    continue
+                stored_rates[key] = row['completion_rate']
+                self._record_change('learning_progress', 'upsert', progress_id, ('completion_rate', 'last_learning_time'),
+                                    dict(row, progress_id=progress_id))
+            print(f"{len(progress_ids)} learning progress rows upserted successfully")
+            return progress_ids
         except sqlite3.Error as e:
-            print(f"Set parental control error: {e}")
+            print(f"Upsert learning progress in bulk error: {e}")
             self.connection.rollback()
             return False
         finally:
@@ -438,6 +717,10 @@ class DatabaseManager:
     
     def get_user_info(self, username=None, user_id=None):
         """Get user information"""
+        cache_key = ('user_name', username) if username else ('user', user_id)
+        found, cached = self._cache_get(cache_key)
+        if found:
+            return cached
         if not self.connect_database():
             return None
         
@@ -453,7 +736,9 @@ class DatabaseManager:
             result = self.cursor.fetchone()
             if result:
                 column_names = [description[0] for description in self.cursor.description]
-                return dict(zip(column_names, result))
+                user_info = dict(zip(column_names, result))
+                self._cache_put(cache_key, user_info)
+                return user_info
             else:
                 return None
         except sqlite3.Error as e:
@@ -464,6 +749,9 @@ class DatabaseManager:
     
     def get_child_info(self, child_id):
         """Get child detailed information"""
+        found, cached = self._cache_get(('child', child_id))
+        if found:
+            return cached
         if not self.connect_database():
             return None
         
@@ -478,7 +766,9 @@ class DatabaseManager:
             result = self.cursor.fetchone()
             if result:
                 column_names = [description[0] for description in self.cursor.description]
-                return dict(zip(column_names, result))
+                child_info = dict(zip(column_names, result))
+                self._cache_put(('child', child_id), child_info)
+                return child_info
             else:
                 return None
         except sqlite3.Error as e:
@@ -487,7 +777,7 @@ class DatabaseManager:
         finally:
             self.close_connection()
     
-    def get_parent_children_list(self, parent_id):
+    def get_parent_children_list(self, parent_id, row_type=None):
         """Get all children information associated with parent"""
         if not self.connect_database():
             return []
@@ -502,8 +792,7 @@ class DatabaseManager:
             
             results = self.cursor.fetchall()
             if results:
-                column_names = [description[0] for description in self.cursor.description]
-                return [dict(zip(column_names, row)) for row in results]
+                return self._rows(results, row_type, 'ChildInfo')
             else:
                 return []
         except sqlite3.Error as e:
@@ -512,40 +801,77 @@ class DatabaseManager:
         finally:
             self.close_connection()
     
-    def get_content_resources(self, type=None, subtype=None, age_range=None, tags=None, limit=10):
-        """Get content resources list, can be filtered by conditions"""
+    def _content_filter(self, type=None, subtype=None, age_range=None, tags=None, tag_match="all"):
+        """Filter shape and named parameters shared by the content listing methods
+
+        The shape records which filters are present; together with the listing
+        mode it selects one canonical statement from the query registry.
+        """
+        tag_list = split_tags(tags)
+        if tag_list and tag_match not in ("all", "any"):
+            raise ValueError(f"Unknown tag match mode: {tag_match}")
+        params = {
+            'type': type,
+            'subtype': subtype,
+            'age_range': age_range,
+            'tags': json.dumps(tag_list, ensure_ascii=False),
+        }
+        shape = (bool(type), bool(subtype), bool(age_range), tag_match if tag_list else None)
+        return shape, params
+    
+    @staticmethod
+    def _content_listing_sql(shape):
+        """Build the statement for one content filter shape and mode ('limit', 'page' or 'stream')"""
+        has_type, has_subtype, has_age_range, tag_match, mode = shape
+        query = "SELECT * FROM content_resources WHERE 1=1"
+        if has_type:
+            query += " AND type = :type"
+        if has_subtype:
+            query += " AND subtype = :subtype"
+        if has_age_range:
+            query += " AND age_range = :age_range"
+        if tag_match:
+            query += " AND " + tag_filter_statement(tag_match)
+        if mode == 'page':
+            query += " AND (creation_time, resource_id) < (:after_time, :after_id)"
+        query += " ORDER BY creation_time DESC, resource_id DESC"
+        if mode != 'stream':
+            query += " LIMIT :limit"
+        return query
+    
+    @staticmethod
+    def _learning_progress_sql(has_subject):
+        query = "SELECT * FROM learning_progress WHERE child_id = :child_id"
+        if has_subject:
+            query += " AND subject = :subject"
+        return query + " ORDER BY subject, level"
+    
+    def profile_report(self):
+        """Latency histograms, row counts and slow queries recorded by the profiler, None when it is off"""
+        return self.profiler.report() if self.profiler else None
+    
+    def query_stats(self):
+        """Prepare versus execute timings of the registered listing queries, see QueryRegistry.stats()"""
+        return self.queries.stats()
+    
+    def get_content_resources(self, type=None, subtype=None, age_range=None, tags=None, limit=10, tag_match="all", row_type=None):
+        """Get content resources list, can be filtered by conditions
+
+        tags is a tag, a comma-separated string or a list of tags, matched
+        exactly through the content_tags index; tag_match 'all' requires every
+        tag, 'any' at least one.
+        """
         if not self.connect_database():
             return []
         
         try:
-            query = "SELECT * FROM content_resources WHERE 1=1"
-            params = []
-            
-            if type:
-                query += " AND type = ?"
-                params.append(type)
+            shape, params = self._content_filter(type, subtype, age_range, tags, tag_match)
+            query = self.queries.statement('get_content_resources', shape + ('limit',), self._content_listing_sql)
+            params['limit'] = limit
             
-            if subtype:
-                query += " AND subtype = ?"
-                params.append(subtype)
-            
-            if age_range:
-                query += " AND age_range = ?"
-                params.append(age_range)
-            
-            if tags:
-                query += " AND tags LIKE ?"
-                params.append(f"%{tags}%")
-            
-            query += " ORDER BY creation_time DESC LIMIT ?"
-            params.append(limit)
-            
-            self.cursor.execute(query, params)
-            
-            results = self.cursor.fetchall()
+            results = self.queries.fetchall(self.cursor, 'get_content_resources', query, params)
             if results:
-                column_names = [description[0] for description in self.cursor.description]
-                return [dict(zip(column_names, row)) for row in results]
+                return self._rows(results, row_type, 'ContentResource')
             else:
                 return []
         except sqlite3.Error as e:
@@ -554,63 +880,151 @@ class DatabaseManager:
         finally:
             self.close_connection()
     
-    def get_usage_statistics(self, user_id, start_date=None, end_date=None):
-        """Get user usage statistics"""
+    def get_content_resources_page(self, type=None, subtype=None, age_range=None, tags=None, page_size=20, after=None, tag_match="all", row_type=None):
+        """Get one page of content resources, newest first, using keyset pagination
+
+        after is the 'next_cursor' of the previous page, a (creation_time,
+        resource_id) pair; each page seeks straight to it through the index
+        instead of re-reading the rows before it as OFFSET would.
+        Returns {'items': [...], 'next_cursor': cursor or None when exhausted}.
+        """
         if not self.connect_database():
+            return {'items': [], 'next_cursor': None}
+        
+        try:
+            shape, params = self._content_filter(type, subtype, age_range, tags, tag_match)
+            mode = 'page' if after else 'limit'
+            query = self.queries.statement('get_content_resources_page', shape + (mode,), self._content_listing_sql)
+            if after:
+                params['after_time'], params['after_id'] = after
+            params['limit'] = page_size
+            
+            results = self.queries.fetchall(self.cursor, 'get_content_resources_page', query, params)
+            next_cursor = None
+            if len(results) == page_size:
+                last = self._rows(results[-1:], 'dict', 'ContentResource')[0]
+                next_cursor = (last['creation_time'], last['resource_id'])
+            return {'items': self._rows(results, row_type, 'ContentResource'), 'next_cursor': next_cursor}
+        except sqlite3.Error as e:
+            print(f"Get content resources page error: {e}")
+            return {'items': [], 'next_cursor': None}
+        finally:
+            self.close_connection()
+    
+    def iter_content_resources(self, type=None, subtype=None, age_range=None, tags=None, tag_match="all", batch_size=200, row_type=None):
+        """Stream content resources, newest first, without loading them all into memory"""
+        shape, params = self._content_filter(type, subtype, age_range, tags, tag_match)
+        query = self.queries.statement('iter_content_resources', shape + ('stream',), self._content_listing_sql)
+        return self._stream_query('iter_content_resources', query, params, batch_size,
+                                  "Stream content resources error", row_type, 'ContentResource')
+    
+    def iter_learning_progress(self, child_id, subject=None, batch_size=200, row_type=None):
+        """Stream a child's learning progress in the same order as get_learning_progress"""
+        query = self.queries.statement('iter_learning_progress', bool(subject), self._learning_progress_sql)
+        return self._stream_query('iter_learning_progress', query, {'child_id': child_id, 'subject': subject},
+                                  batch_size, "Stream learning progress error", row_type, 'LearningProgress')
+    
+    def iter_parent_children(self, parent_id, batch_size=200, row_type=None):
+        """Stream all children information associated with parent"""
+        query = """
+        SELECT c.*, u.username 
+        FROM children_info c
+        JOIN users u ON c.child_id = u.user_id
+        WHERE c.parent_id = ?
+        """
+        return self._stream_query('iter_parent_children', query, [parent_id], batch_size,
+                                  "Stream parent's children error", row_type, 'ChildInfo')
+    
+    def iter_search_content(self, keyword, type=None, batch_size=50, highlight=('<b>', '</b>'), row_type=None):
+        """Stream all search_content matches, best first"""
+        if not keyword or not keyword.strip():
+            return iter(())
+        keyword = keyword.strip()
+        params = {'type': type, 'limit': -1}
+        if len(keyword) >= MIN_INDEXED_KEYWORD_LENGTH and self._content_search_available():
+            params.update(query=fts_phrase(keyword), open_mark=highlight[0], close_mark=highlight[1])
+            return self._stream_query('iter_search_content', SEARCH_SQL, params, batch_size,
+                                      "Stream search content error", row_type, 'SearchResult')
+        if len(keyword) == BIGRAM_KEYWORD_LENGTH:
+            params['bigram'] = keyword.lower()
+            return self._stream_query('iter_search_content', BIGRAM_SEARCH_SQL, params, batch_size,
+                                      "Stream search content error", row_type, 'SearchResult')
+        params['pattern'] = f"%{keyword}%"
+        return self._stream_query('iter_search_content', LIKE_SEARCH_SQL, params, batch_size,
+                                  "Stream search content error", row_type, 'SearchResult')
+    
+    def _stream_query(self, name, query, params, batch_size, error_message, row_type=None, row_name='Row'):
+        """Yield result rows (as row_type, see row_types.py), fetching batch_size rows at a time
+
+        Runs on a private read-only connection rather than the thread's
+        current one, so the caller may use other DatabaseManager methods while
+        iterating. The connection is closed when the generator is exhausted
+        or discarded.
+        """
+        connection = None
+        try:
+            connection = ReadOnlyConnection(self.database_path)
+            apply_storage_profile(connection, self.storage_settings, read_only=True)
+            cursor = self.queries.execute(connection.cursor(), name, query, params)
+            convert = row_converter(cursor, row_type or self.row_type, row_name)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from map(convert, rows)
+        except sqlite3.Error as e:
+            print(f"{error_message}: {e}")
+        finally:
+            if connection:
+                self.queries.forget_connection(connection)
+                connection.close()
+    
+    def get_usage_statistics(self, user_id, start_date=None, end_date=None):
+        """Get user usage statistics
+
+        start_date and end_date are 'YYYY-MM-DD'; any other value gives {},
+        like a database error.
+        """
+        if not self.connect_database(read_only=True):
             return {}
         
         try:
             # If date range not provided, default to last 30 days
             if not start_date:
-                start_date = (datetime.now() - datetime.timedelta(days=30)).strftime('%Y-%m-%d')
+                start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
             if not end_date:
                 end_date = datetime.now().strftime('%Y-%m-%d')
+            # Compared as text below, so a malformed date would silently match nothing
+            date.fromisoformat(start_date)
+            date.fromisoformat(end_date)
             
-            # Total usage duration
-            self.cursor.execute("""
-            SELECT SUM(duration) 
-            FROM usage_records 
-            WHERE user_id = ? AND start_time BETWEEN ? AND ?
-            """, (user_id, start_date, end_date + ' 23:59:59'))
+            # Answer from the daily rollup; fall back to raw records only while
+            # an upgraded database is still backfilling it
+            if rollup_complete(self.cursor):
+                queries = USAGE_STATISTICS_QUERIES['rollup']
+                params = (user_id, start_date, end_date)
+            else:
+                queries = USAGE_STATISTICS_QUERIES['records']
+                params = (user_id, start_date, end_date + ' 23:59:59')
             
+            # Total usage duration
+            self.cursor.execute(queries['total'], params)
             total_duration = self.cursor.fetchone()[0] or 0
             
             # Statistics by activity type
-            self.cursor.execute("""
-            SELECT activity_type, SUM(duration) as duration
-            FROM usage_records 
-            WHERE user_id = ? AND start_time BETWEEN ? AND ?
-            GROUP BY activity_type
-            """, (user_id, start_date, end_date + ' 23:59:59'))
-            
+            self.cursor.execute(queries['by_activity'], params)
             activity_statistics = {}
             for row in self.cursor.fetchall():
                 activity_statistics[row[0]] = row[1]
             
             # Statistics by date
-            self.cursor.execute("""
-            SELECT date(start_time) as date, SUM(duration) as duration
-            FROM usage_records 
-            WHERE user_id = ? AND start_time BETWEEN ? AND ?
-            GROUP BY date(start_time)
-            ORDER BY date
-            """, (user_id, start_date, end_date + ' 23:59:59'))
-            
+            self.cursor.execute(queries['by_date'], params)
             date_statistics = {}
             for row in self.cursor.fetchall():
                 date_statistics[row[0]] = row[1]
             
             # Most frequently used content
-            self.cursor.execute("""
-            SELECT r.resource_id, c.title, c.type, SUM(r.duration) as duration
-            FROM usage_records r
-            JOIN content_resources c ON r.resource_id = c.resource_id
-            WHERE r.user_id = ? AND r.start_time BETWEEN ? AND ?
-            GROUP BY r.resource_id
-            ORDER BY duration DESC
-            LIMIT 5
-            """, (user_id, start_date, end_date + ' 23:59:59'))
-            
+            self.cursor.execute(queries['frequent_content'], params)
             frequent_content = []
             for row in self.cursor.fetchall():
                 frequent_content.append({
@@ -626,33 +1040,24 @@ class DatabaseManager:
                 'date_statistics': date_statistics,
                 'frequent_content': frequent_content
             }
-        except sqlite3.Error as e:
+        except (sqlite3.Error, ValueError) as e:
             print(f"Get usage statistics error: {e}")
             return {}
         finally:
             self.close_connection()
     
-    def get_learning_progress(self, child_id, subject=None):
+    def get_learning_progress(self, child_id, subject=None, row_type=None):
         """Get child learning progress"""
         if not self.connect_database():
             return []
         
         try:
-            query = "SELECT * FROM learning_progress WHERE child_id = ?"
-            params = [child_id]
-            
-            if subject:
-                query += " AND subject = ?"
-                params.append(subject)
-            
-            query += " ORDER BY subject, level"
+            query = self.queries.statement('get_learning_progress', bool(subject), self._learning_progress_sql)
+            params = {'child_id': child_id, 'subject': subject}
             
-            self.cursor.execute(query, params)
-            
-            results = self.cursor.fetchall()
+            results = self.queries.fetchall(self.cursor, 'get_learning_progress', query, params)
             if results:
-                column_names = [description[0] for description in self.cursor.description]
-                return [dict(zip(column_names, row)) for row in results]
+                return self._rows(results, row_type, 'LearningProgress')
             else:
                 return []
         except sqlite3.Error as e:
@@ -661,25 +1066,27 @@ class DatabaseManager:
         finally:
             self.close_connection()
     
-    def get_habit_list(self, child_id):
+    def get_habit_list(self, child_id, row_type=None):
         """Get child's habit formation list"""
+        # Only the default dict representation is cached
+        cacheable = (row_type or self.row_type) == 'dict'
+        if cacheable:
+            found, cached = self._cache_get(('habits', child_id))
+            if found:
+                return cached
         if not self.connect_database():
             return []
         
         try:
-            self.cursor.execute("""
-            SELECT h.*, 
-                  (SELECT COUNT(*) FROM habit_completion_records WHERE habit_id = h.habit_id AND completion_status = 'completed') as completion_count,
-                  (SELECT completion_time FROM habit_completion_records WHERE habit_id = h.habit_id ORDER BY completion_time DESC LIMIT 1) as last_completion_time
-            FROM habit_formation h
-            WHERE h.child_id = ?
-            ORDER BY h.habit_name
-            """, (child_id,))
+            # Counters and streaks are precomputed in habit_stats, see habit_stats.py
+            self.cursor.execute(HABIT_LIST_SQL, (child_id,))
             
             results = self.cursor.fetchall()
             if results:
-                column_names = [description[0] for description in self.cursor.description]
-                return [dict(zip(column_names, row)) for row in results]
+                habits = self._rows(results, row_type, 'Habit')
+                if cacheable:
+                    self._cache_put(('habits', child_id), habits)
+                return habits
             else:
                 return []
         except sqlite3.Error as e:
@@ -690,6 +1097,9 @@ class DatabaseManager:
     
     def get_parental_control_settings(self, parent_id, child_id):
         """Get parental control settings"""
+        found, cached = self._cache_get(('parental_control', parent_id, child_id))
+        if found:
+            return cached
         if not self.connect_database():
             return None
         
@@ -702,7 +1112,9 @@ class DatabaseManager:
             result = self.cursor.fetchone()
             if result:
                 column_names = [description[0] for description in self.cursor.description]
-                return dict(zip(column_names, result))
+                settings = dict(zip(column_names, result))
+                self._cache_put(('parental_control', parent_id, child_id), settings)
+                return settings
             else:
                 return None
         except sqlite3.Error as e:
@@ -712,55 +1124,94 @@ class DatabaseManager:
             self.close_connection()
     
     def authenticate_user(self, username, password):
-        """Authenticate user login"""
+        """Authenticate user login
+
+        Returns {'user_id', 'user_type', 'session_token'} or None. The
+        password check costs one scrypt derivation, so call this off the GUI
+        thread (passwords.CredentialVerifier); a repeated login within
+        session_ttl seconds, or authenticate_session with the token, skips
+        it. A plain-text or outdated stored password is rehashed on success.
+        The cached login is checked against the stored hash, so it stops
+        working as soon as the password changes or the user is deleted.
+        """
         if not self.connect_database():
             return None
         
         try:
             self.cursor.execute("""
-            SELECT user_id, user_type FROM users
-            WHERE username = ? AND password = ?
-            """, (username, password))
+            SELECT user_id, user_type, password FROM users
+            WHERE username = ?
+            """, (username,))
             
             result = self.cursor.fetchone()
-            if result:
-                return {
-                    'user_id': result[0],
-                    'user_type': result[1]
-                }
-            else:
+            cached = self.sessions.lookup_credentials(username, password, result[2] if result else None)
+            if cached:
+                return cached
+            if not result:
+                self.password_hasher.dummy_verify(password)
                 return None
+            user_id, user_type, stored = result
+            matches, needs_rehash = self.password_hasher.verify(password, stored)
+            if not matches:
+                return None
+            if needs_rehash:
+                # Only replaces the value that was verified, a concurrent change wins
+                rehashed = self.password_hasher.hash(password)
+                self.cursor.execute(
+                    "UPDATE users SET password = ? WHERE user_id = ? AND password = ?",
+                    (rehashed, user_id, stored)
+                )
+                self.connection.commit()
+                self._cache_evict(('user', user_id), ('user_name', username))
+                stored = rehashed
+            user = {
+                'user_id': user_id,
+                'user_type': user_type
+            }
+            return dict(user, session_token=self.sessions.issue(username, password, user, stored))
         except sqlite3.Error as e:
             print(f"Authenticate user error: {e}")
+            if self.connection.in_transaction:
+                self.connection.rollback()
             return None
         finally:
             self.close_connection()
     
-    def search_content(self, keyword, type=None, limit=20):
-        """Search content resources"""
+    def authenticate_session(self, session_token):
+        """The user of a live session token from authenticate_user, or None"""
+        return self.sessions.lookup_token(session_token)
+    
+    def end_session(self, session_token):
+        """Log out: the token and the cached login stop working"""
+        self.sessions.revoke(session_token)
+    
+    def search_content(self, keyword, type=None, limit=20, highlight=('<b>', '</b>'), row_type=None):
+        """Search content resources
+
+        Uses the content_search full-text index ranked by bm25 when available,
+        and the content_bigrams index for two-character keywords. Each result
+        also carries 'title_highlight' and 'snippet'; full-text matches are
+        wrapped in the highlight markers.
+        """
+        if not keyword or not keyword.strip():
+            return []
         if not self.connect_database():
             return []
         
         try:
-            query = """
-            SELECT * FROM content_resources
-            WHERE (title LIKE ? OR description LIKE ? OR tags LIKE ?)
-            """
-            params = [f"%{keyword}%", f"%{keyword}%", f"%{keyword}%"]
-            
-            if type:
-                query += " AND type = ?"
-                params.append(type)
-            
-            query += " ORDER BY creation_time DESC LIMIT ?"
-            params.append(limit)
-            
-            self.cursor.execute(query, params)
-            
-            results = self.cursor.fetchall()
+            keyword = keyword.strip()
+            params = {'type': type, 'limit': limit}
+            if len(keyword) >= MIN_INDEXED_KEYWORD_LENGTH and self._content_search_available():
+                params.update(query=fts_phrase(keyword), open_mark=highlight[0], close_mark=highlight[1])
+                results = self.queries.fetchall(self.cursor, 'search_content', SEARCH_SQL, params)
+            elif len(keyword) == BIGRAM_KEYWORD_LENGTH:
+                params['bigram'] = keyword.lower()
+                results = self.queries.fetchall(self.cursor, 'search_content', BIGRAM_SEARCH_SQL, params)
+            else:
+                params['pattern'] = f"%{keyword}%"
+                results = self.queries.fetchall(self.cursor, 'search_content', LIKE_SEARCH_SQL, params)
             if results:
-                column_names = [description[0] for description in self.cursor.description]
-                return [dict(zip(column_names, row)) for row in results]
+                return self._rows(results, row_type, 'SearchResult')
             else:
                 return []
         except sqlite3.Error as e:
@@ -769,14 +1220,31 @@ class DatabaseManager:
         finally:
             self.close_connection()
     
-    def backup_database(self, backup_path=None):
-        """Backup database to specified path"""
+    def _content_search_available(self):
+        """Whether the full-text index exists (checked once per manager)"""
+        if self._content_search is None:
+            if self.cursor:
+                self._content_search = content_search_available(self.cursor)
+            elif self.connect_database(read_only=True):
+                try:
+                    self._content_search = content_search_available(self.cursor)
+                finally:
+                    self.close_connection()
+        return bool(self._content_search)
+    
+    def backup_database(self, backup_path=None, pages_per_step=256, step_pause=0):
+        """Backup database to specified path
+
+        Copies pages_per_step pages at a time, pausing step_pause seconds in
+        between, so other connections can write between steps. For backups
+        that must not block the calling thread use backup_job.DatabaseBackupJob.
+        """
         if not backup_path:
             backup_path = f"backup/children_companion_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
         
         # Ensure backup directory exists
         backup_dir = os.path.dirname(backup_path)
-        if not os.path.exists(backup_dir):
+        if backup_dir and not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
         
         if not self.connect_database():
@@ -788,7 +1256,7 @@ class DatabaseManager:
             
             # Copy current database content to backup database
             with backup_connection:
-                self.connection.backup(backup_connection)
+                online_backup(self.connection, backup_connection, pages_per_step, step_pause)
             
             backup_connection.close()
             print(f"Database has been backed up to: {backup_path}")
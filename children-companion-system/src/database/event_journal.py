@@ -0,0 +1,239 @@
+import time
+import queue
+import itertools
+import threading
+from datetime import datetime, timezone
+
+
+def _utc_timestamp():
+    """Current time in the format SQLite's CURRENT_TIMESTAMP uses"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class DatabaseEventJournal:
+    """Write-behind journal for usage, habit and progress events
+
+    Callers (usually the Qt GUI thread) only put events on an in-memory queue.
+    A background thread writes them through the DatabaseManager bulk APIs in
+    grouped transactions, every flush_interval seconds or as soon as
+    max_batch_size events are waiting. The queue is bounded: when the writer
+    falls behind, producers block for at most put_timeout seconds and the
+    event is rejected after that (backpressure instead of unbounded memory).
+
+    Call close() on shutdown; it ends open usage sessions and writes
+    everything still queued. Events are only queued under the lock close()
+    takes to mark the journal closed, so nothing accepted can land behind
+    the stop marker.
+
+    When quota_engine (a usage_quota.UsageQuotaEngine) is set, session
+    starts and ends are also reported to it as they happen.
+    """
+
+    _USAGE = 'usage'
+    _HABIT = 'habit'
+    _PROGRESS = 'progress'
+    _FLUSH = 'flush'
+    _STOP = 'stop'
+
+    def __init__(self, database, flush_interval=2.0, max_batch_size=500, max_queue_size=10000, put_timeout=1.0):
+        self.database = database
+        self.flush_interval = flush_interval  # unit: seconds
+        self.max_batch_size = max_batch_size
+        self.put_timeout = put_timeout  # unit: seconds
+        self.dropped_events = 0
+        self.failed_events = 0
+        self.written_events = 0
+
+        self._queue = queue.Queue(max_queue_size)
+        self._thread = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._session_tokens = itertools.count(1)
+        self._open_sessions = {}  # session token -> usage record waiting for its end
+        self.quota_engine = None
+
+    def start(self):
+        """Start the background writer thread"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="DatabaseEventJournal", daemon=True)
+                self._thread.start()
+
+    def start_usage(self, user_id, resource_id, activity_type):
+        """Begin a usage session, returns a token for end_usage
+
+        Nothing is written yet: the record is inserted once, complete with
+        end time and duration, when the session ends. Returns None once the
+        journal is closed.
+        """
+        with self._lock:
+            if self._closed:
+                print("Event journal is closed, usage session rejected")
+                return None
+            token = next(self._session_tokens)
+            self._open_sessions[token] = {
+                'user_id': user_id,
+                'resource_id': resource_id,
+                'activity_type': activity_type,
+                'start_time': _utc_timestamp(),
+            }
+        if self.quota_engine:
+            self.quota_engine.session_started(user_id, token)
+        return token
+
+    def end_usage(self, token, completion_status=None):
+        """End a usage session and queue its record"""
+        with self._lock:
+            record = self._open_sessions.pop(token, None)
+        if record is None:
+            print(f"Usage session not found: {token}")
+            return False
+        if self.quota_engine:
+            self.quota_engine.session_ended(record['user_id'], token)
+        record['end_time'] = _utc_timestamp()
+        record['completion_status'] = completion_status
+        return self._submit(self._USAGE, record)
+
+    def record_habit_completion(self, habit_id, completion_status, notes=None):
+        """Queue a habit completion, stamped with the time it happened"""
+        return self._submit(self._HABIT, {
+            'habit_id': habit_id,
+            'completion_status': completion_status,
+            'notes': notes,
+            'completion_time': _utc_timestamp(),
+        })
+
+    def add_learning_progress(self, child_id, subject, topic, level, completion_rate=0):
+        """Queue a learning progress update"""
+        return self._submit(self._PROGRESS, {
+            'child_id': child_id,
+            'subject': subject,
+            'topic': topic,
+            'level': level,
+            'completion_rate': completion_rate,
+            'last_learning_time': _utc_timestamp(),
+        })
+
+    def pending_count(self):
+        """Approximate number of queued events"""
+        return self._queue.qsize()
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written"""
+        self.start()
+        done = threading.Event()
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._queue.put((self._FLUSH, done))
+        if closed:
+            # Everything accepted is ahead of close()'s stop marker
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """End open sessions as interrupted, write all queued events and stop the writer"""
+        self.start()
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            interrupted = list(self._open_sessions.items())
+            self._open_sessions.clear()
+            end_time = _utc_timestamp()
+            for token, record in interrupted:
+                record['end_time'] = end_time
+                record['completion_status'] = 'interrupted'
+                self._queue.put((self._USAGE, record))
+            self._queue.put((self._STOP, None))
+        if self.quota_engine:
+            for token, record in interrupted:
+                self.quota_engine.session_ended(record['user_id'], token)
+        self._thread.join(timeout)
+        print(f"Event journal closed, {self.written_events} events written, "
+              f"{self.dropped_events} dropped, {self.failed_events} failed")
+
+    def _submit(self, kind, payload):
+        # The writer never takes the lock, so a full queue drains while we wait
+        with self._lock:
+            if self._closed:
+                print(f"Event journal is closed, {kind} event rejected")
+                return False
+            try:
+                self._queue.put((kind, payload), timeout=self.put_timeout)
+                return True
+            except queue.Full:
+                self.dropped_events += 1
+                print(f"Event journal queue full, {kind} event dropped")
+                return False
+
+    def _run(self):
+        """Writer loop: collect a batch until size or time trigger, then write it"""
+        stopping = False
+        while not stopping:
+            kind, payload = self._queue.get()
+            batch = []
+            waiters = []
+            deadline = time.monotonic() + self.flush_interval
+
+            while True:
+                if kind == self._STOP:
+                    stopping = True
+                    self._drain(batch, waiters)
+                    break
+                if kind == self._FLUSH:
+                    waiters.append(payload)
+                    break
+                batch.append((kind, payload))
+                if len(batch) >= self.max_batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    kind, payload = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write_batch(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _drain(self, batch, waiters):
+        """Collect whatever is still queued behind the stop marker"""
+        while True:
+            try:
+                kind, payload = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if kind == self._FLUSH:
+                waiters.append(payload)
+            elif kind != self._STOP:
+                batch.append((kind, payload))
+
+    def _write_batch(self, batch):
+        """Write one batch, one transaction per event type"""
+        groups = {self._USAGE: [], self._HABIT: [], self._PROGRESS: []}
+        for kind, payload in batch:
+            groups[kind].append(payload)
+
+        writers = (
+            (self._USAGE, self.database.add_usage_records_bulk),
+            (self._HABIT, self.database.record_habit_completions_bulk),
+            (self._PROGRESS, self.database.upsert_learning_progress_bulk),
+        )
+        for kind, writer in writers:
+            events = groups[kind]
+            if not events:
+                continue
+            try:
+                result = writer(events)
+            except Exception as e:
+                print(f"Event journal write error: {e}")
+                result = False
+            if result is False:
+                self.failed_events += len(events)
+            else:
+                self.written_events += len(events)
@@ -0,0 +1,83 @@
+# Precomputed habit counters
+#
+# habit_stats holds one row per habit with the number of completed records,
+# the current and longest streak of consecutive completed days, and the time
+# of the latest record. An AFTER INSERT trigger on habit_completion_records
+# updates it in the same transaction as every insert (single, bulk or
+# journal), so get_habit_list reads it with a plain join.
+#
+# Days are date(completion_time), i.e. UTC days like the usage rollup. A
+# completion on the day after last_streak_day extends the streak, a later one
+# starts a new streak, one on the same day or a backdated one leaves it as
+# is. The stored current_streak is the streak as of last_streak_day; readers
+# treat it as broken once that day is older than yesterday.
+
+# Upsert of one completion record; {source} is 'new' in the trigger or the
+# record table alias when rebuilding
+_HABIT_STATS_UPSERT = """
+INSERT INTO habit_stats (habit_id, total_completed, current_streak, longest_streak, last_completion_time, last_streak_day)
+{values}
+ON CONFLICT (habit_id) DO UPDATE SET
+total_completed = total_completed + excluded.total_completed,
+current_streak = CASE
+    WHEN excluded.last_streak_day IS NULL OR excluded.last_streak_day <= COALESCE(last_streak_day, '') THEN current_streak
+    WHEN excluded.last_streak_day = date(last_streak_day, '+1 day') THEN current_streak + 1
+    ELSE 1 END,
+longest_streak = MAX(longest_streak, CASE
+    WHEN excluded.last_streak_day IS NULL OR excluded.last_streak_day <= COALESCE(last_streak_day, '') THEN current_streak
+    WHEN excluded.last_streak_day = date(last_streak_day, '+1 day') THEN current_streak + 1
+    ELSE 1 END),
+last_streak_day = CASE WHEN excluded.last_streak_day > COALESCE(last_streak_day, '')
+                       THEN excluded.last_streak_day ELSE last_streak_day END,
+last_completion_time = CASE WHEN excluded.last_completion_time > COALESCE(last_completion_time, '')
+                            THEN excluded.last_completion_time ELSE last_completion_time END
+"""
+
+_COMPLETED = "{source}.completion_status = 'completed'"
+_RECORD_VALUES = (f"{_COMPLETED}, {_COMPLETED}, {_COMPLETED}, {{source}}.completion_time, "
+                  f"CASE WHEN {_COMPLETED} THEN date({{source}}.completion_time) END")
+
+CREATE_HABIT_STATS_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS habit_stats (
+        habit_id INTEGER PRIMARY KEY,
+        total_completed INTEGER NOT NULL DEFAULT 0,
+        current_streak INTEGER NOT NULL DEFAULT 0,  -- consecutive completed days up to last_streak_day
+        longest_streak INTEGER NOT NULL DEFAULT 0,
+        last_completion_time TIMESTAMP,  -- latest record of any status
+        last_streak_day TEXT,  -- latest day with a completed record
+        FOREIGN KEY (habit_id) REFERENCES habit_formation(habit_id) ON DELETE CASCADE
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS habit_stats_after_completion AFTER INSERT ON habit_completion_records BEGIN
+        {_HABIT_STATS_UPSERT.format(values="VALUES (new.habit_id, " + _RECORD_VALUES.format(source="new") + ")")};
+    END
+    """,
+]
+
+# Replays every live record in time order; WHERE true keeps the upsert
+# parsable after a SELECT
+REBUILD_HABIT_STATS_SQL = _HABIT_STATS_UPSERT.format(
+    values=("SELECT r.habit_id, " + _RECORD_VALUES.format(source="r")
+            + " FROM habit_completion_records r WHERE true ORDER BY r.habit_id, r.completion_time, r.record_id")
+)
+
+# get_habit_list: habits with their counters, streak reset once a day is missed
+HABIT_LIST_SQL = """
+SELECT h.*,
+       COALESCE(s.total_completed, 0) as completion_count,
+       s.last_completion_time,
+       CASE WHEN s.last_streak_day >= date('now', '-1 day') THEN s.current_streak ELSE 0 END as current_streak,
+       COALESCE(s.longest_streak, 0) as longest_streak
+FROM habit_formation h
+LEFT JOIN habit_stats s ON s.habit_id = h.habit_id
+WHERE h.child_id = ?
+ORDER BY h.habit_name
+"""
+
+
+def rebuild_habit_stats(cursor):
+    """Recompute habit_stats from the live completion records"""
+    cursor.execute("DELETE FROM habit_stats")
+    cursor.execute(REBUILD_HABIT_STATS_SQL)
@@ -0,0 +1,79 @@
+import sqlite3
+
+# Secondary indexes for the hot query paths in DatabaseManager.
+# Each entry is (introduced in index set version, index name, table, columns).
+# Bump INDEX_SET_VERSION when adding an index and add a schema migration
+# (migrations.py) that calls ensure_indexes for the new set; move names that
+# are no longer wanted to RETIRED_INDEXES.
+INDEX_SET_VERSION = 2
+
+INDEX_DEFINITIONS = [
+    # get_usage_statistics: user_id equality + start_time range; covers the
+    # aggregated columns so the statistics queries never touch the table
+    (1, 'idx_usage_records_user_start', 'usage_records',
+     'user_id, start_time, activity_type, duration, resource_id'),
+    # get_learning_progress: child_id [+ subject], ORDER BY subject, level
+    (1, 'idx_learning_progress_child_subject', 'learning_progress',
+     'child_id, subject, level'),
+    # get_habit_list: per-child habit list ordered by name
+    (1, 'idx_habit_formation_child_name', 'habit_formation',
+     'child_id, habit_name'),
+    # get_habit_list: completed-count subquery
+    (1, 'idx_habit_completion_habit_status', 'habit_completion_records',
+     'habit_id, completion_status'),
+    # get_habit_list: latest-completion subquery
+    (1, 'idx_habit_completion_habit_time', 'habit_completion_records',
+     'habit_id, completion_time'),
+    # get_parent_children_list
+    (1, 'idx_children_info_parent', 'children_info',
+     'parent_id'),
+    # get_content_resources: type filter, newest first
+    (1, 'idx_content_resources_type_time', 'content_resources',
+     'type, creation_time'),
+    # get_content_resources_page / iter_content_resources without a type
+    # filter: keyset on (creation_time, resource_id), rowid is the tie-breaker
+    (2, 'idx_content_resources_time', 'content_resources',
+     'creation_time'),
+]
+
+RETIRED_INDEXES = [
+    # superseded by the unique index uq_parental_control_parent_child (migration 3)
+    'idx_parental_control_parent_child',
+]
+
+
+def ensure_indexes(cursor, index_set_version=INDEX_SET_VERSION):
+    """Create missing indexes and drop retired ones, safe to run repeatedly
+
+    Only indexes introduced up to index_set_version are created, so a schema
+    migration can pin the set it was written against.
+
+    Returns the names of the indexes that were newly created.
+    """
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    existing = {row[0] for row in cursor.fetchall()}
+
+    created = []
+    for version, name, table, columns in INDEX_DEFINITIONS:
+        if version > index_set_version or name in existing:
+            continue
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        created.append(name)
+
+    for name in RETIRED_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+    # Refresh planner statistics so new indexes are picked up straight away
+    if created:
+        cursor.execute("ANALYZE")
+    return created
+
+
+def drop_indexes(cursor):
+    """Drop every index in the managed set (used by the index benchmark)"""
+    for version, name, table, columns in INDEX_DEFINITIONS:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    try:
+        cursor.execute("DELETE FROM sqlite_stat1")
+    except sqlite3.Error:
+        pass  # ANALYZE has never run, no statistics table yet
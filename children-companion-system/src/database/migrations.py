@@ -0,0 +1,442 @@
+import time
+import sqlite3
+
+from src.database.archive import CREATE_ARCHIVE_TABLES_SQL
+from src.database.content_search import CREATE_CONTENT_BIGRAMS_SQL, create_content_search_index
+from src.database.content_tags import CREATE_CONTENT_TAGS_SQL, replace_resource_tags
+from src.database.habit_stats import CREATE_HABIT_STATS_SQL, rebuild_habit_stats
+from src.database.indexes import ensure_indexes
+from src.database.sync import create_sync_tables
+from src.database.usage_quota import CREATE_QUOTA_CHECKPOINTS_SQL
+from src.database.usage_rollup import CREATE_ROLLUP_TABLE_SQL, ROLLUP_BACKFILL_NAME, ROLLUP_RECORD_RANGE_SQL
+
+# Schema migrations
+#
+# The schema version lives in PRAGMA user_version. Every migration's DDL runs
+# in a single transaction together with the user_version bump, so a failed
+# upgrade leaves the database exactly at the previous version. Data changes
+# that touch many rows go into a BatchedBackfill instead: it runs after the
+# DDL in small committed batches, remembers where it stopped, and therefore
+# never holds the write lock for long and survives restarts.
+
+
+class BatchedBackfill:
+    """Data backfill applied to a table in key ranges of batch_size rows
+
+    batch_sql is executed once per batch with the named parameters
+    :start_key and :end_key (inclusive), or is a callable taking
+    (cursor, start_key, end_key).
+    """
+
+    def __init__(self, name, table, batch_sql, key_column="rowid", batch_size=1000, pause=0.01):
+        self.name = name
+        self.table = table
+        self.batch_sql = batch_sql
+        self.key_column = key_column
+        self.batch_size = batch_size
+        self.pause = pause  # seconds between batches, lets waiting writers in
+
+    def run(self, connection):
+        """Run remaining batches, return the number of batches applied"""
+        cursor = connection.cursor()
+        cursor.execute("SELECT last_key, completed FROM schema_backfills WHERE name = ?", (self.name,))
+        result = cursor.fetchone()
+        if result and result[1]:
+            return 0
+        last_key = result[0] if result else None
+
+        batches = 0
+        while True:
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                if last_key is None:
+                    cursor.execute(
+                        f"SELECT {self.key_column} FROM {self.table} ORDER BY {self.key_column} LIMIT ?",
+                        (self.batch_size,)
+                    )
+                else:
+                    cursor.execute(
+                        f"SELECT {self.key_column} FROM {self.table} WHERE {self.key_column} > ? ORDER BY {self.key_column} LIMIT ?",
+                        (last_key, self.batch_size)
+                    )
+                keys = [row[0] for row in cursor.fetchall()]
+
+                if keys:
+                    if callable(self.batch_sql):
+                        self.batch_sql(cursor, keys[0], keys[-1])
+                    else:
+                        cursor.execute(self.batch_sql, {'start_key': keys[0], 'end_key': keys[-1]})
+                    last_key = keys[-1]
+
+                cursor.execute(
+                    """INSERT INTO schema_backfills (name, last_key, completed, update_time)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(name) DO UPDATE SET
+                    last_key = excluded.last_key, completed = excluded.completed, update_time = excluded.update_time""",
+                    (self.name, last_key, 0 if keys else 1)
+                )
+                connection.commit()
+            except sqlite3.Error:
+                connection.rollback()
+                raise
+
+            if not keys:
+                return batches
+            batches += 1
+            if self.pause:
+                time.sleep(self.pause)
+
+
+class Migration:
+    """One versioned schema upgrade step"""
+
+    def __init__(self, version, description, upgrade, backfills=None):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade  # callable(cursor), runs inside the migration transaction
+        self.backfills = backfills or []
+
+
+class MigrationRunner:
+    """Bring a database up to the latest schema version"""
+
+    def __init__(self, connection, migrations=None):
+        self.connection = connection
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda migration: migration.version)
+
+    def current_version(self):
+        """Schema version recorded in the database file"""
+        return self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def latest_version(self):
+        return self.migrations[-1].version if self.migrations else 0
+
+    def pending(self):
+        """Migrations not yet applied to this database"""
+        current = self.current_version()
+        return [migration for migration in self.migrations if migration.version > current]
+
+    def upgrade(self, target_version=None):
+        """Apply pending migrations in order, each in its own transaction
+
+        Returns the list of applied versions.
+        """
+        if self.current_version() > self.latest_version():
+            print(f"Database schema version {self.current_version()} is newer than this program ({self.latest_version()})")
+            return []
+
+        if self.current_version() == 0 and not self._has_tables():
+            # Must be set before the first table exists; lets the archiver shrink the file
+            self.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._ensure_backfill_table()
+        applied = []
+        for migration in self.pending():
+            if target_version is not None and migration.version > target_version:
+                break
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                migration.upgrade(cursor)
+                # PRAGMA does not accept bound parameters; version is an int from our own list
+                cursor.execute(f"PRAGMA user_version = {int(migration.version)}")
+                self.connection.commit()
+            except sqlite3.Error:
+                self.connection.rollback()
+                raise
+            print(f"Schema migration {migration.version} applied: {migration.description}")
+            applied.append(migration.version)
+        return applied
+
+    def run_backfills(self):
+        """Run unfinished backfills of all applied migrations"""
+        self._ensure_backfill_table()
+        current = self.current_version()
+        for migration in self.migrations:
+            if migration.version > current:
+                break
+            for backfill in migration.backfills:
+                batches = backfill.run(self.connection)
+                if batches:
+                    print(f"Backfill {backfill.name} finished {batches} batches")
+
+    def _has_tables(self):
+        return self.connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' LIMIT 1").fetchone() is not None
+
+    def _ensure_backfill_table(self):
+        self.connection.execute("""
+        CREATE TABLE IF NOT EXISTS schema_backfills (
+            name TEXT PRIMARY KEY,
+            last_key,
+            completed INTEGER NOT NULL DEFAULT 0,
+            update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        self.connection.commit()
+
+
+def create_baseline_schema(cursor):
+    """Version 1: the original nine tables"""
+    # Create users table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL,
+        user_type TEXT NOT NULL,  -- 'child' or 'parent'
+        creation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Create children information table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS children_info (
+        child_id INTEGER PRIMARY KEY,
+        parent_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        age INTEGER,
+        gender TEXT,
+        interests TEXT,
+        FOREIGN KEY (child_id) REFERENCES users(user_id) ON DELETE CASCADE,
+        FOREIGN KEY (parent_id) REFERENCES users(user_id) ON DELETE CASCADE
+    )
+    ''')
+    
+    # Create content resources table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS content_resources (
+        resource_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        type TEXT NOT NULL,  -- 'story', 'song', 'game', 'learning'
+        subtype TEXT,  -- like 'fairy tale', 'fable' etc.
+        description TEXT,
+        content_path TEXT NOT NULL,
+        thumbnail_path TEXT,
+        age_range TEXT,  -- like '2-4 years', '5-7 years' etc.
+        tags TEXT,
+        creation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Create usage records table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS usage_records (
+        record_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        resource_id INTEGER,
+        activity_type TEXT NOT NULL,  -- 'browse', 'play', 'learn', 'game' etc.
+        start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        end_time TIMESTAMP,
+        duration INTEGER,  -- unit: seconds
+        completion_status TEXT,  -- 'completed', 'interrupted', 'abandoned' etc.
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+        FOREIGN KEY (resource_id) REFERENCES content_resources(resource_id) ON DELETE SET NULL
+    )
+    ''')
+    
+    # Create learning progress table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS learning_progress (
+        progress_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        child_id INTEGER NOT NULL,
+        subject TEXT NOT NULL,  -- 'literacy', 'arithmetic', 'english' etc.
+        topic TEXT NOT NULL,
+        level INTEGER NOT NULL,
+        completion_rate REAL DEFAULT 0,  -- 0-100 percentage
+        last_learning_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (child_id) REFERENCES children_info(child_id) ON DELETE CASCADE
+    )
+    ''')
+    
+    # Create habit formation table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS habit_formation (
+        habit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        child_id INTEGER NOT NULL,
+        habit_name TEXT NOT NULL,
+        description TEXT,
+        frequency TEXT NOT NULL,  -- 'daily', 'weekly' etc.
+        reminder_time TEXT,
+        creation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (child_id) REFERENCES children_info(child_id) ON DELETE CASCADE
+    )
+    ''')
+    
+    # Create habit completion records table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS habit_completion_records (
+        record_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        habit_id INTEGER NOT NULL,
+        completion_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completion_status TEXT NOT NULL,  -- 'completed', 'partially completed', 'not completed'
+        notes TEXT,
+        FOREIGN KEY (habit_id) REFERENCES habit_formation(habit_id) ON DELETE CASCADE
+    )
+    ''')
+    
+    # Create parental control settings table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS parental_control_settings (
+        setting_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        parent_id INTEGER NOT NULL,
+        child_id INTEGER NOT NULL,
+        daily_time_limit INTEGER,  -- unit: minutes
+        disabled_periods TEXT,  -- JSON format storing multiple time periods
+        content_filter_level TEXT,  -- 'low', 'medium', 'high'
+        allowed_content_types TEXT,  -- JSON format storing allowed content types
+        update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (parent_id) REFERENCES users(user_id) ON DELETE CASCADE,
+        FOREIGN KEY (child_id) REFERENCES children_info(child_id) ON DELETE CASCADE
+    )
+    ''')
+    
+    # Create system settings table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS system_settings (
+        setting_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        setting_type TEXT NOT NULL,  -- 'interface', 'sound', 'notification' etc.
+        setting_name TEXT NOT NULL,
+        setting_value TEXT NOT NULL,
+        update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    )
+    ''')
+
+
+def create_index_set_1(cursor):
+    """Version 2: secondary indexes for the hot query paths"""
+    ensure_indexes(cursor, index_set_version=1)
+
+
+def add_unique_progress_and_control_keys(cursor):
+    """Version 3: unique keys for learning progress and parental controls
+
+    Duplicates left by the old read-then-write code are merged first:
+    learning progress keeps the oldest row carrying the highest completion
+    rate and latest learning time, parental controls keep the most recently
+    updated row.
+    """
+    cursor.execute("""
+    UPDATE learning_progress
+    SET completion_rate = (
+            SELECT MAX(p.completion_rate) FROM learning_progress p
+            WHERE p.child_id = learning_progress.child_id AND p.subject = learning_progress.subject
+              AND p.topic = learning_progress.topic AND p.level = learning_progress.level),
+        last_learning_time = (
+            SELECT MAX(p.last_learning_time) FROM learning_progress p
+            WHERE p.child_id = learning_progress.child_id AND p.subject = learning_progress.subject
+              AND p.topic = learning_progress.topic AND p.level = learning_progress.level)
+    WHERE progress_id IN (
+        SELECT MIN(progress_id) FROM learning_progress
+        GROUP BY child_id, subject, topic, level
+        HAVING COUNT(*) > 1)
+    """)
+    cursor.execute("""
+    DELETE FROM learning_progress
+    WHERE progress_id NOT IN (
+        SELECT MIN(progress_id) FROM learning_progress
+        GROUP BY child_id, subject, topic, level)
+    """)
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_learning_progress_key
+    ON learning_progress (child_id, subject, topic, level)
+    """)
+
+    cursor.execute("""
+    DELETE FROM parental_control_settings
+    WHERE setting_id NOT IN (
+        SELECT (SELECT s.setting_id FROM parental_control_settings s
+                WHERE s.parent_id = g.parent_id AND s.child_id = g.child_id
+                ORDER BY s.update_time DESC, s.setting_id DESC LIMIT 1)
+        FROM (SELECT DISTINCT parent_id, child_id FROM parental_control_settings) g)
+    """)
+    cursor.execute("DROP INDEX IF EXISTS idx_parental_control_parent_child")
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_parental_control_parent_child
+    ON parental_control_settings (parent_id, child_id)
+    """)
+
+
+def create_usage_daily_rollup(cursor):
+    """Version 4: daily usage rollup table, filled from existing records by a backfill"""
+    cursor.execute(CREATE_ROLLUP_TABLE_SQL)
+
+
+def create_content_search(cursor):
+    """Version 5: FTS5 trigram index over content titles, descriptions and tags"""
+    create_content_search_index(cursor)
+
+
+def create_content_tags(cursor):
+    """Version 6: normalized content_tags table, split from the existing tag strings
+
+    The content catalog is small (hundreds of rows), so the split runs inside
+    the migration transaction and tag filters are correct as soon as it commits.
+    """
+    for statement in CREATE_CONTENT_TAGS_SQL:
+        cursor.execute(statement)
+    cursor.execute("SELECT resource_id, tags FROM content_resources WHERE tags IS NOT NULL AND tags != ''")
+    for resource_id, tags in cursor.fetchall():
+        replace_resource_tags(cursor, resource_id, tags)
+
+
+def create_index_set_2(cursor):
+    """Version 7: index for keyset pagination over content creation time"""
+    ensure_indexes(cursor, index_set_version=2)
+
+
+def create_archive_tables(cursor):
+    """Version 8: archive catalog"""
+    for statement in CREATE_ARCHIVE_TABLES_SQL:
+        cursor.execute(statement)
+
+
+def create_habit_stats(cursor):
+    """Version 9: precomputed habit counters and streaks, kept current by a trigger
+
+    Rebuilt from the live records inside the migration transaction (a
+    family's completions are a few thousand rows at most). No completion
+    has been archived yet: version 8 ships in the same release, and both
+    are applied by initialize_database before the archiver first runs.
+    """
+    for statement in CREATE_HABIT_STATS_SQL:
+        cursor.execute(statement)
+    rebuild_habit_stats(cursor)
+
+
+def create_usage_quota_checkpoints(cursor):
+    """Version 10: persisted used time of the usage quota engine"""
+    cursor.execute(CREATE_QUOTA_CHECKPOINTS_SQL)
+
+
+def create_delta_sync(cursor):
+    """Version 11: row versions, sync tokens and origin columns for delta sync"""
+    create_sync_tables(cursor)
+
+
+def create_content_bigrams(cursor):
+    """Version 12: two-character search index and its triggers, filled from the existing catalog
+
+    Like the tag split of version 6 the fill runs inside the migration
+    transaction; the catalog is small.
+    """
+    for statement in CREATE_CONTENT_BIGRAMS_SQL:
+        cursor.execute(statement)
+
+
+MIGRATIONS = [
+    Migration(1, "baseline schema", create_baseline_schema),
+    Migration(2, "secondary index set 1", create_index_set_1),
+    Migration(3, "unique learning progress and parental control keys", add_unique_progress_and_control_keys),
+    Migration(4, "daily usage rollup", create_usage_daily_rollup, backfills=[
+        BatchedBackfill(ROLLUP_BACKFILL_NAME, "usage_records", ROLLUP_RECORD_RANGE_SQL, key_column="record_id"),
+    ]),
+    Migration(5, "content full-text search", create_content_search),
+    Migration(6, "normalized content tags", create_content_tags),
+    Migration(7, "secondary index set 2", create_index_set_2),
+    Migration(8, "archive catalog", create_archive_tables),
+    Migration(9, "habit counters and streaks", create_habit_stats),
+    Migration(10, "usage quota checkpoints", create_usage_quota_checkpoints),
+    Migration(11, "delta sync row versions", create_delta_sync),
+    Migration(12, "two-character content search index", create_content_bigrams),
+]
@@ -0,0 +1,220 @@
+import hmac
+import time
+import base64
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Hashed credentials
+#
+# users.password holds "scrypt$<n>$<r>$<p>$<salt>$<key>" (salt and key in
+# urlsafe base64). scrypt is deliberately slow: with the default cost
+# (n=2**14, r=8, 16 MB of memory) one check takes roughly 50-150 ms on the
+# low-end tablets, so
+#   - logins are verified on a worker thread (CredentialVerifier), never on
+#     the GUI thread;
+#   - a successful login is remembered for session_ttl seconds, both as a
+#     session token and under a keyed digest of the credentials, so repeated
+#     checks (parent-mode unlock, page switches) skip the KDF.
+#
+# Rows written before hashing still hold the plain password. They are
+# recognised by the missing "scrypt$" prefix, compared in constant time and
+# replaced by a hash on the next successful login; rows hashed with an older
+# cost are upgraded the same way.
+
+HASH_PREFIX = "scrypt"
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class PasswordHasher:
+    """scrypt password hashing with tunable cost
+
+    n (CPU/memory cost, a power of two), r (block size) and p
+    (parallelism) are stored with every hash, so changing them only affects
+    new hashes; older ones are upgraded on the next login (needs_rehash).
+    """
+
+    def __init__(self, n=2 ** 14, r=8, p=1, salt_bytes=16, key_bytes=32):
+        if n < 2 or n & (n - 1):
+            raise ValueError(f"scrypt n must be a power of two: {n}")
+        self.n = n
+        self.r = r
+        self.p = p
+        self.salt_bytes = salt_bytes
+        self.key_bytes = key_bytes
+
+    @staticmethod
+    def _derive(password, salt, n, r, p, key_bytes):
+        # maxmem must cover 128 * n * r bytes, hashlib's default stops at 32 MB
+        return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024, dklen=key_bytes)
+
+    def hash(self, password):
+        salt = secrets.token_bytes(self.salt_bytes)
+        key = self._derive(password, salt, self.n, self.r, self.p, self.key_bytes)
+        return f"{HASH_PREFIX}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    @staticmethod
+    def is_hashed(stored):
+        return stored.startswith(HASH_PREFIX + "$")
+
+    def verify(self, password, stored):
+        """Return (matches, needs_rehash) for a stored hash or legacy plain password"""
+        if not self.is_hashed(stored):
+            matches = hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+            return matches, matches
+        try:
+            _, n, r, p, salt, key = stored.split('$')
+            n, r, p = int(n), int(r), int(p)
+            salt, key = _b64decode(salt), _b64decode(key)
+        except ValueError:
+            return False, False
+        matches = hmac.compare_digest(self._derive(password, salt, n, r, p, len(key)), key)
+        return matches, matches and (n, r, p, len(key)) != (self.n, self.r, self.p, self.key_bytes)
+
+    def dummy_verify(self, password):
+        """Spend the time of one verify for unknown users, so timing does not reveal which usernames exist"""
+        self._derive(password, b'\0' * self.salt_bytes, self.n, self.r, self.p, self.key_bytes)
+
+
+class SessionCache:
+    """Short-lived cache of successful logins
+
+    issue() returns a session token for an authenticated user; the same
+    login is also remembered under an HMAC of (username, password) with a
+    per-process random key, so no plain password is ever kept in memory.
+    Entries expire ttl seconds after the login.
+
+    Every login is tied to the password hash it was verified against. A
+    cached login is only honoured while the caller still reads that hash
+    from the database: after a password change (or with the user gone) the
+    user's sessions are revoked, and a login under a new hash ends the
+    sessions issued under the old one.
+    """
+
+    def __init__(self, ttl=300.0, max_entries=64):
+        self.ttl = ttl  # unit: seconds
+        self.max_entries = max_entries
+        self._key = secrets.token_bytes(32)
+        self._sessions = OrderedDict()  # token -> (expiry time, user, password hash)
+        self._credentials = OrderedDict()  # credential digest -> token
+        self._lock = threading.Lock()
+
+    def _digest(self, username, password):
+        message = username.encode('utf-8') + b'\0' + password.encode('utf-8')
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def _revoke_user(self, user_id, keep_hash=None):
+        """Drop the user's sessions not issued under keep_hash; caller holds the lock"""
+        for token in [token for token, (_, user, password_hash) in self._sessions.items()
+                      if user['user_id'] == user_id and (keep_hash is None or password_hash != keep_hash)]:
+            del self._sessions[token]
+        for digest in [digest for digest, token in self._credentials.items() if token not in self._sessions]:
+            del self._credentials[digest]
+
+    def issue(self, username, password, user, password_hash):
+        """Remember a successful login verified against password_hash, return its session token"""
+        token = secrets.token_urlsafe(24)
+        digest = self._digest(username, password)
+        with self._lock:
+            self._revoke_user(user['user_id'], keep_hash=password_hash)
+            old_token = self._credentials.pop(digest, None)
+            if old_token:
+                self._sessions.pop(old_token, None)
+            self._sessions[token] = (time.monotonic() + self.ttl, dict(user), password_hash)
+            self._credentials[digest] = token
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+            while len(self._credentials) > self.max_entries:
+                self._credentials.popitem(last=False)
+        return token
+
+    def lookup_token(self, token):
+        """The user of a live session token, or None"""
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            expiry, user, _ = entry
+            if expiry <= time.monotonic():
+                del self._sessions[token]
+                return None
+            return dict(user, session_token=token)
+
+    def lookup_credentials(self, username, password, password_hash):
+        """The user of a cached login with these credentials, or None
+
+        password_hash is the user's stored hash as read now, None if the
+        user no longer exists. A login cached under another hash is stale:
+        every session of that user is revoked.
+        """
+        with self._lock:
+            token = self._credentials.get(self._digest(username, password))
+            entry = self._sessions.get(token) if token else None
+            if entry is None:
+                return None
+            _, user, login_hash = entry
+            if login_hash != password_hash:
+                self._revoke_user(user['user_id'])
+                return None
+        return self.lookup_token(token)
+
+    def revoke(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def revoke_user(self, user_id):
+        """End every session of a user, e.g. after a password change"""
+        with self._lock:
+            self._revoke_user(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._credentials.clear()
+
+
+class CredentialVerifier:
+    """Runs the calls that derive a scrypt key on a worker thread
+
+    verify() (authenticate_user) and create_account() (add_user) return a
+    Future at once; callback(result) is called on the worker thread with
+    what the database method returned: the user dict with a session token
+    or None, the new user_id or False. The Qt interface forwards it through
+    a signal, see ChildrenMainInterface.attach_credential_verifier.
+    """
+
+    def __init__(self, database, max_workers=1):
+        self.database = database  # any StorageBackend
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="CredentialVerifier")
+
+    def verify(self, username, password, callback=None):
+        return self._executor.submit(self._verify, username, password, callback)
+
+    def _verify(self, username, password, callback):
+        user = self.database.authenticate_user(username, password)
+        if callback:
+            callback(user)
+        return user
+
+    def create_account(self, username, password, user_type, callback=None, **options):
+        """add_user off the calling thread; options go to add_user (e.g. parent_id when sharded)"""
+        return self._executor.submit(self._create_account, username, password, user_type, callback, options)
+
+    def _create_account(self, username, password, user_type, callback, options):
+        user_id = self.database.add_user(username, password, user_type, **options)
+        if callback:
+            callback(user_id)
+        return user_id
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
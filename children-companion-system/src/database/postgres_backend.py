@@ -0,0 +1,759 @@
+import os
+import re
+import asyncio
+import threading
+import subprocess
+from datetime import date, datetime, timedelta
+
+from src.database.content_tags import split_tags
+from src.database.passwords import PasswordHasher, SessionCache
+from src.database.storage_backend import StorageBackend
+
+# PostgreSQL storage backend
+#
+# For a shared server deployment (several devices of one school or family
+# writing to one database) the storage can be PostgreSQL instead of the
+# local SQLite file. Queries run on asyncpg, an asyncio driver, against a
+# connection pool of min_pool_size..max_pool_size connections.
+#
+# AsyncPostgresStorage is the coroutine API for callers that already run an
+# event loop. PostgresDatabaseManager wraps it in the usual blocking
+# StorageBackend methods: it owns an event loop on a background thread and
+# every call waits for its coroutine there, so the UI and the event journal
+# use it exactly like DatabaseManager.
+#
+# The schema mirrors the SQLite one (see migrations.py): usage_daily_rollup
+# and habit_stats are maintained in the same transaction as the writes,
+# content_tags backs the tag filters and search falls back to ILIKE.
+# Timestamps are returned as 'YYYY-MM-DD HH:MM:SS' strings like SQLite's.
+#
+# asyncpg is optional: pip install asyncpg
+
+POSTGRES_SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL,
+        user_type TEXT NOT NULL,  -- 'child' or 'parent'
+        creation_time TIMESTAMP DEFAULT LOCALTIMESTAMP(0)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS children_info (
+        child_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+        parent_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+        name TEXT NOT NULL,
+        age INTEGER,
+        gender TEXT,
+        interests TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS content_resources (
+        resource_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        title TEXT NOT NULL,
+        type TEXT NOT NULL,
+        subtype TEXT,
+        description TEXT,
+        content_path TEXT NOT NULL,
+        thumbnail_path TEXT,
+        age_range TEXT,
+        tags TEXT,
+        creation_time TIMESTAMP DEFAULT LOCALTIMESTAMP(0)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS content_tags (
+        tag TEXT NOT NULL,
+        resource_id BIGINT NOT NULL REFERENCES content_resources(resource_id) ON DELETE CASCADE,
+        PRIMARY KEY (tag, resource_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_content_tags_resource ON content_tags (resource_id, tag)",
+    "CREATE INDEX IF NOT EXISTS idx_content_type_time ON content_resources (type, creation_time DESC, resource_id DESC)",
+    """
+    CREATE TABLE IF NOT EXISTS usage_records (
+        record_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+        resource_id BIGINT REFERENCES content_resources(resource_id) ON DELETE SET NULL,
+        activity_type TEXT NOT NULL,
+        start_time TIMESTAMP DEFAULT LOCALTIMESTAMP(0),
+        end_time TIMESTAMP,
+        duration INTEGER,  -- unit: seconds
+        completion_status TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_usage_user_time ON usage_records (user_id, start_time)",
+    """
+    CREATE TABLE IF NOT EXISTS usage_daily_rollup (
+        user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+        day DATE NOT NULL,
+        activity_type TEXT NOT NULL,
+        resource_id BIGINT NOT NULL,  -- 0 when the session had no resource
+        total_duration BIGINT NOT NULL DEFAULT 0,
+        session_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day, activity_type, resource_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS learning_progress (
+        progress_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        child_id BIGINT NOT NULL REFERENCES children_info(child_id) ON DELETE CASCADE,
+        subject TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        level INTEGER NOT NULL,
+        completion_rate DOUBLE PRECISION DEFAULT 0,
+        last_learning_time TIMESTAMP DEFAULT LOCALTIMESTAMP(0),
+        UNIQUE (child_id, subject, topic, level)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS habit_formation (
+        habit_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        child_id BIGINT NOT NULL REFERENCES children_info(child_id) ON DELETE CASCADE,
+        habit_name TEXT NOT NULL,
+        description TEXT,
+        frequency TEXT NOT NULL,
+        reminder_time TEXT,
+        creation_time TIMESTAMP DEFAULT LOCALTIMESTAMP(0)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_habit_child ON habit_formation (child_id, habit_name)",
+    """
+    CREATE TABLE IF NOT EXISTS habit_completion_records (
+        record_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        habit_id BIGINT NOT NULL REFERENCES habit_formation(habit_id) ON DELETE CASCADE,
+        completion_time TIMESTAMP DEFAULT LOCALTIMESTAMP(0),
+        completion_status TEXT NOT NULL,
+        notes TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS habit_stats (
+        habit_id BIGINT PRIMARY KEY REFERENCES habit_formation(habit_id) ON DELETE CASCADE,
+        total_completed INTEGER NOT NULL DEFAULT 0,
+        current_streak INTEGER NOT NULL DEFAULT 0,
+        longest_streak INTEGER NOT NULL DEFAULT 0,
+        last_completion_time TIMESTAMP,
+        last_streak_day DATE
+    )
+    """,
+    # Same streak rules as the SQLite trigger in habit_stats.py
+    """
+    CREATE OR REPLACE FUNCTION habit_stats_after_completion() RETURNS trigger AS $$
+    DECLARE
+        completed INTEGER := (NEW.completion_status = 'completed')::INTEGER;
+        streak_day DATE := CASE WHEN NEW.completion_status = 'completed' THEN NEW.completion_time::DATE END;
+    BEGIN
+        INSERT INTO habit_stats AS s (habit_id, total_completed, current_streak, longest_streak,
+                                      last_completion_time, last_streak_day)
+        VALUES (NEW.habit_id, completed, completed, completed, NEW.completion_time, streak_day)
+        ON CONFLICT (habit_id) DO UPDATE SET
+        total_completed = s.total_completed + EXCLUDED.total_completed,
+        current_streak = CASE
+            WHEN EXCLUDED.last_streak_day IS NULL OR EXCLUDED.last_streak_day <= s.last_streak_day THEN s.current_streak
+            WHEN EXCLUDED.last_streak_day = s.last_streak_day + 1 THEN s.current_streak + 1
+            ELSE 1 END,
+        longest_streak = GREATEST(s.longest_streak, CASE
+            WHEN EXCLUDED.last_streak_day IS NULL OR EXCLUDED.last_streak_day <= s.last_streak_day THEN s.current_streak
+            WHEN EXCLUDED.last_streak_day = s.last_streak_day + 1 THEN s.current_streak + 1
+            ELSE 1 END),
+        last_streak_day = GREATEST(s.last_streak_day, EXCLUDED.last_streak_day),
+        last_completion_time = GREATEST(s.last_completion_time, EXCLUDED.last_completion_time);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS habit_stats_after_completion ON habit_completion_records",
+    """
+    CREATE TRIGGER habit_stats_after_completion AFTER INSERT ON habit_completion_records
+    FOR EACH ROW EXECUTE FUNCTION habit_stats_after_completion()
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS parental_control_settings (
+        setting_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        parent_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+        child_id BIGINT NOT NULL REFERENCES children_info(child_id) ON DELETE CASCADE,
+        daily_time_limit INTEGER,
+        disabled_periods TEXT,
+        content_filter_level TEXT,
+        allowed_content_types TEXT,
+        update_time TIMESTAMP DEFAULT LOCALTIMESTAMP(0),
+        UNIQUE (parent_id, child_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS system_settings (
+        setting_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+        setting_type TEXT NOT NULL,
+        setting_name TEXT NOT NULL,
+        setting_value TEXT NOT NULL,
+        update_time TIMESTAMP DEFAULT LOCALTIMESTAMP(0)
+    )
+    """,
+]
+
+ROLLUP_SESSION_SQL = """
+INSERT INTO usage_daily_rollup AS r (user_id, day, activity_type, resource_id, total_duration, session_count)
+VALUES ($1, $2::DATE, $3, COALESCE($4, 0), $5, $6)
+ON CONFLICT (user_id, day, activity_type, resource_id) DO UPDATE SET
+total_duration = r.total_duration + EXCLUDED.total_duration,
+session_count = r.session_count + EXCLUDED.session_count
+"""
+
+HABIT_LIST_SQL = """
+SELECT h.*,
+       COALESCE(s.total_completed, 0) AS completion_count,
+       s.last_completion_time,
+       CASE WHEN s.last_streak_day >= CURRENT_DATE - 1 THEN s.current_streak ELSE 0 END AS current_streak,
+       COALESCE(s.longest_streak, 0) AS longest_streak
+FROM habit_formation h
+LEFT JOIN habit_stats s ON s.habit_id = h.habit_id
+WHERE h.child_id = $1
+ORDER BY h.habit_name
+"""
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _require_asyncpg():
+    try:
+        import asyncpg
+    except ImportError as e:
+        raise ImportError("The PostgreSQL storage backend needs asyncpg: pip install asyncpg") from e
+    return asyncpg
+
+
+def _timestamp(value):
+    """'YYYY-MM-DD HH:MM:SS' string (as stored by SQLite) to datetime, None stays None"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _record_dict(record):
+    """asyncpg Record to the dict DatabaseManager returns"""
+    return {key: _plain(value) for key, value in record.items()}
+
+
+def _highlight(text, keyword, marks):
+    if not text:
+        return text
+    return re.sub(re.escape(keyword), lambda match: marks[0] + match.group(0) + marks[1], text, flags=re.IGNORECASE)
+
+
+class AsyncPostgresStorage:
+    """Coroutine versions of the StorageBackend methods on an asyncpg connection pool"""
+
+    def __init__(self, dsn, min_pool_size=1, max_pool_size=10, command_timeout=30):
+        self.dsn = dsn
+        self.min_pool_size = min_pool_size
+        self.max_pool_size = max_pool_size
+        self.command_timeout = command_timeout
+        self.pool = None
+        self._asyncpg = _require_asyncpg()
+
+    async def open_pool(self):
+        if self.pool is None:
+            self.pool = await self._asyncpg.create_pool(
+                self.dsn, min_size=self.min_pool_size, max_size=self.max_pool_size,
+                command_timeout=self.command_timeout
+            )
+        return self.pool
+
+    async def close_pool(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def initialize_database(self, background_backfill=False):
+        pool = await self.open_pool()
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                # Serializes schema setup of several application instances
+                await connection.execute("SELECT pg_advisory_xact_lock(hashtext('children_companion_schema'))")
+                for statement in POSTGRES_SCHEMA_SQL:
+                    await connection.execute(statement)
+        print("PostgreSQL database initialized")
+        return True
+
+    async def fetchval(self, query, *args):
+        pool = await self.open_pool()
+        return await pool.fetchval(query, *args)
+
+    async def fetchrow(self, query, *args):
+        pool = await self.open_pool()
+        record = await pool.fetchrow(query, *args)
+        return _record_dict(record) if record else None
+
+    async def fetch(self, query, *args):
+        pool = await self.open_pool()
+        return [_record_dict(record) for record in await pool.fetch(query, *args)]
+
+    async def add_user(self, username, password, user_type):
+        return await self.fetchval(
+            "INSERT INTO users (username, password, user_type) VALUES ($1, $2, $3) RETURNING user_id",
+            username, password, user_type
+        )
+
+    async def add_child_info(self, child_id, parent_id, name, age=None, gender=None, interests=None):
+        await self.fetchval(
+            "INSERT INTO children_info (child_id, parent_id, name, age, gender, interests) VALUES ($1, $2, $3, $4, $5, $6)",
+            child_id, parent_id, name, age, gender, interests
+        )
+        return True
+
+    async def add_content_resource(self, title, type, content_path, subtype=None, description=None,
+                                   thumbnail_path=None, age_range=None, tags=None):
+        pool = await self.open_pool()
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                resource_id = await connection.fetchval(
+                    """INSERT INTO content_resources (title, type, subtype, description, content_path, thumbnail_path,
+                    age_range, tags) VALUES ($1, $2, $3, $4, $5, $6, $7, $8) RETURNING resource_id""",
+                    title, type, subtype, description, content_path, thumbnail_path, age_range, tags
+                )
+                await connection.executemany(
+                    "INSERT INTO content_tags (tag, resource_id) VALUES ($1, $2) ON CONFLICT DO NOTHING",
+                    [(tag, resource_id) for tag in split_tags(tags)]
+                )
+        return resource_id
+
+    async def add_usage_record(self, user_id, resource_id, activity_type):
+        return await self.fetchval(
+            "INSERT INTO usage_records (user_id, resource_id, activity_type) VALUES ($1, $2, $3) RETURNING record_id",
+            user_id, resource_id, activity_type
+        )
+
+    async def update_usage_record(self, record_id, end_time=None, completion_status=None):
+        end_time = _timestamp(end_time) or datetime.now().replace(microsecond=0)
+        pool = await self.open_pool()
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                result = await connection.fetchrow(
+                    """SELECT start_time, user_id, activity_type, resource_id, duration FROM usage_records
+                    WHERE record_id = $1 FOR UPDATE""",
+                    record_id
+                )
+                if not result:
+                    print(f"Record ID not found: {record_id}")
+                    return False
+                duration = int((end_time - result['start_time']).total_seconds())
+                await connection.execute(
+                    "UPDATE usage_records SET end_time = $1, duration = $2, completion_status = $3 WHERE record_id = $4",
+                    end_time, duration, completion_status, record_id
+                )
+                # A re-closed session only adds the difference, as in DatabaseManager
+                previous_duration = result['duration']
+                await connection.execute(
+                    ROLLUP_SESSION_SQL, result['user_id'], result['start_time'], result['activity_type'],
+                    result['resource_id'], duration - (previous_duration or 0), int(previous_duration is None)
+                )
+        return True
+
+    async def add_learning_progress(self, child_id, subject, topic, level, completion_rate=0):
+        return await self.fetchval(
+            """INSERT INTO learning_progress AS p (child_id, subject, topic, level, completion_rate)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (child_id, subject, topic, level) DO UPDATE SET
+            last_learning_time = CASE WHEN EXCLUDED.completion_rate > p.completion_rate
+                THEN LOCALTIMESTAMP(0) ELSE p.last_learning_time END,
+            completion_rate = GREATEST(p.completion_rate, EXCLUDED.completion_rate)
+            RETURNING progress_id""",
+            child_id, subject, topic, level, completion_rate
+        )
+
+    async def add_habit(self, child_id, habit_name, frequency, description=None, reminder_time=None):
+        return await self.fetchval(
+            """INSERT INTO habit_formation (child_id, habit_name, description, frequency, reminder_time)
+            VALUES ($1, $2, $3, $4, $5) RETURNING habit_id""",
+            child_id, habit_name, description, frequency, reminder_time
+        )
+
+    async def record_habit_completion(self, habit_id, completion_status, notes=None):
+        return await self.fetchval(
+            """INSERT INTO habit_completion_records (habit_id, completion_status, notes)
+            VALUES ($1, $2, $3) RETURNING record_id""",
+            habit_id, completion_status, notes
+        )
+
+    async def set_parental_control(self, parent_id, child_id, daily_time_limit=None, disabled_periods=None,
+                                   content_filter_level=None, allowed_content_types=None):
+        return await self.fetchval(
+            """INSERT INTO parental_control_settings AS s
+            (parent_id, child_id, daily_time_limit, disabled_periods, content_filter_level, allowed_content_types)
+            VALUES ($1, $2, $3, $4, $5, $6)
+            ON CONFLICT (parent_id, child_id) DO UPDATE SET
+            daily_time_limit = COALESCE(EXCLUDED.daily_time_limit, s.daily_time_limit),
+            disabled_periods = COALESCE(EXCLUDED.disabled_periods, s.disabled_periods),
+            content_filter_level = COALESCE(EXCLUDED.content_filter_level, s.content_filter_level),
+            allowed_content_types = COALESCE(EXCLUDED.allowed_content_types, s.allowed_content_types),
+            update_time = LOCALTIMESTAMP(0)
+            RETURNING setting_id""",
+            parent_id, child_id, daily_time_limit, disabled_periods, content_filter_level, allowed_content_types
+        )
+
+    async def _insert_many(self, query, rows, after_insert=None):
+        """Run one INSERT ... RETURNING per row inside a single transaction, return the ids in order"""
+        pool = await self.open_pool()
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                statement = await connection.prepare(query)
+                ids = [await statement.fetchval(*row) for row in rows]
+                if after_insert:
+                    await after_insert(connection, rows)
+        return ids
+
+    async def add_usage_records_bulk(self, records):
+        rows = [_bulk_tuple(record, ('user_id', 'resource_id', 'activity_type', 'start_time',
+                                     'end_time', 'duration', 'completion_status')) for record in records]
+        if not rows:
+            return []
+        now = datetime.now().replace(microsecond=0)
+        for index, row in enumerate(rows):
+            start_time = _timestamp(row[3]) or now
+            end_time = _timestamp(row[4])
+            duration = row[5]
+            if duration is None and end_time is not None:
+                duration = int((end_time - start_time).total_seconds())
+            rows[index] = row[:3] + (start_time, end_time, duration, row[6])
+
+        async def rollup(connection, inserted):
+            await connection.executemany(ROLLUP_SESSION_SQL, [
+                (row[0], row[3], row[2], row[1], row[5], 1) for row in inserted if row[5] is not None
+            ])
+
+        return await self._insert_many(
+            """INSERT INTO usage_records (user_id, resource_id, activity_type, start_time, end_time, duration,
+            completion_status) VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING record_id""",
+            rows, after_insert=rollup
+        )
+
+    async def record_habit_completions_bulk(self, completions):
+        rows = [_bulk_tuple(completion, ('habit_id', 'completion_status', 'notes', 'completion_time'))
+                for completion in completions]
+        if not rows:
+            return []
+        rows = [row[:3] + (_timestamp(row[3]),) for row in rows]
+        return await self._insert_many(
+            """INSERT INTO habit_completion_records (habit_id, completion_status, notes, completion_time)
+            VALUES ($1, $2, $3, COALESCE($4, LOCALTIMESTAMP(0))) RETURNING record_id""",
+            rows
+        )
+
+    async def upsert_learning_progress_bulk(self, progress_items):
+        rows = [_bulk_tuple(item, ('child_id', 'subject', 'topic', 'level', 'completion_rate', 'last_learning_time'))
+                for item in progress_items]
+        if not rows:
+            return []
+        rows = [row[:4] + (row[4] or 0, _timestamp(row[5])) for row in rows]
+        return await self._insert_many(
+            """INSERT INTO learning_progress AS p (child_id, subject, topic, level, completion_rate, last_learning_time)
+            VALUES ($1, $2, $3, $4, $5, COALESCE($6, LOCALTIMESTAMP(0)))
+            ON CONFLICT (child_id, subject, topic, level) DO UPDATE SET
+            last_learning_time = CASE WHEN EXCLUDED.completion_rate > p.completion_rate
+                THEN EXCLUDED.last_learning_time ELSE p.last_learning_time END,
+            completion_rate = GREATEST(p.completion_rate, EXCLUDED.completion_rate)
+            RETURNING progress_id""",
+            rows
+        )
+
+    async def get_user_info(self, username=None, user_id=None):
+        if username:
+            return await self.fetchrow("SELECT * FROM users WHERE username = $1", username)
+        if user_id:
+            return await self.fetchrow("SELECT * FROM users WHERE user_id = $1", user_id)
+        print("Must provide username or user_id")
+        return None
+
+    async def get_child_info(self, child_id):
+        return await self.fetchrow(
+            """SELECT c.*, u.username FROM children_info c
+            JOIN users u ON c.child_id = u.user_id WHERE c.child_id = $1""",
+            child_id
+        )
+
+    async def get_parent_children_list(self, parent_id):
+        return await self.fetch(
+            """SELECT c.*, u.username FROM children_info c
+            JOIN users u ON c.child_id = u.user_id WHERE c.parent_id = $1""",
+            parent_id
+        )
+
+    async def get_content_resources(self, type=None, subtype=None, age_range=None, tags=None, limit=10,
+                                    tag_match="all"):
+        tag_list = split_tags(tags)
+        if tag_list and tag_match not in ("all", "any"):
+            raise ValueError(f"Unknown tag match mode: {tag_match}")
+        # NULL parameters switch a filter off, so one statement serves every filter combination
+        query = """SELECT * FROM content_resources
+        WHERE ($1::TEXT IS NULL OR type = $1) AND ($2::TEXT IS NULL OR subtype = $2)
+        AND ($3::TEXT IS NULL OR age_range = $3)"""
+        if tag_list:
+            query += " AND resource_id IN (SELECT resource_id FROM content_tags WHERE tag = ANY($5::TEXT[])"
+            if tag_match == "all":
+                query += " GROUP BY resource_id HAVING COUNT(*) = cardinality($5::TEXT[])"
+            query += ")"
+        query += " ORDER BY creation_time DESC, resource_id DESC LIMIT $4"
+        args = [type or None, subtype or None, age_range or None, limit]
+        if tag_list:
+            args.append(tag_list)
+        return await self.fetch(query, *args)
+
+    async def get_usage_statistics(self, user_id, start_date=None, end_date=None):
+        if not start_date:
+            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        if not end_date:
+            end_date = datetime.now().strftime('%Y-%m-%d')
+        args = (user_id, date.fromisoformat(start_date), date.fromisoformat(end_date))
+        where = "WHERE user_id = $1 AND day BETWEEN $2 AND $3"
+
+        pool = await self.open_pool()
+        async with pool.acquire() as connection:
+            total_duration = await connection.fetchval(f"SELECT SUM(total_duration)::BIGINT FROM usage_daily_rollup {where}", *args)
+            by_activity = await connection.fetch(
+                f"SELECT activity_type, SUM(total_duration)::BIGINT FROM usage_daily_rollup {where} GROUP BY activity_type", *args
+            )
+            by_date = await connection.fetch(
+                f"SELECT day, SUM(total_duration)::BIGINT FROM usage_daily_rollup {where} GROUP BY day ORDER BY day", *args
+            )
+            frequent = await connection.fetch(
+                """SELECT u.resource_id, c.title, c.type, SUM(u.total_duration)::BIGINT AS duration
+                FROM usage_daily_rollup u JOIN content_resources c ON u.resource_id = c.resource_id
+                WHERE u.user_id = $1 AND u.day BETWEEN $2 AND $3
+                GROUP BY u.resource_id, c.title, c.type ORDER BY duration DESC LIMIT 5""",
+                *args
+            )
+        return {
+            'total_usage_duration': total_duration or 0,
+            'activity_statistics': {row[0]: row[1] for row in by_activity},
+            'date_statistics': {row[0].isoformat(): row[1] for row in by_date},
+            'frequent_content': [
+                {'resource_id': row[0], 'title': row[1], 'type': row[2], 'usage_duration': row[3]}
+                for row in frequent
+            ],
+        }
+
+    async def get_learning_progress(self, child_id, subject=None):
+        return await self.fetch(
+            """SELECT * FROM learning_progress WHERE child_id = $1 AND ($2::TEXT IS NULL OR subject = $2)
+            ORDER BY subject, level""",
+            child_id, subject or None
+        )
+
+    async def get_habit_list(self, child_id):
+        return await self.fetch(HABIT_LIST_SQL, child_id)
+
+    async def get_parental_control_settings(self, parent_id, child_id):
+        return await self.fetchrow(
+            "SELECT * FROM parental_control_settings WHERE parent_id = $1 AND child_id = $2",
+            parent_id, child_id
+        )
+
+    async def get_credentials(self, username):
+        """user_id, user_type and the stored password hash; verification is up to the caller"""
+        return await self.fetchrow("SELECT user_id, user_type, password FROM users WHERE username = $1", username)
+
+    async def replace_password_hash(self, user_id, old_hash, new_hash):
+        await self.fetchval(
+            "UPDATE users SET password = $1 WHERE user_id = $2 AND password = $3",
+            new_hash, user_id, old_hash
+        )
+        return True
+
+    async def search_content(self, keyword, type=None, limit=20, highlight=('<b>', '</b>')):
+        if not keyword or not keyword.strip():
+            return []
+        keyword = keyword.strip()
+        pattern = '%' + keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        # Title hits first, then tag hits, as the bm25 weights of the SQLite index
+        results = await self.fetch(
+            """SELECT * FROM content_resources
+            WHERE (title ILIKE $1 OR description ILIKE $1 OR tags ILIKE $1) AND ($2::TEXT IS NULL OR type = $2)
+            ORDER BY (title ILIKE $1) DESC, (tags ILIKE $1) DESC, creation_time DESC
+            LIMIT $3""",
+            pattern, type, limit
+        )
+        for result in results:
+            result['title_highlight'] = _highlight(result['title'], keyword, highlight)
+            result['snippet'] = _highlight(result['description'], keyword, highlight)
+        return results
+
+
+def _bulk_tuple(item, fields):
+    """Bulk API item (dict or tuple in field order) as a full-length tuple"""
+    if isinstance(item, dict):
+        return tuple(item.get(field) for field in fields)
+    item = tuple(item)
+    return item + (None,) * (len(fields) - len(item))
+
+
+class PostgresDatabaseManager(StorageBackend):
+    """Blocking StorageBackend over AsyncPostgresStorage
+
+    The event loop runs on a daemon thread; each method submits its
+    coroutine there and waits up to `timeout` seconds. Errors are printed
+    and turned into the same False / None / [] / {} results DatabaseManager
+    returns.
+    """
+
+    def __init__(self, dsn, min_pool_size=1, max_pool_size=10, timeout=30, pg_dump="pg_dump", password_hasher=None,
+                 session_ttl=300.0):
+        self.storage = AsyncPostgresStorage(dsn, min_pool_size, max_pool_size, command_timeout=timeout)
+        self.password_hasher = password_hasher or PasswordHasher()
+        self.sessions = SessionCache(session_ttl)
+        self.dsn = dsn
+        self.timeout = timeout
+        self.pg_dump = pg_dump
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="PostgresStorage", daemon=True)
+        self._thread.start()
+
+    def _call(self, method, description, failure, *args, **kwargs):
+        future = asyncio.run_coroutine_threadsafe(getattr(self.storage, method)(*args, **kwargs), self._loop)
+        try:
+            result = future.result(self.timeout)
+        except Exception as e:
+            # Same net as DatabaseManager: driver, pool, timeout and argument
+            # errors (asyncpg.InterfaceError, date.fromisoformat) all fail soft
+            future.cancel()
+            print(f"{description} error: {e}")
+            return failure
+        return failure if result is None else result
+
+    def initialize_database(self, background_backfill=False):
+        return self._call('initialize_database', "Initialize database", False)
+
+    def add_user(self, username, password, user_type):
+        """scrypt runs on the calling thread, as in DatabaseManager.add_user"""
+        return self._call('add_user', "Add user", False, username, self.password_hasher.hash(password), user_type)
+
+    def add_child_info(self, child_id, parent_id, name, age=None, gender=None, interests=None):
+        return self._call('add_child_info', "Add child information", False,
+                          child_id, parent_id, name, age, gender, interests)
+
+    def add_content_resource(self, title, type, content_path, subtype=None, description=None, thumbnail_path=None,
+                             age_range=None, tags=None):
+        return self._call('add_content_resource', "Add content resource", False,
+                          title, type, content_path, subtype, description, thumbnail_path, age_range, tags)
+
+    def add_usage_record(self, user_id, resource_id, activity_type):
+        return self._call('add_usage_record', "Add usage record", False, user_id, resource_id, activity_type)
+
+    def update_usage_record(self, record_id, end_time=None, completion_status=None):
+        return self._call('update_usage_record', "Update usage record", False, record_id, end_time, completion_status)
+
+    def add_learning_progress(self, child_id, subject, topic, level, completion_rate=0):
+        return self._call('add_learning_progress', "Add learning progress", False,
+                          child_id, subject, topic, level, completion_rate)
+
+    def add_habit(self, child_id, habit_name, frequency, description=None, reminder_time=None):
+        return self._call('add_habit', "Add habit", False, child_id, habit_name, frequency, description, reminder_time)
+
+    def record_habit_completion(self, habit_id, completion_status, notes=None):
+        return self._call('record_habit_completion', "Record habit completion", False,
+                          habit_id, completion_status, notes)
+
+    def set_parental_control(self, parent_id, child_id, daily_time_limit=None, disabled_periods=None,
+                             content_filter_level=None, allowed_content_types=None):
+        return self._call('set_parental_control', "Set parental control", False, parent_id, child_id,
+                          daily_time_limit, disabled_periods, content_filter_level, allowed_content_types)
+
+    def add_usage_records_bulk(self, records):
+        return self._call('add_usage_records_bulk', "Add usage records in bulk", False, records)
+
+    def record_habit_completions_bulk(self, completions):
+        return self._call('record_habit_completions_bulk', "Record habit completions in bulk", False, completions)
+
+    def upsert_learning_progress_bulk(self, progress_items):
+        return self._call('upsert_learning_progress_bulk', "Upsert learning progress in bulk", False, progress_items)
+
+    def get_user_info(self, username=None, user_id=None):
+        return self._call('get_user_info', "Get user information", None, username, user_id)
+
+    def get_child_info(self, child_id):
+        return self._call('get_child_info', "Get child information", None, child_id)
+
+    def get_parent_children_list(self, parent_id):
+        return self._call('get_parent_children_list', "Get parent's children list", [], parent_id)
+
+    def get_content_resources(self, type=None, subtype=None, age_range=None, tags=None, limit=10, tag_match="all"):
+        return self._call('get_content_resources', "Get content resources", [],
+                          type, subtype, age_range, tags, limit, tag_match)
+
+    def get_usage_statistics(self, user_id, start_date=None, end_date=None):
+        return self._call('get_usage_statistics', "Get usage statistics", {}, user_id, start_date, end_date)
+
+    def get_learning_progress(self, child_id, subject=None):
+        return self._call('get_learning_progress', "Get learning progress", [], child_id, subject)
+
+    def get_habit_list(self, child_id):
+        return self._call('get_habit_list', "Get habit list", [], child_id)
+
+    def get_parental_control_settings(self, parent_id, child_id):
+        return self._call('get_parental_control_settings', "Get parental control settings", None, parent_id, child_id)
+
+    def authenticate_user(self, username, password):
+        """Same contract as DatabaseManager.authenticate_user; scrypt runs on the calling thread, not the loop"""
+        result = self._call('get_credentials', "Authenticate user", None, username)
+        cached = self.sessions.lookup_credentials(username, password, result['password'] if result else None)
+        if cached:
+            return cached
+        if not result:
+            self.password_hasher.dummy_verify(password)
+            return None
+        stored = result['password']
+        matches, needs_rehash = self.password_hasher.verify(password, stored)
+        if not matches:
+            return None
+        if needs_rehash:
+            rehashed = self.password_hasher.hash(password)
+            if self._call('replace_password_hash', "Rehash password", False, result['user_id'], stored, rehashed):
+                stored = rehashed
+        user = {'user_id': result['user_id'], 'user_type': result['user_type']}
+        return dict(user, session_token=self.sessions.issue(username, password, user, stored))
+
+    def authenticate_session(self, session_token):
+        return self.sessions.lookup_token(session_token)
+
+    def end_session(self, session_token):
+        self.sessions.revoke(session_token)
+
+    def search_content(self, keyword, type=None, limit=20, highlight=('<b>', '</b>')):
+        return self._call('search_content', "Search content", [], keyword, type, limit, highlight)
+
+    def backup_database(self, backup_path=None):
+        """Dump the database with pg_dump (custom format, restore with pg_restore)"""
+        if not backup_path:
+            backup_path = f"backup/children_companion_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.dump"
+        backup_dir = os.path.dirname(backup_path)
+        if backup_dir and not os.path.exists(backup_dir):
+            os.makedirs(backup_dir)
+        try:
+            subprocess.run([self.pg_dump, "--format=custom", f"--file={backup_path}", self.dsn],
+                           check=True, capture_output=True)
+            print(f"Database has been backed up to: {backup_path}")
+            return True
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Backup database error: {e}")
+            return False
+
+    def close_pool(self):
+        """Close the connection pool and stop the event loop thread"""
+        if not self._loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.storage.close_pool(), self._loop).result(self.timeout)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(self.timeout)
@@ -0,0 +1,70 @@
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+
+class QueryCache:
+    """Thread-safe bounded LRU cache whose entries also expire after ttl seconds
+
+    Values are copied on the way in and out so callers can modify the
+    dicts they get back without corrupting the cache.
+    """
+
+    def __init__(self, max_entries=256, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl  # unit: seconds, None means entries never expire
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # key -> (expiry time, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (found, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expiry, value = entry
+                if expiry is None or expiry > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, copy.deepcopy(value)
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        expiry = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expiry, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        """Drop the given keys if cached"""
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+            }
@@ -0,0 +1,239 @@
+import os
+import csv
+import json
+import time
+import types
+import bisect
+import functools
+import threading
+from collections import deque
+from datetime import datetime
+
+from src.database.storage_profile import ReadOnlyConnection
+
+# Opt-in DatabaseManager profiler
+#
+# Enabled with DatabaseManager(profile=True | {...options} | QueryProfiler)
+# or by setting CHILDREN_COMPANION_DB_PROFILE=1. When it is off nothing is
+# wrapped or traced, so the manager runs exactly as before.
+#
+# When on, every public DatabaseManager method of that instance is wrapped to
+# record a latency histogram and the number of rows returned, and SQLite's
+# trace callback collects the statements each call ran. Calls slower than
+# slow_ms are kept in a bounded slow log together with the EXPLAIN QUERY PLAN
+# of their statements.
+#
+# Environment variables:
+#   CHILDREN_COMPANION_DB_PROFILE         1 to enable
+#   CHILDREN_COMPANION_DB_SLOW_MS         slow call threshold, default 50
+#   CHILDREN_COMPANION_DB_PROFILE_REPORT  report path written by write_report(),
+#                                         .csv for CSV, anything else JSON
+
+PROFILE_ENV = "CHILDREN_COMPANION_DB_PROFILE"
+SLOW_MS_ENV = "CHILDREN_COMPANION_DB_SLOW_MS"
+REPORT_ENV = "CHILDREN_COMPANION_DB_PROFILE_REPORT"
+
+# Histogram bucket upper bounds, unit: milliseconds (the last bucket is open)
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Connection plumbing and reporting methods are not profiled
+UNPROFILED_METHODS = {
+    'ensure_directory_exists', 'connect_database', 'close_connection', 'close_pool',
+    'cache_stats', 'query_stats', 'profile_report',
+}
+
+# Statements worth an EXPLAIN QUERY PLAN
+EXPLAINED_STATEMENTS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def _row_count(result):
+    if result is None or result is False:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict) and isinstance(result.get('items'), list):
+        return len(result['items'])  # a keyset page
+    return 1
+
+
+class _MethodStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, elapsed_ms, rows, error):
+        self.calls += 1
+        self.errors += error
+        self.rows += rows
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls"""
+        threshold = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= threshold:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return 0.0
+
+
+class QueryProfiler:
+    """Per-method latency histograms, row counts and a slow-query log for one DatabaseManager"""
+
+    def __init__(self, slow_ms=50.0, slow_log_size=200, report_path=None):
+        self.slow_ms = slow_ms
+        self.report_path = report_path
+        self.slow_log = deque(maxlen=slow_log_size)
+        self._methods = {}  # method name -> _MethodStats
+        self._lock = threading.Lock()
+        self._local = threading.local()  # statements traced by the running call
+        self._database_path = None
+
+    @classmethod
+    def from_environment(cls):
+        """Profiler configured from the environment, None when profiling is not enabled"""
+        if os.environ.get(PROFILE_ENV, "").lower() not in ("1", "true", "yes", "on"):
+            return None
+        return cls(slow_ms=float(os.environ.get(SLOW_MS_ENV, 50)), report_path=os.environ.get(REPORT_ENV))
+
+    def instrument(self, database):
+        """Wrap the public methods of one DatabaseManager instance"""
+        self._database_path = database.database_path
+        for name in dir(type(database)):
+            if name.startswith('_') or name in UNPROFILED_METHODS:
+                continue
+            if isinstance(getattr(type(database), name), types.FunctionType):
+                setattr(database, name, self._wrap(name, getattr(database, name)))
+
+    def trace(self, statement):
+        """sqlite3 trace callback, installed on the manager's connections while profiling"""
+        statements = getattr(self._local, 'statements', None)
+        if statements is not None:
+            statements.append(statement)
+
+    def _wrap(self, name, method):
+        @functools.wraps(method)
+        def profiled(*args, **kwargs):
+            outer = getattr(self._local, 'statements', None) is None
+            if outer:
+                self._local.statements = []
+            started = time.perf_counter()
+            error = True
+            try:
+                result = method(*args, **kwargs)
+                error = False
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                statements = self._local.statements
+                if outer:
+                    self._local.statements = None
+                if error:
+                    self._record(name, elapsed_ms, 0, True, statements if outer else None)
+            if isinstance(result, types.GeneratorType):
+                return self._wrap_generator(name, result)
+            self._record(name, elapsed_ms, _row_count(result), False, statements if outer else None)
+            return result
+        return profiled
+
+    def _wrap_generator(self, name, generator):
+        """Account a streaming method once it is exhausted or closed, with the rows it yielded"""
+        rows = 0
+        elapsed = 0.0
+        error = True
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    row = next(generator)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - started
+                rows += 1
+                yield row
+            error = False
+        finally:
+            generator.close()
+            self._record(name, elapsed * 1000, rows, error, None)
+
+    def _record(self, name, elapsed_ms, rows, error, statements):
+        with self._lock:
+            stats = self._methods.get(name)
+            if stats is None:
+                stats = self._methods[name] = _MethodStats()
+            stats.add(elapsed_ms, rows, error)
+        if elapsed_ms >= self.slow_ms:
+            self.slow_log.append({
+                'method': name,
+                'elapsed_ms': round(elapsed_ms, 3),
+                'rows': rows,
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'statements': [{'sql': statement, 'plan': self._explain(statement)}
+                               for statement in (statements or [])
+                               if statement.lstrip().upper().startswith(EXPLAINED_STATEMENTS)],
+            })
+
+    def _explain(self, statement):
+        """EXPLAIN QUERY PLAN of a traced statement on a separate read-only connection"""
+        connection = None
+        try:
+            connection = ReadOnlyConnection(self._database_path)
+            return [row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + statement)]
+        except Exception as e:
+            return [f"unavailable: {e}"]
+        finally:
+            if connection:
+                connection.close()
+
+    def report(self):
+        """Per-method summary plus the slow log"""
+        with self._lock:
+            methods = {}
+            for name, stats in sorted(self._methods.items()):
+                methods[name] = {
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'rows': stats.rows,
+                    'total_ms': round(stats.total_ms, 3),
+                    'mean_ms': round(stats.total_ms / stats.calls, 3),
+                    'max_ms': round(stats.max_ms, 3),
+                    'p50_ms': stats.percentile(0.5),
+                    'p95_ms': stats.percentile(0.95),
+                    'histogram': {
+                        (f"<={bound}" if index < len(LATENCY_BUCKETS_MS) else f">{LATENCY_BUCKETS_MS[-1]}"): count
+                        for index, (bound, count) in enumerate(zip(LATENCY_BUCKETS_MS + (None,), stats.buckets))
+                    },
+                }
+        return {'slow_ms': self.slow_ms, 'methods': methods, 'slow_queries': list(self.slow_log)}
+
+    def write_report(self, path=None):
+        """Write the report as JSON, or as CSV (one row per method) when path ends in .csv"""
+        path = path or self.report_path
+        if not path:
+            return None
+        report = self.report()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        if path.lower().endswith('.csv'):
+            bucket_names = [f"<={bound}" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"]
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['method', 'calls', 'errors', 'rows', 'total_ms', 'mean_ms', 'max_ms',
+                                 'p50_ms', 'p95_ms'] + bucket_names)
+                for name, stats in report['methods'].items():
+                    writer.writerow([name, stats['calls'], stats['errors'], stats['rows'], stats['total_ms'],
+                                     stats['mean_ms'], stats['max_ms'], stats['p50_ms'], stats['p95_ms']]
+                                    + [stats['histogram'][bucket] for bucket in bucket_names])
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Database profile written to: {path}")
+        return path
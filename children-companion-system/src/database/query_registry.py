@@ -0,0 +1,104 @@
+import time
+import threading
+
+# Prepared query registry
+#
+# sqlite3 keeps a per-connection LRU of prepared statements keyed by the SQL
+# text. Listing methods whose SQL text changes with every filter combination
+# (or with the number of tags) fill that cache with near-duplicates and keep
+# re-preparing. The registry hands out one canonical, fully parameterized
+# statement per filter shape, so the number of distinct texts stays small
+# and bounded, and every execution after the first on a connection reuses
+# the prepared statement.
+#
+# Timings: sqlite3 does not expose prepare separately, so the first execution
+# of a statement on a connection (prepare + first step) is counted as "cold"
+# and later ones as "warm"; the difference of their means estimates the
+# prepare cost.
+
+# Passed as cached_statements to every connection; comfortably above the
+# number of canonical statements so none is evicted
+STATEMENT_CACHE_SIZE = 256
+
+
+class QueryRegistry:
+    """Canonical statement texts per query name and filter shape, with execution timings"""
+
+    def __init__(self):
+        self._statements = {}  # (query name, shape) -> SQL text
+        # connection id -> SQL texts already prepared on it; entries are dropped
+        # by forget_connection when the connection closes, so a later
+        # connection reusing the id starts cold
+        self._prepared = {}
+        self._stats = {}  # query name -> counters
+        self._texts = {}  # query name -> distinct SQL texts executed
+        self._lock = threading.Lock()
+
+    def statement(self, name, shape, build):
+        """SQL text for one filter shape of a query, built once by build(shape)"""
+        key = (name, shape)
+        sql = self._statements.get(key)
+        if sql is None:
+            sql = build(shape)
+            with self._lock:
+                sql = self._statements.setdefault(key, sql)
+        return sql
+
+    def execute(self, cursor, name, sql, params=()):
+        """Execute a registered statement and record whether it had to be prepared"""
+        connection_id = id(cursor.connection)
+        cold = sql not in self._prepared.get(connection_id, ())
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            if cold:
+                self._prepared.setdefault(connection_id, set()).add(sql)
+                self._texts.setdefault(name, set()).add(sql)
+            stats = self._stats.setdefault(name, {'cold': 0, 'cold_seconds': 0.0, 'warm': 0,
+                                                  'warm_seconds': 0.0, 'fetch_seconds': 0.0})
+            if cold:
+                stats['cold'] += 1
+                stats['cold_seconds'] += elapsed
+            else:
+                stats['warm'] += 1
+                stats['warm_seconds'] += elapsed
+        return cursor
+
+    def fetchall(self, cursor, name, sql, params=()):
+        """Execute a registered statement and fetch every row, timing the fetch too"""
+        self.execute(cursor, name, sql, params)
+        started = time.perf_counter()
+        rows = cursor.fetchall()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats[name]['fetch_seconds'] += elapsed
+        return rows
+
+    def forget_connection(self, connection=None):
+        """Drop prepared-statement bookkeeping of a closed connection (of all connections if None)"""
+        with self._lock:
+            if connection is None:
+                self._prepared.clear()
+            else:
+                self._prepared.pop(id(connection), None)
+
+    def stats(self):
+        """Per query: distinct statements, cold/warm executions and mean times in ms"""
+        with self._lock:
+            report = {}
+            for name, stats in self._stats.items():
+                mean_cold = stats['cold_seconds'] * 1000 / stats['cold'] if stats['cold'] else None
+                mean_warm = stats['warm_seconds'] * 1000 / stats['warm'] if stats['warm'] else None
+                executions = stats['cold'] + stats['warm']
+                report[name] = {
+                    'statements': len(self._texts.get(name, ())),
+                    'executions': executions,
+                    'prepares': stats['cold'],
+                    'mean_cold_execute_ms': mean_cold,
+                    'mean_warm_execute_ms': mean_warm,
+                    'estimated_prepare_ms': (max(mean_cold - mean_warm, 0.0)
+                                             if mean_cold is not None and mean_warm is not None else None),
+                    'mean_fetch_ms': stats['fetch_seconds'] * 1000 / executions,
+                }
+            return report
@@ -0,0 +1,42 @@
+import sqlite3
+from functools import lru_cache
+from collections import namedtuple
+
+# Row representations for DatabaseManager read methods
+#
+#   'dict'   plain dicts (the historical return type), the largest and
+#            slowest to build because every row gets its own hash table
+#   'row'    sqlite3.Row, built in C; supports row['name'], row[0] and keys()
+#   'tuple'  a namedtuple class generated per table and column list; no
+#            per-row __dict__ (__slots__ = ()), attribute and index access
+#
+# Names are resolved once per result set, never per row.
+
+ROW_TYPES = ('dict', 'row', 'tuple')
+DEFAULT_ROW_TYPE = 'dict'
+
+
+@lru_cache(maxsize=128)
+def row_class(name, fields):
+    """namedtuple class for one table and column list
+
+    Duplicate or invalid column names (e.g. from a join) are renamed to _1, _2, ...
+    """
+    return namedtuple(name, fields, rename=True)
+
+
+def row_converter(cursor, row_type, name='Row'):
+    """Return a function turning a raw result tuple of cursor into the requested representation"""
+    if row_type not in ROW_TYPES:
+        raise ValueError(f"Unknown row type: {row_type}")
+    column_names = tuple(description[0] for description in cursor.description)
+    if row_type == 'row':
+        return lambda row: sqlite3.Row(cursor, row)
+    if row_type == 'tuple':
+        return row_class(name, column_names)._make
+    return lambda row: dict(zip(column_names, row))
+
+
+def convert_rows(cursor, rows, row_type, name='Row'):
+    """Convert all fetched rows of cursor to the requested representation"""
+    return list(map(row_converter(cursor, row_type, name), rows))
@@ -0,0 +1,482 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from src.database.change_feed import ChangeFeed
+from src.database.database_system import DatabaseManager
+from src.database.storage_backend import StorageBackend
+
+# Multi-tenant sharded storage
+#
+# Each family (a parent and its children) gets its own SQLite file, so
+# households never wait on each other's write lock. A global catalog
+# database holds what is shared or needed for routing:
+#   - users: every account, with a globally unique user_id (login, lookup)
+#   - content_resources: the content catalog and its search index
+#   - family_shards: parent_id -> shard number and file (the shard map)
+#   - user_families: user_id -> parent_id of the family it belongs to
+#
+# A shard is a regular DatabaseManager database. It holds copies of its
+# family's users rows and of the content rows it has used, so the foreign
+# keys of the family tables keep working; the catalog stays authoritative.
+#
+# Rows created in a shard get ids carrying the shard number in their high
+# bits (shard_number << SHARD_ID_BITS plus a local counter), so
+# update_usage_record(record_id) or record_habit_completion(habit_id) can be
+# routed from the id alone.
+
+SHARD_ID_BITS = 32
+
+# Tables whose AUTOINCREMENT ids are allocated in the shard's id range
+SHARD_ID_TABLES = ['usage_records', 'learning_progress', 'habit_formation', 'habit_completion_records',
+                   'parental_control_settings', 'system_settings']
+
+CREATE_SHARD_MAP_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS family_shards (
+        shard_number INTEGER PRIMARY KEY AUTOINCREMENT,
+        parent_id INTEGER NOT NULL UNIQUE,
+        shard_path TEXT NOT NULL,
+        creation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_families (
+        user_id INTEGER PRIMARY KEY,
+        parent_id INTEGER,  -- NULL for a child account not yet linked to a parent
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    )
+    """,
+]
+
+
+def shard_number_of(row_id):
+    """Shard number encoded in an id created inside a shard"""
+    return row_id >> SHARD_ID_BITS
+
+
+class ShardedDatabaseManager(StorageBackend):
+    """DatabaseManager API over one database file per family plus a global catalog
+
+    shard_options are passed to every shard's DatabaseManager (e.g.
+    pool_size, storage_profile, cache_size); catalog_options to the catalog's.
+    Account creation takes the family explicitly: add_user(..., parent_id=...)
+    for children, or links the child later through add_child_info.
+    """
+
+    def __init__(self, shard_directory="data/shards", catalog_path=None, shard_options=None, catalog_options=None,
+                 max_workers=8):
+        self.shard_directory = shard_directory
+        if not os.path.exists(shard_directory):
+            os.makedirs(shard_directory)
+        # One change feed for the catalog and every shard
+        self.changes = ChangeFeed()
+        self.catalog = DatabaseManager(catalog_path or os.path.join(shard_directory, "catalog.db"),
+                                       change_feed=self.changes, **(catalog_options or {}))
+        self.shard_options = shard_options or {}
+        self.max_workers = max_workers  # parallel shards in fan-out queries
+
+        self._shards = {}  # shard number -> DatabaseManager
+        self._family_shards = {}  # parent_id -> shard number
+        self._user_families = {}  # user_id -> parent_id
+        self._lock = threading.RLock()
+
+    # --- shard map ---
+
+    def initialize_database(self, background_backfill=False):
+        """Create or upgrade the catalog and every existing shard"""
+        if not self.catalog.initialize_database(background_backfill):
+            return False
+        if not self._catalog_execute(CREATE_SHARD_MAP_SQL):
+            return False
+        for shard_number, parent_id, shard_path in self._catalog_fetch(
+                "SELECT shard_number, parent_id, shard_path FROM family_shards"):
+            self._family_shards[parent_id] = shard_number
+            if not self._open_shard(shard_number, shard_path).initialize_database(background_backfill):
+                return False
+        return True
+
+    def _catalog_execute(self, statements, params=()):
+        if not self.catalog.connect_database():
+            return False
+        try:
+            for statement in statements:
+                self.catalog.cursor.execute(statement, params)
+            self.catalog.connection.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Catalog update error: {e}")
+            self.catalog.connection.rollback()
+            return False
+        finally:
+            self.catalog.close_connection()
+
+    def _catalog_fetch(self, query, params=()):
+        if not self.catalog.connect_database(read_only=True):
+            return []
+        try:
+            self.catalog.cursor.execute(query, params)
+            return self.catalog.cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Catalog query error: {e}")
+            return []
+        finally:
+            self.catalog.close_connection()
+
+    def _open_shard(self, shard_number, shard_path):
+        with self._lock:
+            shard = self._shards.get(shard_number)
+            if shard is None:
+                shard = DatabaseManager(shard_path, change_feed=self.changes, **self.shard_options)
+                self._shards[shard_number] = shard
+            return shard
+
+    def _create_shard(self, parent_id):
+        """Register a new family in the shard map and create its database file"""
+        with self._lock:
+            if parent_id in self._family_shards:
+                return self._shards[self._family_shards[parent_id]]
+            if not self.catalog.connect_database():
+                return None
+            try:
+                self.catalog.cursor.execute(
+                    "INSERT INTO family_shards (parent_id, shard_path) VALUES (?, '') "
+                    "ON CONFLICT (parent_id) DO UPDATE SET parent_id = excluded.parent_id RETURNING shard_number",
+                    (parent_id,)
+                )
+                shard_number = self.catalog.cursor.fetchone()[0]
+                shard_path = os.path.join(self.shard_directory, f"family_{parent_id}.db")
+                self.catalog.cursor.execute("UPDATE family_shards SET shard_path = ? WHERE shard_number = ?",
+                                            (shard_path, shard_number))
+                self.catalog.connection.commit()
+            except sqlite3.Error as e:
+                print(f"Create shard error: {e}")
+                self.catalog.connection.rollback()
+                return None
+            finally:
+                self.catalog.close_connection()
+
+            shard = self._open_shard(shard_number, shard_path)
+            if not shard.initialize_database():
+                return None
+            # Start every id sequence of the shard at shard_number << SHARD_ID_BITS
+            self._shard_execute(shard, "INSERT INTO sqlite_sequence (name, seq) "
+                                       "SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                                [(table, shard_number << SHARD_ID_BITS, table) for table in SHARD_ID_TABLES])
+            self._family_shards[parent_id] = shard_number
+            print(f"Family shard created: {shard_path}")
+            return shard
+
+    @staticmethod
+    def _shard_execute(shard, statement, param_rows):
+        if not shard.connect_database():
+            return False
+        try:
+            shard.cursor.executemany(statement, param_rows)
+            shard.connection.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Shard update error: {e}")
+            shard.connection.rollback()
+            return False
+        finally:
+            shard.close_connection()
+
+    def family_of(self, user_id):
+        """parent_id of the family a user belongs to, None if unknown or unlinked"""
+        if user_id in self._user_families:
+            return self._user_families[user_id]
+        rows = self._catalog_fetch("SELECT parent_id FROM user_families WHERE user_id = ?", (user_id,))
+        parent_id = rows[0][0] if rows else None
+        if parent_id is not None:
+            self._user_families[user_id] = parent_id
+        return parent_id
+
+    def shard_for_family(self, parent_id):
+        """DatabaseManager of a family's shard, None if the family has none"""
+        shard_number = self._family_shards.get(parent_id)
+        if shard_number is None:
+            rows = self._catalog_fetch("SELECT shard_number, shard_path FROM family_shards WHERE parent_id = ?",
+                                       (parent_id,))
+            if not rows:
+                return None
+            shard_number, shard_path = rows[0]
+            self._open_shard(shard_number, shard_path)
+            self._family_shards[parent_id] = shard_number
+        return self._shards[shard_number]
+
+    def shard_for_user(self, user_id):
+        parent_id = self.family_of(user_id)
+        return self.shard_for_family(parent_id) if parent_id is not None else None
+
+    def shard_for_id(self, row_id):
+        """Shard that created a usage record, habit, completion or setting id"""
+        shard_number = shard_number_of(row_id)
+        with self._lock:
+            shard = self._shards.get(shard_number)
+        if shard is None:
+            rows = self._catalog_fetch("SELECT shard_path FROM family_shards WHERE shard_number = ?", (shard_number,))
+            if not rows:
+                return None
+            shard = self._open_shard(shard_number, rows[0][0])
+        return shard
+
+    def _link_user(self, user_id, parent_id):
+        """Record a user's family and copy the users row into the family shard"""
+        shard = self.shard_for_family(parent_id) or self._create_shard(parent_id)
+        if shard is None:
+            return None
+        user_info = self.catalog.get_user_info(user_id=user_id)
+        if not user_info:
+            print(f"User not found: {user_id}")
+            return None
+        columns = list(user_info)
+        placeholders = ', '.join('?' for column in columns)
+        if not self._shard_execute(shard, f"INSERT OR IGNORE INTO users ({', '.join(columns)}) VALUES ({placeholders})",
+                                   [[user_info[column] for column in columns]]):
+            return None
+        if not self._catalog_execute(["INSERT INTO user_families (user_id, parent_id) VALUES (?, ?) "
+                                      "ON CONFLICT (user_id) DO UPDATE SET parent_id = excluded.parent_id"],
+                                     (user_id, parent_id)):
+            return None
+        self._user_families[user_id] = parent_id
+        return shard
+
+    def _copy_content(self, shard, resource_ids):
+        """Make sure the shard holds the catalog rows of the given content resources"""
+        resource_ids = sorted({resource_id for resource_id in resource_ids if resource_id})
+        if not resource_ids:
+            return True
+        placeholders = ', '.join('?' for resource_id in resource_ids)
+        if not self.catalog.connect_database(read_only=True):
+            return False
+        try:
+            self.catalog.cursor.execute(f"SELECT * FROM content_resources WHERE resource_id IN ({placeholders})",
+                                        resource_ids)
+            columns = [description[0] for description in self.catalog.cursor.description]
+            rows = self.catalog.cursor.fetchall()
+        finally:
+            self.catalog.close_connection()
+        updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column != 'resource_id')
+        return self._shard_execute(
+            shard,
+            f"INSERT INTO content_resources ({', '.join(columns)}) VALUES ({', '.join('?' for column in columns)}) "
+            f"ON CONFLICT (resource_id) DO UPDATE SET {updates}",
+            rows
+        )
+
+    # --- accounts and families ---
+
+    def add_user(self, username, password, user_type, parent_id=None):
+        """Add an account to the catalog; parents get their own shard, children join parent_id's"""
+        user_id = self.catalog.add_user(username, password, user_type)
+        if not user_id:
+            return user_id
+        family = user_id if user_type == 'parent' else parent_id
+        if family is None:
+            self._catalog_execute(["INSERT OR IGNORE INTO user_families (user_id, parent_id) VALUES (?, NULL)"],
+                                  (user_id,))
+        elif self._link_user(user_id, family) is None:
+            return False
+        return user_id
+
+    def add_child_info(self, child_id, parent_id, name, age=None, gender=None, interests=None):
+        shard = self.shard_for_family(parent_id) or self._link_user(parent_id, parent_id)
+        if shard is None or (self.family_of(child_id) != parent_id and self._link_user(child_id, parent_id) is None):
+            print(f"Add child information error: family of parent {parent_id} not available")
+            return False
+        return shard.add_child_info(child_id, parent_id, name, age, gender, interests)
+
+    def get_user_info(self, username=None, user_id=None):
+        return self.catalog.get_user_info(username, user_id)
+
+    def authenticate_user(self, username, password):
+        return self.catalog.authenticate_user(username, password)
+
+    def authenticate_session(self, session_token):
+        return self.catalog.authenticate_session(session_token)
+
+    def end_session(self, session_token):
+        self.catalog.end_session(session_token)
+
+    def get_child_info(self, child_id):
+        shard = self.shard_for_user(child_id)
+        return shard.get_child_info(child_id) if shard else None
+
+    def get_parent_children_list(self, parent_id, row_type=None):
+        shard = self.shard_for_family(parent_id)
+        return shard.get_parent_children_list(parent_id, row_type) if shard else []
+
+    def iter_parent_children(self, parent_id, batch_size=200, row_type=None):
+        shard = self.shard_for_family(parent_id)
+        return shard.iter_parent_children(parent_id, batch_size, row_type) if shard else iter(())
+
+    # --- content catalog ---
+
+    def add_content_resource(self, title, type, content_path, subtype=None, description=None, thumbnail_path=None,
+                             age_range=None, tags=None):
+        return self.catalog.add_content_resource(title, type, content_path, subtype, description, thumbnail_path,
+                                                 age_range, tags)
+
+    def get_content_resources(self, *args, **kwargs):
+        return self.catalog.get_content_resources(*args, **kwargs)
+
+    def get_content_resources_page(self, *args, **kwargs):
+        return self.catalog.get_content_resources_page(*args, **kwargs)
+
+    def iter_content_resources(self, *args, **kwargs):
+        return self.catalog.iter_content_resources(*args, **kwargs)
+
+    def search_content(self, *args, **kwargs):
+        return self.catalog.search_content(*args, **kwargs)
+
+    def iter_search_content(self, *args, **kwargs):
+        return self.catalog.iter_search_content(*args, **kwargs)
+
+    # --- family activity ---
+
+    def add_usage_record(self, user_id, resource_id, activity_type):
+        shard = self.shard_for_user(user_id)
+        if shard is None or not self._copy_content(shard, [resource_id]):
+            print(f"Add usage record error: no family shard for user {user_id}")
+            return False
+        return shard.add_usage_record(user_id, resource_id, activity_type)
+
+    def update_usage_record(self, record_id, end_time=None, completion_status=None):
+        shard = self.shard_for_id(record_id)
+        return shard.update_usage_record(record_id, end_time, completion_status) if shard else False
+
+    def add_learning_progress(self, child_id, subject, topic, level, completion_rate=0):
+        shard = self.shard_for_user(child_id)
+        return shard.add_learning_progress(child_id, subject, topic, level, completion_rate) if shard else False
+
+    def add_habit(self, child_id, habit_name, frequency, description=None, reminder_time=None):
+        shard = self.shard_for_user(child_id)
+        return shard.add_habit(child_id, habit_name, frequency, description, reminder_time) if shard else False
+
+    def record_habit_completion(self, habit_id, completion_status, notes=None):
+        shard = self.shard_for_id(habit_id)
+        return shard.record_habit_completion(habit_id, completion_status, notes) if shard else False
+
+    def set_parental_control(self, parent_id, child_id, daily_time_limit=None, disabled_periods=None,
+                             content_filter_level=None, allowed_content_types=None):
+        shard = self.shard_for_family(parent_id)
+        if shard is None:
+            return False
+        return shard.set_parental_control(parent_id, child_id, daily_time_limit, disabled_periods,
+                                          content_filter_level, allowed_content_types)
+
+    def _bulk_by_shard(self, items, fields, route, write, prepare=None):
+        """Split bulk items by shard, write each group, return the ids in input order"""
+        rows = DatabaseManager._bulk_rows(items, fields)
+        groups = {}
+        for index, row in enumerate(rows):
+            shard = route(row)
+            if shard is None:
+                print(f"Bulk write error: no family shard for {row}")
+                return False
+            groups.setdefault(id(shard), (shard, []))[1].append((index, row))
+
+        ids = [None] * len(rows)
+        for shard, indexed_rows in groups.values():
+            group_rows = [row for index, row in indexed_rows]
+            if prepare and not prepare(shard, group_rows):
+                return False
+            group_ids = write(shard)(group_rows)
+            if group_ids is False:
+                return False
+            for (index, row), row_id in zip(indexed_rows, group_ids):
+                ids[index] = row_id
+        return ids
+
+    def add_usage_records_bulk(self, records):
+        return self._bulk_by_shard(
+            records, DatabaseManager.USAGE_RECORD_FIELDS,
+            lambda row: self.shard_for_user(row['user_id']),
+            lambda shard: shard.add_usage_records_bulk,
+            prepare=lambda shard, rows: self._copy_content(shard, [row['resource_id'] for row in rows])
+        )
+
+    def record_habit_completions_bulk(self, completions):
+        return self._bulk_by_shard(
+            completions, DatabaseManager.HABIT_COMPLETION_FIELDS,
+            lambda row: self.shard_for_id(row['habit_id']),
+            lambda shard: shard.record_habit_completions_bulk
+        )
+
+    def upsert_learning_progress_bulk(self, progress_items):
+        return self._bulk_by_shard(
+            progress_items, DatabaseManager.LEARNING_PROGRESS_FIELDS,
+            lambda row: self.shard_for_user(row['child_id']),
+            lambda shard: shard.upsert_learning_progress_bulk
+        )
+
+    def get_usage_statistics(self, user_id, start_date=None, end_date=None):
+        shard = self.shard_for_user(user_id)
+        return shard.get_usage_statistics(user_id, start_date, end_date) if shard else {}
+
+    def get_learning_progress(self, child_id, subject=None, row_type=None):
+        shard = self.shard_for_user(child_id)
+        return shard.get_learning_progress(child_id, subject, row_type) if shard else []
+
+    def iter_learning_progress(self, child_id, subject=None, batch_size=200, row_type=None):
+        shard = self.shard_for_user(child_id)
+        return shard.iter_learning_progress(child_id, subject, batch_size, row_type) if shard else iter(())
+
+    def get_habit_list(self, child_id, row_type=None):
+        shard = self.shard_for_user(child_id)
+        return shard.get_habit_list(child_id, row_type) if shard else []
+
+    def get_parental_control_settings(self, parent_id, child_id):
+        shard = self.shard_for_family(parent_id)
+        return shard.get_parental_control_settings(parent_id, child_id) if shard else None
+
+    # --- administration ---
+
+    def family_ids(self):
+        """parent_id of every family with a shard"""
+        return [row[0] for row in self._catalog_fetch("SELECT parent_id FROM family_shards ORDER BY parent_id")]
+
+    def fan_out(self, function, parent_ids=None):
+        """Call function(shard DatabaseManager) for every family in parallel, returns {parent_id: result}"""
+        parent_ids = self.family_ids() if parent_ids is None else parent_ids
+        shards = {parent_id: self.shard_for_family(parent_id) for parent_id in parent_ids}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {parent_id: executor.submit(function, shard)
+                       for parent_id, shard in shards.items() if shard is not None}
+            return {parent_id: future.result() for parent_id, future in futures.items()}
+
+    def admin_query(self, query, params=(), parent_ids=None):
+        """Run a read-only query on every shard in parallel, returns rows prefixed with their parent_id"""
+        def run(shard):
+            if not shard.connect_database(read_only=True):
+                return []
+            try:
+                shard.cursor.execute(query, params)
+                return shard.cursor.fetchall()
+            except sqlite3.Error as e:
+                print(f"Admin query error on {shard.database_path}: {e}")
+                return []
+            finally:
+                shard.close_connection()
+
+        results = self.fan_out(run, parent_ids)
+        return [(parent_id,) + tuple(row) for parent_id, rows in sorted(results.items()) for row in rows]
+
+    def backup_database(self, backup_directory=None):
+        """Back up the catalog and every shard into one directory"""
+        if backup_directory is None:
+            backup_directory = os.path.join("backup", f"shards_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        results = self.fan_out(lambda shard: shard.backup_database(
+            os.path.join(backup_directory, os.path.basename(shard.database_path))))
+        catalog_result = self.catalog.backup_database(
+            os.path.join(backup_directory, os.path.basename(self.catalog.database_path)))
+        return catalog_result and all(results.values())
+
+    def close_pool(self):
+        self.catalog.close_pool()
+        with self._lock:
+            for shard in self._shards.values():
+                shard.close_pool()
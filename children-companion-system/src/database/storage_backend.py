@@ -0,0 +1,149 @@
+from abc import ABC, abstractmethod
+
+# Storage backend interface
+#
+# StorageBackend is the method surface the rest of the program uses
+# (UI, speech module, event journal, parent dashboard). Implementations:
+#
+#   DatabaseManager            single SQLite file, the default
+#   ShardedDatabaseManager     one SQLite file per family plus a catalog
+#   PostgresDatabaseManager    PostgreSQL through asyncpg with a connection pool
+#
+# create_storage_backend() picks one from a URL. Every method keeps the
+# SQLite semantics: writers return the new id (or False on error), readers
+# return dicts / lists of dicts, or None / [] / {} when nothing is found.
+
+
+class StorageBackend(ABC):
+    """Storage operations of the children companion system"""
+
+    @abstractmethod
+    def initialize_database(self, background_backfill=False):
+        """Create or upgrade the schema"""
+
+    @abstractmethod
+    def add_user(self, username, password, user_type):
+        """Add a user, return the user_id; hashes the password (scrypt) on the calling thread"""
+
+    @abstractmethod
+    def add_child_info(self, child_id, parent_id, name, age=None, gender=None, interests=None):
+        """Add a child's details, return the child_id"""
+
+    @abstractmethod
+    def add_content_resource(self, title, type, content_path, subtype=None, description=None, thumbnail_path=None,
+                             age_range=None, tags=None):
+        """Add a content resource, return the resource_id"""
+
+    @abstractmethod
+    def add_usage_record(self, user_id, resource_id, activity_type):
+        """Start a usage session, return the record_id"""
+
+    @abstractmethod
+    def update_usage_record(self, record_id, end_time=None, completion_status=None):
+        """End a usage session, return True on success"""
+
+    @abstractmethod
+    def add_learning_progress(self, child_id, subject, topic, level, completion_rate=0):
+        """Add or update learning progress, return the progress_id"""
+
+    @abstractmethod
+    def add_habit(self, child_id, habit_name, frequency, description=None, reminder_time=None):
+        """Add a habit, return the habit_id"""
+
+    @abstractmethod
+    def record_habit_completion(self, habit_id, completion_status, notes=None):
+        """Record a habit completion, return the record_id"""
+
+    @abstractmethod
+    def set_parental_control(self, parent_id, child_id, daily_time_limit=None, disabled_periods=None,
+                             content_filter_level=None, allowed_content_types=None):
+        """Create or update parental control settings, return the setting_id"""
+
+    @abstractmethod
+    def add_usage_records_bulk(self, records):
+        """Insert finished usage records in one transaction, return their ids in input order"""
+
+    @abstractmethod
+    def record_habit_completions_bulk(self, completions):
+        """Insert habit completions in one transaction, return their ids in input order"""
+
+    @abstractmethod
+    def upsert_learning_progress_bulk(self, progress_items):
+        """Add or update learning progress rows in one transaction, return their ids in input order"""
+
+    @abstractmethod
+    def get_user_info(self, username=None, user_id=None):
+        """User row by username or user_id"""
+
+    @abstractmethod
+    def get_child_info(self, child_id):
+        """Child details joined with the account"""
+
+    @abstractmethod
+    def get_parent_children_list(self, parent_id):
+        """All children of a parent"""
+
+    @abstractmethod
+    def get_content_resources(self, type=None, subtype=None, age_range=None, tags=None, limit=10, tag_match="all"):
+        """Newest content resources matching the filters"""
+
+    @abstractmethod
+    def get_usage_statistics(self, user_id, start_date=None, end_date=None):
+        """Usage totals by activity, by date and most used content"""
+
+    @abstractmethod
+    def get_learning_progress(self, child_id, subject=None):
+        """A child's learning progress ordered by subject and level"""
+
+    @abstractmethod
+    def get_habit_list(self, child_id):
+        """A child's habits with completion counts and streaks"""
+
+    @abstractmethod
+    def get_parental_control_settings(self, parent_id, child_id):
+        """Parental control settings of a parent/child pair"""
+
+    @abstractmethod
+    def authenticate_user(self, username, password):
+        """{'user_id', 'user_type', 'session_token'} when the credentials match, else None"""
+
+    @abstractmethod
+    def authenticate_session(self, session_token):
+        """The user of a live session token, else None"""
+
+    @abstractmethod
+    def end_session(self, session_token):
+        """Revoke a session token"""
+
+    @abstractmethod
+    def search_content(self, keyword, type=None, limit=20, highlight=('<b>', '</b>')):
+        """Content resources matching a keyword, best first"""
+
+    @abstractmethod
+    def backup_database(self, backup_path=None):
+        """Write a backup, return True on success"""
+
+    @abstractmethod
+    def close_pool(self):
+        """Release pooled connections, e.g. on application exit"""
+
+
+def create_storage_backend(url=None, **options):
+    """Storage backend for a URL, SQLite when url is None
+
+    sqlite:///path/to/file.db      DatabaseManager
+    sqlite-sharded:///directory    ShardedDatabaseManager
+    postgresql://user@host/db      PostgresDatabaseManager (needs asyncpg)
+    """
+    if url is None or url.startswith("sqlite:///"):
+        from src.database.database_system import DatabaseManager
+        if url is None:
+            return DatabaseManager(**options)
+        return DatabaseManager(url[len("sqlite:///"):], **options)
+    if url.startswith("sqlite-sharded:///"):
+        from src.database.sharding import ShardedDatabaseManager
+        return ShardedDatabaseManager(url[len("sqlite-sharded:///"):], **options)
+    if url.startswith(("postgresql://", "postgres://")):
+        from src.database.postgres_backend import PostgresDatabaseManager
+        return PostgresDatabaseManager(url, **options)
+    raise ValueError(f"Unsupported storage URL: {url}")
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+from urllib.request import pathname2url
+
+# Named sets of PRAGMAs applied every time a connection is opened.
+# 'default' keeps SQLite's stock behaviour (rollback journal, full sync).
+# 'wal' lets dashboard readers run while the child side is writing.
+STORAGE_PROFILES = {
+    'default': {
+        'busy_timeout': 5000,  # unit: milliseconds
+    },
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 64 * 1024 * 1024,  # unit: bytes
+        'cache_size': -16000,  # negative value means KiB, i.e. ~16 MB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+}
+
+# PRAGMAs that change the database file rather than the connection,
+# these cannot (and need not) be issued from a read-only connection
+WRITER_ONLY_PRAGMAS = ('journal_mode', 'synchronous')
+
+
+def resolve_storage_profile(profile):
+    """Turn a profile name or dict into a dict of PRAGMA settings
+
+    A dict may name a base profile with the 'base' key and override
+    individual settings, e.g. {'base': 'wal', 'cache_size': -64000}.
+    """
+    if profile is None:
+        profile = 'default'
+    if isinstance(profile, str):
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f"Unknown storage profile: {profile}")
+        return dict(STORAGE_PROFILES[profile])
+
+    settings = dict(profile)
+    base = settings.pop('base', None)
+    resolved = resolve_storage_profile(base) if base else {}
+    resolved.update(settings)
+    return resolved
+
+
+def apply_storage_profile(connection, settings, read_only=False):
+    """Apply resolved profile settings to an open connection"""
+    for name, value in settings.items():
+        if read_only and name in WRITER_ONLY_PRAGMAS:
+            continue
+        connection.execute(f"PRAGMA {name} = {value}")
+
+
+class ReadOnlyConnection(sqlite3.Connection):
+    """SQLite connection opened read-only, used for statistics readers
+
+    Under the WAL profile these connections read a consistent snapshot
+    without waiting for (or blocking) the writer connection.
+    """
+
+    def __init__(self, database_path, *args, **kwargs):
+        kwargs.pop('uri', None)
+        uri = f"file:{pathname2url(os.path.abspath(database_path))}?mode=ro"
+        super().__init__(uri, *args, uri=True, **kwargs)
+        self.execute("PRAGMA query_only = ON")
@@ -0,0 +1,651 @@
+import json
+import uuid
+import zlib
+import sqlite3
+
+from src.database.passwords import PasswordHasher
+from src.database.usage_rollup import ROLLUP_SESSION_SQL, rollup_covers
+
+# Offline-first delta sync
+#
+# Every device keeps its own database; DeltaSync merges usage, learning
+# progress and habits between two of them (two tablets, or a tablet and a
+# household hub) without copying whole files.
+#
+# Row versions: for each synced table, sync_counters holds a monotonic
+# change counter. Triggers bump it on every insert and on every update that
+# changes a synced column, and stamp the row's entry in sync_row_versions
+# with the new value, so "what changed since version n" is an index range
+# scan. Triggers see every writer (single, bulk, journal, migrations).
+#
+# Sync tokens: a token names the exporting device and the counter value per
+# table up to which the receiver has applied its deltas. The receiver keeps
+# the token of each peer in sync_peers and hands it back on the next pull.
+#
+# Deltas: rows are shipped under their natural keys, never local row IDs,
+# which differ per device: users by username, children, habits and
+# progress by the child's username plus their own key, content by
+# content_path. Usage records and habit completions have no natural key and
+# are identified by (origin device, row ID on that device), stored in the
+# origin/origin_id columns of received rows (NULL for rows created locally).
+# A batch is zlib-compressed JSON of at most batch_size rows, tables in
+# dependency order, with the token reached at its end.
+#
+# Applying is idempotent, replaying a batch changes nothing:
+#   - users, children and habits are created when missing; an existing user
+#     keeps its password, children and habits take the sender's profile;
+#   - usage records are inserted once; an open session is closed by a
+#     finished copy, a finished one is never reopened;
+#   - habit completions are inserted once;
+#   - learning progress keeps the highest completion_rate (the later
+#     last_learning_time on a tie).
+# Rows written while applying are tagged with the sending device in
+# sync_row_versions.source, so they are not echoed back to it, and are
+# reported on the database's change feed like the mutators' writes: every
+# changed row queues an event, published once the batch has committed.
+# Received sessions are folded into usage_daily_rollup and received
+# completions counted by the habit_stats trigger (backdated ones leave
+# streaks unchanged, see habit_stats.py). Archived rows are not synced and
+# archiving on one device does not delete rows on another.
+
+SYNC_FORMAT = 1
+
+# Synced tables in dependency order: primary key and the columns whose
+# changes are shipped
+SYNCED_TABLES = {
+    'users': {
+        'key': 'user_id',
+        'columns': ('username', 'password', 'user_type'),
+    },
+    'children_info': {
+        'key': 'child_id',
+        'columns': ('parent_id', 'name', 'age', 'gender', 'interests'),
+    },
+    'habit_formation': {
+        'key': 'habit_id',
+        'columns': ('habit_name', 'description', 'frequency', 'reminder_time'),
+    },
+    'habit_completion_records': {
+        'key': 'record_id',
+        'columns': ('completion_status', 'notes'),
+    },
+    'usage_records': {
+        'key': 'record_id',
+        'columns': ('end_time', 'duration', 'completion_status'),
+    },
+    'learning_progress': {
+        'key': 'progress_id',
+        'columns': ('completion_rate', 'last_learning_time'),
+    },
+}
+
+CREATE_SYNC_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS sync_state (
+        key TEXT PRIMARY KEY,  -- 'device_id', 'applying_peer'
+        value TEXT
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sync_counters (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sync_row_versions (
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        version INTEGER NOT NULL,
+        source TEXT,  -- device the change was received from, NULL for local writes
+        PRIMARY KEY (table_name, row_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_sync_row_versions_version ON sync_row_versions (table_name, version)",
+    """
+    CREATE TABLE IF NOT EXISTS sync_peers (
+        peer_id TEXT PRIMARY KEY,  -- device ID of the peer
+        token TEXT,  -- token of the last batch applied from the peer
+        last_sync_time TIMESTAMP
+    )
+    """,
+]
+
+# Columns identifying rows received from another device
+ORIGIN_TABLES = ('usage_records', 'habit_completion_records')
+
+_STAMP_VERSION_SQL = """
+        UPDATE sync_counters SET version = version + 1 WHERE table_name = '{table}';
+        INSERT INTO sync_row_versions (table_name, row_id, version, source)
+        VALUES ('{table}', new.{key}, (SELECT version FROM sync_counters WHERE table_name = '{table}'),
+                (SELECT value FROM sync_state WHERE key = 'applying_peer'))
+        ON CONFLICT (table_name, row_id) DO UPDATE SET version = excluded.version, source = excluded.source;
+"""
+
+
+def create_sync_tables(cursor):
+    """Sync bookkeeping tables, origin columns and version triggers; versions existing rows
+
+    Existing rows get versions in primary key order with one INSERT ... SELECT
+    per table (a device holds at most a few hundred thousand rows).
+    """
+    for statement in CREATE_SYNC_TABLES_SQL:
+        cursor.execute(statement)
+    cursor.execute("INSERT OR IGNORE INTO sync_state (key, value) VALUES ('device_id', ?)", (uuid.uuid4().hex,))
+
+    for table in ORIGIN_TABLES:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN origin TEXT")
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN origin_id INTEGER")
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_origin ON {table} (origin, origin_id)")
+
+    for table, settings in SYNCED_TABLES.items():
+        key = settings['key']
+        cursor.execute(f"""
+        INSERT INTO sync_row_versions (table_name, row_id, version)
+        SELECT '{table}', {key}, ROW_NUMBER() OVER (ORDER BY {key}) FROM {table}
+        """)
+        cursor.execute(f"INSERT INTO sync_counters (table_name, version) SELECT '{table}', COUNT(*) FROM {table}")
+
+        stamp = _STAMP_VERSION_SQL.format(table=table, key=key)
+        changed = ' OR '.join(f"old.{column} IS NOT new.{column}" for column in settings['columns'])
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS sync_{table}_after_insert AFTER INSERT ON {table} BEGIN{stamp}END
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS sync_{table}_after_update
+        AFTER UPDATE OF {', '.join(settings['columns'])} ON {table} WHEN {changed} BEGIN{stamp}END
+        """)
+
+
+# Changed rows of a table after :since up to :upto, skipping rows received
+# from :peer. Every query starts with the row version.
+_VERSION_FILTER = """
+WHERE v.table_name = '{table}' AND v.version > :since AND v.version <= :upto
+  AND (:peer IS NULL OR v.source IS NOT :peer)
+ORDER BY v.version LIMIT :limit
+"""
+
+EXPORT_SQL = {
+    'users': """
+        SELECT v.version, t.username, t.password, t.user_type, t.creation_time
+        FROM sync_row_versions v
+        JOIN users t ON t.user_id = v.row_id
+        """,
+    'children_info': """
+        SELECT v.version, c.username AS child, p.username AS parent, t.name, t.age, t.gender, t.interests
+        FROM sync_row_versions v
+        JOIN children_info t ON t.child_id = v.row_id
+        JOIN users c ON c.user_id = t.child_id
+        JOIN users p ON p.user_id = t.parent_id
+        """,
+    'habit_formation': """
+        SELECT v.version, c.username AS child, t.habit_name, t.description, t.frequency, t.reminder_time,
+               t.creation_time
+        FROM sync_row_versions v
+        JOIN habit_formation t ON t.habit_id = v.row_id
+        JOIN users c ON c.user_id = t.child_id
+        """,
+    'habit_completion_records': """
+        SELECT v.version, COALESCE(t.origin, :device) AS origin, COALESCE(t.origin_id, t.record_id) AS origin_id,
+               c.username AS child, h.habit_name, t.completion_time, t.completion_status, t.notes
+        FROM sync_row_versions v
+        JOIN habit_completion_records t ON t.record_id = v.row_id
+        JOIN habit_formation h ON h.habit_id = t.habit_id
+        JOIN users c ON c.user_id = h.child_id
+        """,
+    'usage_records': """
+        SELECT v.version, COALESCE(t.origin, :device) AS origin, COALESCE(t.origin_id, t.record_id) AS origin_id,
+               u.username, r.content_path, t.activity_type, t.start_time, t.end_time, t.duration,
+               t.completion_status
+        FROM sync_row_versions v
+        JOIN usage_records t ON t.record_id = v.row_id
+        JOIN users u ON u.user_id = t.user_id
+        LEFT JOIN content_resources r ON r.resource_id = t.resource_id
+        """,
+    'learning_progress': """
+        SELECT v.version, c.username AS child, t.subject, t.topic, t.level, t.completion_rate,
+               t.last_learning_time
+        FROM sync_row_versions v
+        JOIN learning_progress t ON t.progress_id = v.row_id
+        JOIN users c ON c.user_id = t.child_id
+        """,
+}
+
+
+def encode_token(device_id, versions):
+    return json.dumps({'device': device_id, 'versions': versions}, separators=(',', ':'), sort_keys=True)
+
+
+def decode_token(token, device_id):
+    """Per-table versions of a token issued by device_id; an empty or foreign token starts from scratch"""
+    if not token:
+        return {}
+    try:
+        data = json.loads(token)
+    except ValueError:
+        raise ValueError(f"Invalid sync token: {token!r}")
+    if data.get('device') != device_id:
+        return {}
+    return {table: int(version) for table, version in data.get('versions', {}).items()}
+
+
+def encode_batch(batch):
+    return zlib.compress(json.dumps(batch, separators=(',', ':')).encode('utf-8'), 9)
+
+
+def decode_batch(payload):
+    try:
+        batch = json.loads(zlib.decompress(payload).decode('utf-8'))
+    except (zlib.error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid sync batch: {e}")
+    if batch.get('format') != SYNC_FORMAT:
+        raise ValueError(f"Unsupported sync batch format: {batch.get('format')}")
+    return batch
+
+
+class DeltaSync:
+    """Export and apply row deltas of one device database
+
+        hub = DeltaSync(DatabaseManager("data/household.db"))
+        tablet = DeltaSync(DatabaseManager("data/children_companion.db"))
+        tablet.sync_with(hub)  # pull from the hub, then push to it
+
+    Over a transport, the exporting side calls export_batches(token,
+    peer_id) and sends the payloads; the receiving side calls apply_batch()
+    on each in order and keeps the returned token for the next request.
+
+    Exporting hashes any plain-text password left from before password
+    hashing (one scrypt derivation per such user), and every call does
+    database I/O: run syncs on a worker thread, never on the GUI thread.
+    """
+
+    def __init__(self, database, batch_size=500, password_hasher=None):
+        self.database = database  # DatabaseManager of the device database
+        self.batch_size = batch_size
+        self.password_hasher = password_hasher or PasswordHasher()
+        self._device_id = None
+
+    @property
+    def device_id(self):
+        """Random ID of this database, created by migration 11"""
+        if self._device_id is None:
+            if not self.database.connect_database(read_only=True):
+                return None
+            try:
+                self.database.cursor.execute("SELECT value FROM sync_state WHERE key = 'device_id'")
+                self._device_id = self.database.cursor.fetchone()[0]
+            finally:
+                self.database.close_connection()
+        return self._device_id
+
+    def export_batches(self, since_token=None, peer_id=None):
+        """Yield compressed batches of the rows changed after since_token
+
+        Rows received from peer_id are skipped. Ends with a batch carrying the
+        final token, which may hold no rows when only the token moved on.
+        """
+        device_id = self.device_id
+        since = decode_token(since_token, device_id)
+        upto = self._counters()
+        if upto is None:
+            return
+
+        versions = {table: since.get(table, 0) for table in SYNCED_TABLES}
+        tables, row_count = {}, 0
+        for table in SYNCED_TABLES:
+            while versions[table] < upto[table]:
+                limit = self.batch_size - row_count
+                columns, rows = self._export_rows(table, device_id, peer_id, versions[table], upto[table], limit)
+                if rows:
+                    entry = tables.setdefault(table, {'columns': columns[1:], 'rows': []})
+                    entry['rows'].extend(row[1:] for row in rows)
+                    row_count += len(rows)
+                # A short page means nothing else up to upto
+                versions[table] = rows[-1][0] if len(rows) == limit else upto[table]
+                if row_count >= self.batch_size:
+                    yield encode_batch(self._batch(device_id, versions, tables))
+                    tables, row_count = {}, 0
+
+        if tables or versions != {table: since.get(table, 0) for table in SYNCED_TABLES}:
+            yield encode_batch(self._batch(device_id, versions, tables))
+
+    @staticmethod
+    def _batch(device_id, versions, tables):
+        return {'format': SYNC_FORMAT, 'device': device_id, 'token': encode_token(device_id, dict(versions)),
+                'tables': tables}
+
+    def _counters(self):
+        if not self.database.connect_database(read_only=True):
+            return None
+        try:
+            self.database.cursor.execute("SELECT table_name, version FROM sync_counters")
+            counters = dict(self.database.cursor.fetchall())
+            return {table: counters.get(table, 0) for table in SYNCED_TABLES}
+        except sqlite3.Error as e:
+            print(f"Read sync counters error: {e}")
+            return None
+        finally:
+            self.database.close_connection()
+
+    def _export_rows(self, table, device_id, peer_id, since, upto, limit):
+        if not self.database.connect_database(read_only=True):
+            raise sqlite3.OperationalError("cannot connect to the database")
+        try:
+            cursor = self.database.cursor
+            cursor.execute(EXPORT_SQL[table] + _VERSION_FILTER.format(table=table),
+                           {'device': device_id, 'peer': peer_id, 'since': since, 'upto': upto, 'limit': limit})
+            rows = [list(row) for row in cursor.fetchall()]
+            columns = [description[0] for description in cursor.description]
+        finally:
+            self.database.close_connection()
+        if table == 'users':
+            # Rows from before password hashing never leave the device in plain text
+            password = columns.index('password')
+            for row in rows:
+                if not PasswordHasher.is_hashed(row[password]):
+                    row[password] = self.password_hasher.hash(row[password])
+        return columns, rows
+
+    def apply_batch(self, payload):
+        """Apply one batch in a single transaction
+
+        Returns {'device', 'token', 'applied': {table: rows changed}, 'skipped'}
+        or None when the batch could not be applied; skipped counts rows whose
+        user, child or habit is unknown here.
+        """
+        batch = decode_batch(payload)
+        sender = batch['device']
+        if sender == self.device_id:
+            raise ValueError("Sync batch comes from this database")
+        if not self.database.connect_database():
+            return None
+
+        cursor = self.database.cursor
+        applied, skipped = {}, 0
+        changes = []  # _record_change arguments, recorded once the batch is committed
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('applying_peer', ?)", (sender,))
+            lookups = _Lookups(cursor)
+            for table in SYNCED_TABLES:
+                entry = batch['tables'].get(table)
+                if not entry:
+                    continue
+                rows = [dict(zip(entry['columns'], row)) for row in entry['rows']]
+                changed, missing = getattr(self, f"_apply_{table}")(cursor, lookups, rows, changes)
+                applied[table] = changed
+                skipped += missing
+            cursor.execute("DELETE FROM sync_state WHERE key = 'applying_peer'")
+            cursor.execute(
+                """INSERT INTO sync_peers (peer_id, token, last_sync_time) VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (peer_id) DO UPDATE SET token = excluded.token, last_sync_time = excluded.last_sync_time""",
+                (sender, batch['token'])
+            )
+            self.database.connection.commit()
+            for change in changes:
+                self.database._record_change(*change)
+        except sqlite3.Error as e:
+            print(f"Apply sync batch error: {e}")
+            self.database.connection.rollback()
+            return None
+        finally:
+            self.database.close_connection()
+
+        if any(applied.values()) and self.database.cache is not None:
+            self.database.cache.clear()
+        return {'device': sender, 'token': batch['token'], 'applied': applied, 'skipped': skipped}
+
+    def _apply_users(self, cursor, lookups, rows, changes):
+        changed = 0
+        for row in rows:
+            cursor.execute(
+                """INSERT INTO users (username, password, user_type, creation_time) VALUES (?, ?, ?, ?)
+                ON CONFLICT (username) DO NOTHING""",
+                (row['username'], row['password'], row['user_type'], row['creation_time'])
+            )
+            if cursor.rowcount:
+                user_id = cursor.lastrowid
+                changes.append(('users', 'insert', user_id, ('username', 'password', 'user_type'),
+                                {'user_id': user_id, 'username': row['username'], 'user_type': row['user_type']}))
+            changed += cursor.rowcount
+        return changed, 0
+
+    def _apply_children_info(self, cursor, lookups, rows, changes):
+        changed = missing = 0
+        for row in rows:
+            child_id, parent_id = lookups.user(row['child']), lookups.user(row['parent'])
+            if child_id is None or parent_id is None:
+                missing += 1
+                continue
+            cursor.execute(
+                """INSERT INTO children_info (child_id, parent_id, name, age, gender, interests)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (child_id) DO UPDATE SET
+                parent_id = excluded.parent_id, name = excluded.name, age = excluded.age,
+                gender = excluded.gender, interests = excluded.interests
+                WHERE parent_id IS NOT excluded.parent_id OR name IS NOT excluded.name OR age IS NOT excluded.age
+                   OR gender IS NOT excluded.gender OR interests IS NOT excluded.interests""",
+                (child_id, parent_id, row['name'], row['age'], row['gender'], row['interests'])
+            )
+            if cursor.rowcount:
+                changes.append(('children_info', 'upsert', child_id,
+                                ('parent_id', 'name', 'age', 'gender', 'interests'),
+                                {'child_id': child_id, 'parent_id': parent_id, 'name': row['name'], 'age': row['age'],
+                                 'gender': row['gender'], 'interests': row['interests']}))
+            changed += cursor.rowcount
+        return changed, missing
+
+    def _apply_habit_formation(self, cursor, lookups, rows, changes):
+        changed = missing = 0
+        for row in rows:
+            child_id = lookups.child(row['child'])
+            if child_id is None:
+                missing += 1
+                continue
+            habit_id = lookups.habit(row['child'], row['habit_name'])
+            if habit_id is None:
+                cursor.execute(
+                    """INSERT INTO habit_formation (child_id, habit_name, description, frequency, reminder_time, creation_time)
+                    VALUES (?, ?, ?, ?, ?, ?)""",
+                    (child_id, row['habit_name'], row['description'], row['frequency'], row['reminder_time'],
+                     row['creation_time'])
+                )
+                habit_id = lookups.habits[(row['child'], row['habit_name'])] = cursor.lastrowid
+                op, columns = 'insert', ('child_id', 'habit_name', 'description', 'frequency', 'reminder_time')
+            else:
+                cursor.execute(
+                    """UPDATE habit_formation SET description = ?, frequency = ?, reminder_time = ?
+                    WHERE habit_id = ? AND (description IS NOT ? OR frequency IS NOT ? OR reminder_time IS NOT ?)""",
+                    (row['description'], row['frequency'], row['reminder_time'], habit_id,
+                     row['description'], row['frequency'], row['reminder_time'])
+                )
+                op, columns = 'update', ('description', 'frequency', 'reminder_time')
+            if cursor.rowcount:
+                changes.append(('habit_formation', op, habit_id, columns,
+                                {'habit_id': habit_id, 'child_id': child_id, 'habit_name': row['habit_name'],
+                                 'description': row['description'], 'frequency': row['frequency'],
+                                 'reminder_time': row['reminder_time']}))
+            changed += cursor.rowcount
+        return changed, missing
+
+    def _apply_habit_completion_records(self, cursor, lookups, rows, changes):
+        changed = missing = 0
+        for row in rows:
+            if row['origin'] == self.device_id:
+                continue  # our own completion coming back through a third device
+            habit_id = lookups.habit(row['child'], row['habit_name'])
+            if habit_id is None:
+                missing += 1
+                continue
+            cursor.execute(
+                """INSERT INTO habit_completion_records (habit_id, completion_time, completion_status, notes, origin, origin_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (origin, origin_id) DO NOTHING""",
+                (habit_id, row['completion_time'], row['completion_status'], row['notes'],
+                 row['origin'], row['origin_id'])
+            )
+            if cursor.rowcount:
+                record_id = cursor.lastrowid
+                changes.append(('habit_completion_records', 'insert', record_id,
+                                ('habit_id', 'completion_time', 'completion_status', 'notes'),
+                                {'record_id': record_id, 'habit_id': habit_id, 'completion_time': row['completion_time'],
+                                 'completion_status': row['completion_status'], 'notes': row['notes']}))
+            changed += cursor.rowcount
+        return changed, missing
+
+    def _apply_usage_records(self, cursor, lookups, rows, changes):
+        changed = missing = 0
+        for row in rows:
+            user_id = lookups.user(row['username'])
+            if user_id is None:
+                missing += 1
+                continue
+            if row['origin'] == self.device_id:
+                cursor.execute("SELECT record_id, duration FROM usage_records WHERE record_id = ? AND origin IS NULL",
+                               (row['origin_id'],))
+            else:
+                cursor.execute("SELECT record_id, duration FROM usage_records WHERE origin = ? AND origin_id = ?",
+                               (row['origin'], row['origin_id']))
+            existing = cursor.fetchone()
+            resource_id = lookups.resource(row['content_path'])
+
+            if existing is None:
+                if row['origin'] == self.device_id:
+                    continue  # archived here meanwhile
+                cursor.execute(
+                    """INSERT INTO usage_records (user_id, resource_id, activity_type, start_time, end_time, duration,
+                    completion_status, origin, origin_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (user_id, resource_id, row['activity_type'], row['start_time'], row['end_time'], row['duration'],
+                     row['completion_status'], row['origin'], row['origin_id'])
+                )
+                record_id = cursor.lastrowid
+                op, columns = 'insert', ('user_id', 'resource_id', 'activity_type', 'start_time', 'end_time',
+                                         'duration', 'completion_status')
+            elif existing[1] is None and row['duration'] is not None:
+                record_id = existing[0]
+                cursor.execute(
+                    "UPDATE usage_records SET end_time = ?, duration = ?, completion_status = ? WHERE record_id = ?",
+                    (row['end_time'], row['duration'], row['completion_status'], record_id)
+                )
+                op, columns = 'update', ('end_time', 'duration', 'completion_status')
+            else:
+                continue
+            changed += 1
+            changes.append(('usage_records', op, record_id, columns,
+                            {'record_id': record_id, 'user_id': user_id, 'resource_id': resource_id,
+                             'activity_type': row['activity_type'], 'start_time': row['start_time'],
+                             'end_time': row['end_time'], 'duration': row['duration'], 'previous_duration': None,
+                             'completion_status': row['completion_status']}))
+            # The session is finished here for the first time, count it once
+            if row['duration'] is not None and rollup_covers(cursor, record_id):
+                cursor.execute(ROLLUP_SESSION_SQL, (user_id, row['start_time'], row['activity_type'], resource_id,
+                                                    row['duration'], 1))
+        return changed, missing
+
+    def _apply_learning_progress(self, cursor, lookups, rows, changes):
+        changed = missing = 0
+        for row in rows:
+            child_id = lookups.child(row['child'])
+            if child_id is None:
+                missing += 1
+                continue
+            cursor.execute(
+                """INSERT INTO learning_progress (child_id, subject, topic, level, completion_rate, last_learning_time)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (child_id, subject, topic, level) DO UPDATE SET
+                completion_rate = excluded.completion_rate, last_learning_time = excluded.last_learning_time
+                WHERE excluded.completion_rate > completion_rate
+                   OR (excluded.completion_rate = completion_rate AND excluded.last_learning_time > last_learning_time)
+                RETURNING progress_id""",
+                (child_id, row['subject'], row['topic'], row['level'], row['completion_rate'],
+                 row['last_learning_time'])
+            )
+            result = cursor.fetchone()
+            if result is None:
+                continue  # the stored rate is higher
+            changed += 1
+            changes.append(('learning_progress', 'upsert', result[0], ('completion_rate', 'last_learning_time'),
+                            {'progress_id': result[0], 'child_id': child_id, 'subject': row['subject'],
+                             'topic': row['topic'], 'level': row['level'], 'completion_rate': row['completion_rate'],
+                             'last_learning_time': row['last_learning_time']}))
+        return changed, missing
+
+    def peer_token(self, peer_id):
+        """Token of the last batch applied from peer_id, None before the first sync"""
+        if not self.database.connect_database(read_only=True):
+            return None
+        try:
+            self.database.cursor.execute("SELECT token FROM sync_peers WHERE peer_id = ?", (peer_id,))
+            result = self.database.cursor.fetchone()
+            return result[0] if result else None
+        finally:
+            self.database.close_connection()
+
+    def pull(self, peer):
+        """Apply everything peer (a DeltaSync) changed since the last pull, returns {table: rows changed} or None"""
+        totals = {}
+        for payload in peer.export_batches(self.peer_token(peer.device_id), peer_id=self.device_id):
+            result = self.apply_batch(payload)
+            if result is None:
+                return None
+            for table, count in result['applied'].items():
+                totals[table] = totals.get(table, 0) + count
+        return totals
+
+    def sync_with(self, peer):
+        """Two-way sync: pull from peer, then let peer pull from here; returns (pulled, pushed)"""
+        pulled = self.pull(peer)
+        pushed = peer.pull(self) if pulled is not None else None
+        return pulled, pushed
+
+
+class _Lookups:
+    """Per-batch cache of local IDs for natural keys"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.users = {}
+        self.children = {}
+        self.habits = {}
+        self.resources = {}
+
+    def user(self, username):
+        if username not in self.users:
+            self.cursor.execute("SELECT user_id FROM users WHERE username = ?", (username,))
+            result = self.cursor.fetchone()
+            self.users[username] = result[0] if result else None
+        return self.users[username]
+
+    def child(self, username):
+        """child_id of a user with a children_info row"""
+        if self.children.get(username) is None:
+            self.cursor.execute(
+                "SELECT c.child_id FROM children_info c JOIN users u ON u.user_id = c.child_id WHERE u.username = ?",
+                (username,)
+            )
+            result = self.cursor.fetchone()
+            self.children[username] = result[0] if result else None
+        return self.children[username]
+
+    def habit(self, child, habit_name):
+        key = (child, habit_name)
+        if self.habits.get(key) is None:
+            self.cursor.execute(
+                """SELECT h.habit_id FROM habit_formation h JOIN users u ON u.user_id = h.child_id
+                WHERE u.username = ? AND h.habit_name = ? ORDER BY h.habit_id LIMIT 1""",
+                key
+            )
+            result = self.cursor.fetchone()
+            self.habits[key] = result[0] if result else None
+        return self.habits[key]
+
+    def resource(self, content_path):
+        if content_path is None:
+            return None
+        if content_path not in self.resources:
+            self.cursor.execute("SELECT resource_id FROM content_resources WHERE content_path = ? ORDER BY resource_id LIMIT 1",
+                                (content_path,))
+            result = self.cursor.fetchone()
+            self.resources[content_path] = result[0] if result else None
+        return self.resources[content_path]
+
@@ -0,0 +1,254 @@
+import json
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+from src.database.content_search import register_content_functions
+from src.database.content_tags import split_tags
+from src.database.passwords import PasswordHasher
+from src.database.usage_rollup import ROLLUP_RECORD_RANGE_SQL
+
+# Seeded synthetic data
+#
+# SyntheticDataGenerator fills an initialized database with realistic-looking
+# families and months of activity, reproducibly: the same seed and sizes give
+# the same rows. It writes straight through sqlite3 executemany (the per-call
+# DatabaseManager methods would take hours for large scales) and keeps the
+# derived tables consistent the way the API does: content_tags are filled
+# alongside the content, the triggers maintain content_search,
+# content_bigrams and habit_stats, and usage records are folded into
+# usage_daily_rollup.
+#
+# All accounts share one password ("password"), hashed once with the
+# default scrypt cost so authenticate_user does the real work.
+
+PASSWORD = "password"
+ACTIVITY_TYPES = ['browse', 'play', 'learn', 'game']
+CONTENT_TYPES = {
+    'story': ['fairy tale', 'fable', 'bedtime'],
+    'song': ['nursery rhyme', 'lullaby'],
+    'game': ['puzzle', 'memory', 'matching'],
+    'learning': ['literacy', 'arithmetic', 'english'],
+}
+TITLE_WORDS = ['Little', 'Forest', 'Rabbit', 'Moon', 'Dinosaur', 'Rainbow', 'Ocean', 'Star', 'Panda', 'Garden',
+               '小兔子', '月亮', '恐龙', '彩虹', '森林', '熊猫']
+TAGS = ['classic', 'animals', 'forest', 'rainforest', 'bedtime', 'counting', 'colors', 'music', 'friendship',
+        'science', '经典', '动物', '睡前']
+AGE_RANGES = ['2-4 years', '4-6 years', '5-7 years', '6-9 years']
+SUBJECTS = ['literacy', 'arithmetic', 'english']
+HABITS = ['brush teeth', 'reading', 'tidy up toys', 'drink water', 'go to bed on time']
+COMPLETION_STATUSES = ['completed', 'partially completed', 'not completed']
+INTERESTS = ['drawing', 'dinosaurs', 'music', 'stories', 'puzzles', 'animals']
+
+
+class SyntheticDataGenerator:
+    """Generate N parents with M children each, a content catalog and months of events
+
+    Activity per child and day: usage sessions (more on weekends), one
+    completion record per habit (children keep streaks going with
+    habit_discipline probability) and learning progress updates that
+    raise completion rates over time.
+    """
+
+    def __init__(self, parents=100, children_per_parent=2, content_count=500, months=3, sessions_per_day=3,
+                 habits_per_child=3, topics_per_subject=10, progress_updates_per_month=8, habit_discipline=0.8,
+                 seed=42):
+        self.parents = parents
+        self.children_per_parent = children_per_parent
+        self.content_count = content_count
+        self.months = months
+        self.sessions_per_day = sessions_per_day  # average, weekends get half as many more
+        self.habits_per_child = min(habits_per_child, len(HABITS))
+        self.topics_per_subject = topics_per_subject
+        self.progress_updates_per_month = progress_updates_per_month
+        self.habit_discipline = habit_discipline
+        self.seed = seed
+
+    def sizes(self):
+        return {
+            'parents': self.parents,
+            'children_per_parent': self.children_per_parent,
+            'content_count': self.content_count,
+            'months': self.months,
+            'sessions_per_day': self.sessions_per_day,
+            'habits_per_child': self.habits_per_child,
+            'seed': self.seed,
+        }
+
+    def populate(self, database_path, end_time=None):
+        """Write the data set into an initialized database
+
+        Returns {'families': [(parent_id, child_id), ...], 'resource_ids': [...],
+        'habit_ids': {child_id: [...]}, 'usernames': {user_id: username},
+        'rows': {table: row count}}.
+        """
+        rng = random.Random(self.seed)
+        end_time = (end_time or datetime.now()).replace(microsecond=0)
+        start_day = (end_time - timedelta(days=self.months * 30)).replace(hour=0, minute=0, second=0)
+        days = (end_time - start_day).days
+        password_hash = PasswordHasher().hash(PASSWORD)
+
+        connection = sqlite3.connect(database_path)
+        register_content_functions(connection)  # content_bigrams triggers
+        connection.execute("PRAGMA synchronous = OFF")
+        cursor = connection.cursor()
+        try:
+            families, usernames = self._add_families(cursor, rng, password_hash)
+            resource_ids = self._add_content(cursor, rng, start_day)
+            habit_ids = {}
+            for parent_id, child_id in families:
+                self._add_usage(cursor, rng, child_id, resource_ids, start_day, days)
+                habit_ids[child_id] = self._add_habits(cursor, rng, child_id, start_day, days)
+                self._add_learning_progress(cursor, rng, child_id, start_day, days)
+                self._add_parental_control(cursor, rng, parent_id, child_id)
+
+            # Seeding bypasses DatabaseManager, so fold the records into the daily rollup here
+            max_record_id = cursor.execute("SELECT MAX(record_id) FROM usage_records").fetchone()[0] or 0
+            cursor.execute(ROLLUP_RECORD_RANGE_SQL, {'start_key': 0, 'end_key': max_record_id})
+            connection.commit()
+
+            rows = {}
+            for table in ['users', 'children_info', 'content_resources', 'content_tags', 'usage_records',
+                          'learning_progress', 'habit_formation', 'habit_completion_records',
+                          'parental_control_settings']:
+                rows[table] = cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            connection.close()
+
+        return {
+            'families': families,
+            'resource_ids': resource_ids,
+            'habit_ids': habit_ids,
+            'usernames': usernames,
+            'rows': rows,
+        }
+
+    def _add_families(self, cursor, rng, password_hash):
+        families = []
+        usernames = {}
+        children_info = []
+        for parent_index in range(self.parents):
+            username = f"synthetic_parent_{self.seed}_{parent_index}"
+            cursor.execute("INSERT INTO users (username, password, user_type) VALUES (?, ?, 'parent')",
+                           (username, password_hash))
+            parent_id = cursor.lastrowid
+            usernames[parent_id] = username
+            for child_index in range(self.children_per_parent):
+                username = f"synthetic_child_{self.seed}_{parent_index}_{child_index}"
+                cursor.execute("INSERT INTO users (username, password, user_type) VALUES (?, ?, 'child')",
+                               (username, password_hash))
+                child_id = cursor.lastrowid
+                usernames[child_id] = username
+                families.append((parent_id, child_id))
+                children_info.append((child_id, parent_id, f"Child {child_id}", rng.randint(3, 9),
+                                      rng.choice(['male', 'female']),
+                                      ','.join(rng.sample(INTERESTS, rng.randint(1, 3)))))
+        cursor.executemany(
+            "INSERT INTO children_info (child_id, parent_id, name, age, gender, interests) VALUES (?, ?, ?, ?, ?, ?)",
+            children_info
+        )
+        return families, usernames
+
+    def _add_content(self, cursor, rng, start_day):
+        resource_ids = []
+        tag_rows = []
+        for index in range(self.content_count):
+            type = rng.choice(list(CONTENT_TYPES))
+            title = ' '.join(rng.sample(TITLE_WORDS, rng.randint(2, 3))) + f" {index}"
+            tags = ','.join(rng.sample(TAGS, rng.randint(1, 4)))
+            created = start_day - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86399))  # catalog predates the activity
+            description = f"A {type} about {title.lower()}"
+            cursor.execute(
+                """INSERT INTO content_resources (title, type, subtype, description, content_path, thumbnail_path,
+                age_range, tags, creation_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (title, type, rng.choice(CONTENT_TYPES[type]), description,
+                 f"content/{type}/{index}.json", f"images/{type}/{index}.jpg", rng.choice(AGE_RANGES), tags,
+                 created.strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            resource_id = cursor.lastrowid
+            resource_ids.append(resource_id)
+            tag_rows.extend((tag, resource_id) for tag in split_tags(tags))
+        cursor.executemany("INSERT OR IGNORE INTO content_tags (tag, resource_id) VALUES (?, ?)", tag_rows)
+        return resource_ids
+
+    def _add_usage(self, cursor, rng, child_id, resource_ids, start_day, days):
+        rows = []
+        for day in range(days):
+            date = start_day + timedelta(days=day)
+            sessions = rng.randint(0, 2 * self.sessions_per_day)
+            if date.weekday() >= 5:
+                sessions += self.sessions_per_day // 2
+            for session in sorted(rng.randint(7 * 3600, 21 * 3600) for session in range(sessions)):
+                start = date + timedelta(seconds=session)
+                duration = rng.randint(60, 1800)
+                rows.append((
+                    child_id, rng.choice(resource_ids) if resource_ids else None, rng.choice(ACTIVITY_TYPES),
+                    start.strftime('%Y-%m-%d %H:%M:%S'),
+                    (start + timedelta(seconds=duration)).strftime('%Y-%m-%d %H:%M:%S'),
+                    duration, rng.choice(['completed', 'completed', 'interrupted', 'abandoned'])
+                ))
+        cursor.executemany(
+            """INSERT INTO usage_records (user_id, resource_id, activity_type, start_time, end_time, duration,
+            completion_status) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+
+    def _add_habits(self, cursor, rng, child_id, start_day, days):
+        habit_ids = []
+        for habit_name in rng.sample(HABITS, self.habits_per_child):
+            cursor.execute(
+                """INSERT INTO habit_formation (child_id, habit_name, description, frequency, reminder_time,
+                creation_time) VALUES (?, ?, ?, 'daily', ?, ?)""",
+                (child_id, habit_name, f"{habit_name} every day", f"{rng.randint(7, 20):02d}:00",
+                 start_day.strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            habit_id = cursor.lastrowid
+            habit_ids.append(habit_id)
+
+            # In time order, so the habit_stats trigger counts the streaks right
+            rows = []
+            completed = True
+            for day in range(days):
+                if rng.random() > (self.habit_discipline if completed else 0.5):
+                    completed = not completed
+                status = 'completed' if completed else rng.choice(COMPLETION_STATUSES[1:])
+                completion_time = start_day + timedelta(days=day, seconds=rng.randint(7 * 3600, 21 * 3600))
+                rows.append((habit_id, completion_time.strftime('%Y-%m-%d %H:%M:%S'), status))
+            cursor.executemany(
+                "INSERT INTO habit_completion_records (habit_id, completion_time, completion_status) VALUES (?, ?, ?)",
+                rows
+            )
+        return habit_ids
+
+    def _add_learning_progress(self, cursor, rng, child_id, start_day, days):
+        topics = [(subject, f"topic {topic}", topic % 5 + 1)
+                  for subject in SUBJECTS for topic in range(self.topics_per_subject)]
+        updates = []
+        rates = {}
+        for update in range(self.progress_updates_per_month * self.months):
+            subject, topic, level = rng.choice(topics)
+            rate = min(rates.get((subject, topic, level), 0) + rng.randint(5, 40), 100)
+            rates[(subject, topic, level)] = rate
+            learning_time = start_day + timedelta(days=days * update // (self.progress_updates_per_month * self.months),
+                                                  seconds=rng.randint(7 * 3600, 21 * 3600))
+            updates.append((child_id, subject, topic, level, rate, learning_time.strftime('%Y-%m-%d %H:%M:%S')))
+        # Same upsert as upsert_learning_progress_bulk: the rate only goes up
+        cursor.executemany(
+            """INSERT INTO learning_progress (child_id, subject, topic, level, completion_rate, last_learning_time)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (child_id, subject, topic, level) DO UPDATE SET
+            last_learning_time = CASE WHEN excluded.completion_rate > completion_rate
+                THEN excluded.last_learning_time ELSE last_learning_time END,
+            completion_rate = MAX(completion_rate, excluded.completion_rate)""",
+            updates
+        )
+
+    def _add_parental_control(self, cursor, rng, parent_id, child_id):
+        cursor.execute(
+            """INSERT INTO parental_control_settings (parent_id, child_id, daily_time_limit, disabled_periods,
+            content_filter_level, allowed_content_types) VALUES (?, ?, ?, ?, ?, ?)""",
+            (parent_id, child_id, rng.choice([60, 90, 120, 180]),
+             json.dumps([{"start": "21:30", "end": "07:00"}, {"start": "12:00", "end": "13:30"}][:rng.randint(1, 2)]),
+             rng.choice(['low', 'medium', 'high']),
+             json.dumps(rng.sample(list(CONTENT_TYPES), rng.randint(2, 4))))
+        )
@@ -0,0 +1,364 @@
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+# Usage quota engine
+#
+# Enforces parental_control_settings.daily_time_limit (minutes per day) and
+# disabled_periods (JSON list of {"start": "HH:MM", "end": "HH:MM"}, local
+# time, an end before the start runs past midnight) without touching the
+# database on every check.
+#
+# Per child the engine keeps, in memory:
+#   - the limit in seconds and the disabled periods compiled into a table of
+#     1440 minutes (blocked, minutes until the next blocked minute);
+#   - today's used seconds of finished sessions, plus the start of the
+#     running period while at least one session is open.
+# It is seeded once per child (settings, today's finished usage records and
+# the last checkpoint), then updated incrementally by session_started /
+# session_ended, so status() is a few additions and one table lookup: cheap
+# enough for a once-a-second UI timer.
+#
+# Time of sessions that are still open exists only in memory until the
+# usage record is written at the session end; checkpoint() (every
+# checkpoint_interval seconds on a background thread) saves each child's
+# used seconds to usage_quota_checkpoints, so a crash or restart does not
+# hand out the same minutes again.
+#
+# Days and periods follow local wall-clock time; usage records are stored
+# in UTC and converted when seeding.
+
+CREATE_QUOTA_CHECKPOINTS_SQL = """
+CREATE TABLE IF NOT EXISTS usage_quota_checkpoints (
+    child_id INTEGER PRIMARY KEY,
+    day TEXT NOT NULL,  -- local date the used seconds belong to
+    used_seconds INTEGER NOT NULL DEFAULT 0,
+    checkpoint_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (child_id) REFERENCES children_info(child_id) ON DELETE CASCADE
+)
+"""
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_disabled_periods(disabled_periods):
+    """Disabled periods (JSON string or list) as (start minute, end minute) pairs; invalid entries are skipped"""
+    if not disabled_periods:
+        return []
+    if isinstance(disabled_periods, str):
+        try:
+            disabled_periods = json.loads(disabled_periods)
+        except ValueError:
+            print(f"Invalid disabled periods: {disabled_periods}")
+            return []
+    periods = []
+    for period in disabled_periods:
+        try:
+            start_hour, start_minute = (int(part) for part in period['start'].split(':'))
+            end_hour, end_minute = (int(part) for part in period['end'].split(':'))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            print(f"Invalid disabled period: {period}")
+            continue
+        periods.append(((start_hour * 60 + start_minute) % MINUTES_PER_DAY,
+                        (end_hour * 60 + end_minute) % MINUTES_PER_DAY))
+    return periods
+
+
+def compile_minute_table(periods):
+    """Per minute of the day: (blocked, minutes until the next blocked minute or None)"""
+    blocked = [False] * MINUTES_PER_DAY
+    for start, end in periods:
+        minute = start
+        while minute != end:
+            blocked[minute] = True
+            minute = (minute + 1) % MINUTES_PER_DAY
+        if start == end:
+            blocked = [True] * MINUTES_PER_DAY  # a zero-length period disables the whole day
+    if not any(blocked):
+        return [(False, None)] * MINUTES_PER_DAY
+
+    # Walk backwards twice around the clock so periods after midnight count for the evening
+    table = [None] * MINUTES_PER_DAY
+    distance = None
+    for step in range(2 * MINUTES_PER_DAY - 1, -1, -1):
+        minute = step % MINUTES_PER_DAY
+        if blocked[minute]:
+            distance = 0
+        elif distance is not None:
+            distance += 1
+        if step < MINUTES_PER_DAY:
+            table[minute] = (blocked[minute], distance)
+    return table
+
+
+class _ChildQuota:
+    __slots__ = ('child_id', 'limit_seconds', 'minute_table', 'day', 'used_seconds', 'open_sessions',
+                 'running_since', 'dirty')
+
+    def __init__(self, child_id):
+        self.child_id = child_id
+        self.limit_seconds = None  # None: no daily limit
+        self.minute_table = compile_minute_table([])
+        self.day = None
+        self.used_seconds = 0  # finished time of self.day
+        self.open_sessions = set()
+        self.running_since = None  # wall-clock time the open sessions started counting
+        self.dirty = False
+
+
+class UsageQuotaEngine:
+    """In-memory daily time limits and disabled periods per child
+
+    session_started / session_ended are called by the event journal (or by
+    whoever opens and closes usage sessions), reload_settings after the
+    parental control settings change, and status / may_continue /
+    seconds_left by the UI as often as it likes.
+    """
+
+    def __init__(self, database, checkpoint_interval=60.0, clock=time.time):
+        self.database = database
+        self.checkpoint_interval = checkpoint_interval  # unit: seconds
+        self.clock = clock  # seconds since the epoch, replaceable for simulations
+        self._children = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+
+    # Seeding
+
+    def load(self, child_id):
+        """Seed (or re-seed) one child from the database"""
+        now = self.clock()
+        day = self._local_day(now)
+        settings, used_seconds, checkpoint = self._read_child(child_id, day)
+        with self._lock:
+            quota = self._children.get(child_id) or _ChildQuota(child_id)
+            self._apply_settings(quota, settings)
+            if quota.day != day:
+                quota.day = day
+                quota.used_seconds = max(used_seconds, checkpoint)
+            self._children[child_id] = quota
+        return quota
+
+    def reload_settings(self, child_id):
+        """Pick up changed parental control settings of one child (used time is kept)"""
+        settings = self._read_child(child_id, None)[0]
+        with self._lock:
+            quota = self._children.get(child_id)
+            if quota is None:
+                return
+            self._apply_settings(quota, settings)
+
+    def _read_child(self, child_id, day):
+        """(settings rows, today's finished seconds, checkpointed seconds) of one child"""
+        settings, used_seconds, checkpoint = [], 0, 0
+        if not self.database.connect_database(read_only=True):
+            return settings, used_seconds, checkpoint
+        cursor = self.database.cursor
+        try:
+            cursor.execute("SELECT daily_time_limit, disabled_periods FROM parental_control_settings WHERE child_id = ?",
+                           (child_id,))
+            settings = cursor.fetchall()
+            if day is not None:
+                start, end = self._utc_day_bounds(day)
+                cursor.execute(
+                    """SELECT COALESCE(SUM(duration), 0) FROM usage_records
+                    WHERE user_id = ? AND start_time >= ? AND start_time < ? AND duration IS NOT NULL""",
+                    (child_id, start, end)
+                )
+                used_seconds = cursor.fetchone()[0]
+                cursor.execute("SELECT used_seconds FROM usage_quota_checkpoints WHERE child_id = ? AND day = ?",
+                               (child_id, day))
+                row = cursor.fetchone()
+                checkpoint = row[0] if row else 0
+        except sqlite3.Error as e:
+            print(f"Load usage quota error: {e}")
+        finally:
+            self.database.close_connection()
+        return settings, used_seconds, checkpoint
+
+    @staticmethod
+    def _apply_settings(quota, settings):
+        # Several parents may set limits for the same child: the strictest wins
+        limits = [limit for limit, periods in settings if limit is not None]
+        quota.limit_seconds = min(limits) * 60 if limits else None
+        periods = []
+        for limit, disabled_periods in settings:
+            periods.extend(parse_disabled_periods(disabled_periods))
+        quota.minute_table = compile_minute_table(periods)
+
+    # Incremental updates
+
+    def _ensure_loaded(self, child_id):
+        if child_id not in self._children:
+            self.load(child_id)
+
+    def _roll_day(self, quota, now):
+        """Start a new day: finished time resets, open sessions count from midnight"""
+        day = self._local_day(now)
+        if quota.day == day:
+            return
+        quota.day = day
+        quota.used_seconds = 0
+        if quota.running_since is not None:
+            quota.running_since = max(quota.running_since, self._local_midnight(now))
+        quota.dirty = True
+
+    def session_started(self, child_id, session_key):
+        """A usage session began; concurrent sessions of one child count once"""
+        self._ensure_loaded(child_id)
+        now = self.clock()
+        with self._lock:
+            quota = self._children[child_id]
+            self._roll_day(quota, now)
+            if not quota.open_sessions:
+                quota.running_since = now
+            quota.open_sessions.add(session_key)
+
+    def session_ended(self, child_id, session_key):
+        """A usage session ended; its time moves into the day's used seconds"""
+        now = self.clock()
+        with self._lock:
+            quota = self._children.get(child_id)
+            if quota is None or session_key not in quota.open_sessions:
+                return
+            self._roll_day(quota, now)
+            quota.open_sessions.discard(session_key)
+            if not quota.open_sessions:
+                quota.used_seconds += int(now - quota.running_since)
+                quota.running_since = None
+                quota.dirty = True
+
+    def add_used_seconds(self, child_id, seconds):
+        """Count time spent outside tracked sessions (e.g. records written directly)"""
+        self._ensure_loaded(child_id)
+        now = self.clock()
+        with self._lock:
+            quota = self._children[child_id]
+            self._roll_day(quota, now)
+            quota.used_seconds += int(seconds)
+            quota.dirty = True
+
+    # Checks
+
+    def status(self, child_id):
+        """{'allowed', 'seconds_left', 'used_seconds', 'limit_seconds', 'blocked'} of one child
+
+        seconds_left is the time until either the daily limit is used up or
+        the next disabled period begins, None when neither applies.
+        """
+        self._ensure_loaded(child_id)
+        now = self.clock()
+        with self._lock:
+            quota = self._children[child_id]
+            self._roll_day(quota, now)
+            used_seconds = quota.used_seconds
+            if quota.running_since is not None:
+                used_seconds += int(now - quota.running_since)
+            local = datetime.fromtimestamp(now)
+            minute = local.hour * 60 + local.minute
+            blocked, minutes_to_block = quota.minute_table[minute]
+            limit_seconds = quota.limit_seconds
+
+        seconds_left = None
+        if limit_seconds is not None:
+            seconds_left = max(limit_seconds - used_seconds, 0)
+        if blocked:
+            seconds_left = 0
+        elif minutes_to_block is not None:
+            until_block = minutes_to_block * 60 - local.second
+            seconds_left = until_block if seconds_left is None else min(seconds_left, until_block)
+        return {
+            'allowed': seconds_left is None or seconds_left > 0,
+            'seconds_left': seconds_left,
+            'used_seconds': used_seconds,
+            'limit_seconds': limit_seconds,
+            'blocked': blocked,
+        }
+
+    def may_continue(self, child_id):
+        return self.status(child_id)['allowed']
+
+    def seconds_left(self, child_id):
+        return self.status(child_id)['seconds_left']
+
+    # Checkpoints
+
+    def checkpoint(self):
+        """Save the used seconds of every changed or running child, returns the number saved"""
+        now = self.clock()
+        with self._lock:
+            rows = []
+            for quota in self._children.values():
+                self._roll_day(quota, now)
+                if not quota.dirty and quota.running_since is None:
+                    continue
+                used_seconds = quota.used_seconds
+                if quota.running_since is not None:
+                    used_seconds += int(now - quota.running_since)
+                rows.append((quota.child_id, quota.day, used_seconds))
+                quota.dirty = False
+        if not rows:
+            return 0
+        if not self.database.connect_database():
+            return 0
+        try:
+            self.database.cursor.executemany(
+                """INSERT INTO usage_quota_checkpoints (child_id, day, used_seconds) VALUES (?, ?, ?)
+                ON CONFLICT (child_id) DO UPDATE SET
+                used_seconds = CASE WHEN excluded.day = day THEN MAX(used_seconds, excluded.used_seconds)
+                    ELSE excluded.used_seconds END,
+                day = excluded.day, checkpoint_time = CURRENT_TIMESTAMP""",
+                rows
+            )
+            self.database.connection.commit()
+            return len(rows)
+        except sqlite3.Error as e:
+            print(f"Usage quota checkpoint error: {e}")
+            self.database.connection.rollback()
+            with self._lock:
+                for child_id, day, used_seconds in rows:
+                    if child_id in self._children:
+                        self._children[child_id].dirty = True
+            return 0
+        finally:
+            self.database.close_connection()
+
+    def start(self):
+        """Checkpoint every checkpoint_interval seconds on a background thread"""
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="UsageQuotaEngine", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the checkpoint thread and write a final checkpoint"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.checkpoint()
+
+    def _run(self):
+        while not self._stopping.wait(self.checkpoint_interval):
+            self.checkpoint()
+
+    # Local days
+
+    @staticmethod
+    def _local_day(now):
+        return datetime.fromtimestamp(now).strftime('%Y-%m-%d')
+
+    @staticmethod
+    def _local_midnight(now):
+        local = datetime.fromtimestamp(now)
+        return local.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+    @staticmethod
+    def _utc_day_bounds(day):
+        """A local date as a [start, end) range of UTC timestamps in the stored format"""
+        start = datetime.strptime(day, '%Y-%m-%d').astimezone(timezone.utc)
+        end = (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).astimezone(timezone.utc)
+        return start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S')
@@ -0,0 +1,133 @@
+# Daily usage rollup
+#
+# usage_daily_rollup holds one row per (user, day, activity type, resource)
+# with the summed duration and number of finished sessions. It is kept up to
+# date whenever a usage session is closed, so get_usage_statistics reads a
+# few rows per day instead of every raw usage record.
+#
+# Sessions without a resource are stored under resource_id 0 because primary
+# key columns of a WITHOUT ROWID table cannot be NULL.
+
+ROLLUP_BACKFILL_NAME = "usage_daily_rollup"
+
+CREATE_ROLLUP_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS usage_daily_rollup (
+    user_id INTEGER NOT NULL,
+    day TEXT NOT NULL,  -- date(start_time)
+    activity_type TEXT NOT NULL,
+    resource_id INTEGER NOT NULL,  -- 0 when the session had no resource
+    total_duration INTEGER NOT NULL DEFAULT 0,  -- unit: seconds
+    session_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, activity_type, resource_id),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+) WITHOUT ROWID
+"""
+
+# Fold finished usage records with record_id in [:start_key, :end_key] into
+# the rollup. Used by the migration backfill and by the bulk insert API.
+ROLLUP_RECORD_RANGE_SQL = """
+INSERT INTO usage_daily_rollup (user_id, day, activity_type, resource_id, total_duration, session_count)
+SELECT user_id, date(start_time), activity_type, COALESCE(resource_id, 0), SUM(duration), COUNT(*)
+FROM usage_records
+WHERE record_id BETWEEN :start_key AND :end_key AND duration IS NOT NULL
+GROUP BY user_id, date(start_time), activity_type, COALESCE(resource_id, 0)
+ON CONFLICT (user_id, day, activity_type, resource_id) DO UPDATE SET
+total_duration = total_duration + excluded.total_duration,
+session_count = session_count + excluded.session_count
+"""
+
+ROLLUP_SESSION_SQL = """
+INSERT INTO usage_daily_rollup (user_id, day, activity_type, resource_id, total_duration, session_count)
+VALUES (?, date(?), ?, COALESCE(?, 0), ?, ?)
+ON CONFLICT (user_id, day, activity_type, resource_id) DO UPDATE SET
+total_duration = total_duration + excluded.total_duration,
+session_count = session_count + excluded.session_count
+"""
+
+# get_usage_statistics queries, answered from the rollup or, while the
+# rollup backfill of an upgraded database is still running, from raw records.
+# All take (user_id, range start, range end).
+USAGE_STATISTICS_QUERIES = {
+    'rollup': {
+        'total': """
+            SELECT SUM(total_duration)
+            FROM usage_daily_rollup
+            WHERE user_id = ? AND day BETWEEN ? AND ?
+            """,
+        'by_activity': """
+            SELECT activity_type, SUM(total_duration) as duration
+            FROM usage_daily_rollup
+            WHERE user_id = ? AND day BETWEEN ? AND ?
+            GROUP BY activity_type
+            """,
+        'by_date': """
+            SELECT day as date, SUM(total_duration) as duration
+            FROM usage_daily_rollup
+            WHERE user_id = ? AND day BETWEEN ? AND ?
+            GROUP BY day
+            ORDER BY day
+            """,
+        'frequent_content': """
+            SELECT u.resource_id, c.title, c.type, SUM(u.total_duration) as duration
+            FROM usage_daily_rollup u
+            JOIN content_resources c ON u.resource_id = c.resource_id
+            WHERE u.user_id = ? AND u.day BETWEEN ? AND ?
+            GROUP BY u.resource_id
+            ORDER BY duration DESC
+            LIMIT 5
+            """,
+    },
+    'records': {
+        'total': """
+            SELECT SUM(duration)
+            FROM usage_records
+            WHERE user_id = ? AND start_time BETWEEN ? AND ?
+            """,
+        'by_activity': """
+            SELECT activity_type, SUM(duration) as duration
+            FROM usage_records
+            WHERE user_id = ? AND start_time BETWEEN ? AND ? AND duration IS NOT NULL
+            GROUP BY activity_type
+            """,
+        'by_date': """
+            SELECT date(start_time) as date, SUM(duration) as duration
+            FROM usage_records
+            WHERE user_id = ? AND start_time BETWEEN ? AND ? AND duration IS NOT NULL
+            GROUP BY date(start_time)
+            ORDER BY date
+            """,
+        'frequent_content': """
+            SELECT r.resource_id, c.title, c.type, SUM(r.duration) as duration
+            FROM usage_records r
+            JOIN content_resources c ON r.resource_id = c.resource_id
+            WHERE r.user_id = ? AND r.start_time BETWEEN ? AND ?
+            GROUP BY r.resource_id
+            ORDER BY duration DESC
+            LIMIT 5
+            """,
+    },
+}
+
+
+def rollup_backfill_state(cursor):
+    """Return (completed, last_key) of the rollup backfill, (False, None) if it has not started"""
+    cursor.execute("SELECT completed, last_key FROM schema_backfills WHERE name = ?", (ROLLUP_BACKFILL_NAME,))
+    result = cursor.fetchone()
+    if not result:
+        return False, None
+    return bool(result[0]), result[1]
+
+
+def rollup_complete(cursor):
+    """Whether the rollup holds every finished usage record"""
+    return rollup_backfill_state(cursor)[0]
+
+
+def rollup_covers(cursor, record_id):
+    """Whether the backfill has already passed record_id
+
+    Sessions the backfill has not reached yet are left to the backfill, so
+    a session closed during an online upgrade is never counted twice.
+    """
+    completed, last_key = rollup_backfill_state(cursor)
+    return completed or (last_key is not None and record_id <= last_key)
@@ -385,6 +385,9 @@ class SpeechInteractionManager(QObject):
         # Status variables
         self.is_recording = False
         self.is_playing = False
+        
+        # Optional DatabaseEventJournal, flushed when resources are released
+        self.event_journal = None
     
     def start_recording(self):
         """Start recording"""
@@ -479,3 +482,7 @@ class SpeechInteractionManager(QObject):
         
         if self.is_playing:
             self.stop_playback()
+        
+        # Write any queued usage/habit/progress events before shutdown
+        if self.event_journal:
+            self.event_journal.close()
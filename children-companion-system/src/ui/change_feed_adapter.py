@@ -0,0 +1,25 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class QtChangeFeedAdapter(QObject):
+    """数据变更信号：把数据库变更事件转发到界面线程
+
+    Subscribes to a change_feed.ChangeFeed and re-emits every ChangeEvent as
+    the changed signal. Writers publish on their own thread; connecting a
+    slot of a widget makes Qt queue the call onto the GUI thread, so a live
+    parent dashboard can apply each change to its totals directly.
+
+        adapter = QtChangeFeedAdapter(database.changes, tables=['usage_records'])
+        adapter.changed.connect(dashboard.apply_change)
+    """
+
+    changed = pyqtSignal(object)  # change_feed.ChangeEvent
+
+    def __init__(self, feed, tables=None, parent=None):
+        super().__init__(parent)
+        self.feed = feed
+        self._emit = self.changed.emit  # the same bound method for unsubscribe
+        feed.subscribe(self._emit, tables)
+
+    def close(self):
+        self.feed.unsubscribe(self._emit)
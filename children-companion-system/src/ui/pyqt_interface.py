@@ -20,6 +20,11 @@ class ChildrenMainInterface(QMainWindow):
 
     # Define signals
     speech_interaction_request = pyqtSignal(bool)  # True to start, False to stop
+    backup_progress = pyqtSignal(int, int)  # copied pages, total pages
+    backup_finished = pyqtSignal(str)  # snapshot path, empty if the backup failed
+    authentication_finished = pyqtSignal(object)  # user dict with session token, None if the login failed
+    account_created = pyqtSignal(object)  # new user_id, False if the account could not be added
+    usage_quota_exhausted = pyqtSignal(int)  # child_id whose time is up or who entered a disabled period
 
     def __init__(self):
         super().__init__()
@@ -34,6 +39,18 @@ class ChildrenMainInterface(QMainWindow):
         # 初始化语音缓存
         self.voice_cache = {}
         
+        # Optional DatabaseEventJournal, flushed when the window closes
+        self.event_journal = None
+        # Optional DatabaseBackupJob, see attach_backup_job
+        self.backup_job = None
+        # Optional CredentialVerifier and the logged-in user, see attach_credential_verifier
+        self.credential_verifier = None
+        self.current_user = None
+        # Optional UsageQuotaEngine, see attach_quota_engine
+        self.quota_engine = None
+        self.quota_timer = None
+        self.quota_allowed = True
+        
         try:
             # 使用本地语音系统
             self.speech_service = LocalSpeechSystem()
@@ -702,6 +719,98 @@ class ChildrenMainInterface(QMainWindow):
             print(f"语音识别失败: {error_msg}")
             self.add_to_dialog_history("系统", f"抱歉，我没有听清楚。({error_msg})")
 
+    def attach_backup_job(self, backup_job):
+        """在状态栏显示后台数据库备份进度
+
+        The job calls back on its own thread; emitting the signals from there
+        queues the updates onto the GUI thread.
+        """
+        self.backup_job = backup_job
+        self.backup_progress.connect(self.show_backup_progress)
+        self.backup_finished.connect(self.show_backup_finished)
+        backup_job.add_progress_callback(self.backup_progress.emit)
+        backup_job.add_finished_callback(lambda path: self.backup_finished.emit(path or ""))
+
+    def show_backup_progress(self, copied_pages, total_pages):
+        if total_pages:
+            self.statusBar().showMessage(f"正在备份数据... {copied_pages * 100 // total_pages}%")
+
+    def show_backup_finished(self, path):
+        self.statusBar().showMessage("数据备份完成" if path else "数据备份失败", 5000)
+
+    def attach_credential_verifier(self, credential_verifier):
+        """登录验证在后台线程进行，界面不会卡顿
+
+        The scrypt check takes a noticeable fraction of a second on the
+        tablets; the result comes back through authentication_finished.
+        Accounts are created the same way, see request_account.
+        """
+        self.credential_verifier = credential_verifier
+        self.authentication_finished.connect(self.handle_authentication_result)
+        self.account_created.connect(self.handle_account_created)
+
+    def request_login(self, username, password):
+        """开始验证用户名和密码，结果通过 authentication_finished 信号返回"""
+        if not self.credential_verifier:
+            return
+        self.statusBar().showMessage("正在验证...")
+        self.credential_verifier.verify(username, password, self.authentication_finished.emit)
+
+    def handle_authentication_result(self, user):
+        self.current_user = user
+        self.statusBar().showMessage("登录成功" if user else "用户名或密码错误", 3000)
+
+    def request_account(self, username, password, user_type):
+        """在后台线程创建账号（密码哈希较慢），结果通过 account_created 信号返回"""
+        if not self.credential_verifier:
+            return
+        self.statusBar().showMessage("正在创建账号...")
+        self.credential_verifier.create_account(username, password, user_type, self.account_created.emit)
+
+    def handle_account_created(self, user_id):
+        self.statusBar().showMessage("账号创建成功" if user_id else "账号创建失败", 3000)
+
+    def attach_quota_engine(self, quota_engine):
+        """每秒检查登录儿童的使用时间限制和禁用时段
+
+        status() is answered from memory, so a one-second timer costs
+        nothing; usage_quota_exhausted is emitted once when the time runs out.
+        """
+        self.quota_engine = quota_engine
+        self.quota_timer = QTimer(self)
+        self.quota_timer.timeout.connect(self.check_usage_quota)
+        self.quota_timer.start(1000)
+
+    def check_usage_quota(self):
+        user = self.current_user
+        if not self.quota_engine or not user or user.get('user_type') != 'child':
+            return
+        status = self.quota_engine.status(user['user_id'])
+        if not status['allowed']:
+            if self.quota_allowed:
+                self.quota_allowed = False
+                message = "现在是休息时间" if status['blocked'] else "今天的使用时间到了"
+                self.statusBar().showMessage(message)
+                self.usage_quota_exhausted.emit(user['user_id'])
+            return
+        self.quota_allowed = True
+        seconds_left = status['seconds_left']
+        if seconds_left is not None and seconds_left <= 5 * 60:
+            self.statusBar().showMessage(f"还可以玩 {seconds_left // 60} 分 {seconds_left % 60} 秒")
+
+    def closeEvent(self, event):
+        """窗口关闭时释放资源并写入未保存的事件"""
+        speech_manager = getattr(self, 'speech_interaction_manager', None)
+        if speech_manager:
+            speech_manager.release_resources()
+        if self.event_journal:
+            self.event_journal.close()
+        if self.backup_job:
+            self.backup_job.stop()
+        if self.quota_timer:
+            self.quota_timer.stop()
+        super().closeEvent(event)
+
     def switch_page(self, page_name):
         """切换页面"""
         try:
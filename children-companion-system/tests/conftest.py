@@ -0,0 +1,56 @@
+import os
+import uuid
+import asyncio
+
+import pytest
+
+from src.database.passwords import PasswordHasher
+
+# PostgreSQL for the backend contract tests: the server named by
+# CHILDREN_COMPANION_TEST_POSTGRES_DSN (each test creates and drops its own
+# database there), or a throwaway server started with pgserver when that is
+# installed; otherwise the PostgreSQL cases are skipped.
+POSTGRES_DSN_VARIABLE = "CHILDREN_COMPANION_TEST_POSTGRES_DSN"
+
+
+@pytest.fixture
+def fast_hasher():
+    """Minimal scrypt cost, tests hash many passwords"""
+    return PasswordHasher(n=2 ** 4)
+
+
+@pytest.fixture(scope="session")
+def postgres_server_dsn(tmp_path_factory):
+    pytest.importorskip("asyncpg")
+    dsn = os.environ.get(POSTGRES_DSN_VARIABLE)
+    if dsn:
+        yield dsn
+        return
+    pgserver = pytest.importorskip("pgserver", reason=f"set {POSTGRES_DSN_VARIABLE} or install pgserver")
+    server = pgserver.get_server(str(tmp_path_factory.mktemp("postgres")), cleanup_mode="stop")
+    yield server.get_uri()
+    server.cleanup()
+
+
+def _admin(dsn, statement):
+    import asyncpg
+
+    async def run():
+        connection = await asyncpg.connect(dsn)
+        try:
+            await connection.execute(statement)
+        finally:
+            await connection.close()
+    asyncio.run(run())
+
+
+@pytest.fixture
+def postgres_dsn(postgres_server_dsn):
+    """DSN of a fresh, empty database, dropped after the test"""
+    from urllib.parse import urlsplit, urlunsplit
+
+    name = f"children_companion_test_{uuid.uuid4().hex[:12]}"
+    _admin(postgres_server_dsn, f'CREATE DATABASE "{name}"')
+    parts = urlsplit(postgres_server_dsn)
+    yield urlunsplit(parts._replace(path="/" + name))
+    _admin(postgres_server_dsn, f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
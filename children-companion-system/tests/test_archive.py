@@ -0,0 +1,59 @@
+import os
+import sqlite3
+
+from src.database.archive import DataArchiver, incremental_vacuum_enabled
+from src.database.database_system import DatabaseManager
+
+
+def old_database(path, fast_hasher):
+    """A database as created before auto_vacuum=INCREMENTAL, with a year-old usage history"""
+    database = DatabaseManager(path, password_hasher=fast_hasher)
+    assert database.initialize_database()
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA auto_vacuum = NONE")
+    connection.execute("VACUUM")
+    connection.close()
+
+    parent_id = database.add_user("parent", "password123", "parent")
+    child_id = database.add_user("child", "password123", "child")
+    database.add_child_info(child_id, parent_id, "Xiaoming", 6)
+    records = [(child_id, None, 'play', f'2020-{month:02d}-{day:02d} 10:00:00', f'2020-{month:02d}-{day:02d} 10:10:00',
+                600, 'completed ' + 'x' * 200)
+               for month in range(1, 13) for day in range(1, 29) for repeat in range(10)]
+    assert database.add_usage_records_bulk(records)
+    return database
+
+
+def archive_all(database, tmp_path):
+    archiver = DataArchiver(database, archive_directory=str(tmp_path / "archive"), pause=0)
+    assert archiver.run()['usage_records'] == 12 * 28 * 10
+    return archiver
+
+
+def test_converted_database_shrinks_after_archiving(tmp_path, fast_hasher):
+    path = str(tmp_path / "live.db")
+    database = old_database(path, fast_hasher)
+    archiver = DataArchiver(database, archive_directory=str(tmp_path / "archive"), pause=0)
+    assert archiver.convert_to_incremental_vacuum() is True
+    assert archiver.convert_to_incremental_vacuum() is False
+    size_before = os.path.getsize(path)
+
+    archive_all(database, tmp_path)
+    assert os.path.getsize(path) < size_before / 2
+    database.close_pool()
+
+
+def test_unconverted_database_keeps_its_size(tmp_path, fast_hasher):
+    path = str(tmp_path / "live.db")
+    database = old_database(path, fast_hasher)
+    size_before = os.path.getsize(path)
+
+    archive_all(database, tmp_path)
+    connection = sqlite3.connect(path)
+    try:
+        assert not incremental_vacuum_enabled(connection)
+        assert connection.execute("PRAGMA freelist_count").fetchone()[0] > 0
+    finally:
+        connection.close()
+    assert os.path.getsize(path) == size_before
+    database.close_pool()
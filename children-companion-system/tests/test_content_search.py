@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+from src.database.content_search import text_bigrams
+from src.database.database_system import DatabaseManager
+from src.database.migrations import MigrationRunner
+from src.database.sharding import ShardedDatabaseManager
+
+
+@pytest.fixture
+def database(tmp_path, fast_hasher):
+    database = DatabaseManager(str(tmp_path / "content.db"), password_hasher=fast_hasher)
+    assert database.initialize_database()
+    yield database
+    database.close_pool()
+
+
+def execute(database, sql, params=()):
+    """Write through one of the manager's own connections, bypassing its methods"""
+    assert database.connect_database()
+    try:
+        database.cursor.execute(sql, params)
+        database.connection.commit()
+    finally:
+        database.close_connection()
+
+
+def assert_bigrams_current(database_path):
+    connection = sqlite3.connect(database_path)
+    try:
+        expected = {(bigram, resource_id)
+                    for resource_id, title, description, tags in connection.execute(
+                        "SELECT resource_id, title, description, tags FROM content_resources")
+                    for bigram in text_bigrams(title, description, tags)}
+        assert set(connection.execute("SELECT bigram, resource_id FROM content_bigrams")) == expected
+    finally:
+        connection.close()
+
+
+def search_ids(database, keyword):
+    return [row['resource_id'] for row in database.search_content(keyword)]
+
+
+def test_every_writer_keeps_two_character_search_current(database):
+    dinosaur = database.add_content_resource("恐龙世界", "story", "content/stories/dinosaurs.json", tags="科学")
+    execute(database, "INSERT INTO content_resources (title, type, content_path, description) VALUES (?, ?, ?, ?)",
+            ("数学小游戏", "game", "content/games/math.json", "数数和加法"))
+    (math,) = [row['resource_id'] for row in database.get_content_resources(type="game")]
+    assert search_ids(database, "恐龙") == [dinosaur]
+    assert search_ids(database, "加法") == [math]
+    assert_bigrams_current(database.database_path)
+
+    execute(database, "UPDATE content_resources SET title = ?, tags = NULL WHERE resource_id = ?",
+            ("海洋故事", dinosaur))
+    assert search_ids(database, "恐龙") == []
+    assert search_ids(database, "科学") == []
+    assert search_ids(database, "海洋") == [dinosaur]
+
+    execute(database, "DELETE FROM content_resources WHERE resource_id = ?", (math,))
+    assert search_ids(database, "加法") == []
+    assert_bigrams_current(database.database_path)
+
+
+def test_connection_without_the_bigram_function_cannot_write_content(database):
+    connection = sqlite3.connect(database.database_path)
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="content_text_bigrams"):
+            connection.execute("INSERT INTO content_resources (title, type, content_path) VALUES ('恐龙', 'story', 'x')")
+    finally:
+        connection.close()
+
+
+def test_migration_indexes_existing_catalog(tmp_path, fast_hasher):
+    database = DatabaseManager(str(tmp_path / "old.db"), password_hasher=fast_hasher)
+    assert database.connect_database()
+    try:
+        MigrationRunner(database.connection).upgrade(11)
+        database.cursor.execute("INSERT INTO content_resources (title, type, content_path) VALUES ('恐龙世界', 'story', 'x')")
+        database.connection.commit()
+    finally:
+        database.close_connection()
+    assert database.initialize_database()
+    assert search_ids(database, "恐龙") == [1]
+    assert_bigrams_current(database.database_path)
+    database.close_pool()
+
+
+def test_content_copied_to_a_shard_is_indexed(tmp_path, fast_hasher):
+    sharded = ShardedDatabaseManager(str(tmp_path / "shards"), catalog_options={'password_hasher': fast_hasher})
+    assert sharded.initialize_database()
+    try:
+        parent_id = sharded.add_user("parent", "password123", "parent")
+        child_id = sharded.add_user("child", "password123", "child", parent_id=parent_id)
+        assert sharded.add_child_info(child_id, parent_id, "Xiaoming", 6)
+        resource_id = sharded.add_content_resource("恐龙世界", "story", "content/stories/dinosaurs.json")
+        assert sharded.add_usage_record(child_id, resource_id, "play")
+
+        shard = sharded.shard_for_user(child_id)
+        assert [row['resource_id'] for row in shard.search_content("恐龙")] == [resource_id]
+        assert_bigrams_current(shard.database_path)
+    finally:
+        sharded.close_pool()
@@ -0,0 +1,81 @@
+import threading
+
+from src.database.event_journal import DatabaseEventJournal
+
+
+class RecordingDatabase:
+    """Bulk API stand-in that keeps what it was given"""
+
+    def __init__(self):
+        self.usage, self.habits, self.progress = [], [], []
+
+    def add_usage_records_bulk(self, records):
+        self.usage.extend(records)
+        return list(range(len(records)))
+
+    def record_habit_completions_bulk(self, completions):
+        self.habits.extend(completions)
+        return list(range(len(completions)))
+
+    def upsert_learning_progress_bulk(self, progress_items):
+        self.progress.extend(progress_items)
+        return list(range(len(progress_items)))
+
+
+def test_events_accepted_while_closing_are_all_written():
+    for attempt in range(20):
+        database = RecordingDatabase()
+        journal = DatabaseEventJournal(database, flush_interval=0.01, max_batch_size=7)
+        journal.start()
+        accepted, sessions, flushed = [], [], []
+        start = threading.Barrier(5)
+
+        def complete_habits(producer):
+            start.wait()
+            for n in range(200):
+                if journal.record_habit_completion(producer, "completed", notes=str(n)):
+                    accepted.append((producer, str(n)))
+
+        def open_sessions():
+            start.wait()
+            for n in range(200):
+                token = journal.start_usage(1, n, "play")
+                if token is not None:
+                    sessions.append(n)
+                if n % 2 and token is not None:
+                    journal.end_usage(token, "completed")
+
+        def flush():
+            start.wait()
+            for n in range(50):
+                flushed.append(journal.flush(timeout=5))
+
+        threads = [threading.Thread(target=complete_habits, args=(producer,)) for producer in (1, 2)]
+        threads += [threading.Thread(target=open_sessions), threading.Thread(target=flush)]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        journal.close(timeout=5)
+        for thread in threads:
+            thread.join(5)
+            assert not thread.is_alive()
+
+        assert sorted((event['habit_id'], event['notes']) for event in database.habits) == sorted(accepted)
+        # Every session opened is written exactly once: ended normally or as interrupted on close
+        assert sorted(record['resource_id'] for record in database.usage) == sorted(sessions)
+        assert all(record['completion_status'] in ("completed", "interrupted") for record in database.usage)
+        assert all(flushed)
+        assert journal.written_events == len(accepted) + len(sessions)
+
+
+def test_closed_journal_rejects_events_and_flush_returns():
+    database = RecordingDatabase()
+    journal = DatabaseEventJournal(database)
+    token = journal.start_usage(1, 2, "play")
+    journal.close(timeout=5)
+
+    assert [record['completion_status'] for record in database.usage] == ["interrupted"]
+    assert journal.start_usage(1, 2, "play") is None
+    assert journal.end_usage(token) is False
+    assert journal.add_learning_progress(1, "literacy", "basic characters", 1, 50) is False
+    assert journal.flush(timeout=5) is True
@@ -0,0 +1,108 @@
+import sqlite3
+import threading
+
+import pytest
+
+from src.database.database_system import DatabaseManager
+from src.database.passwords import CredentialVerifier, SessionCache
+
+USER = {'user_id': 1, 'user_type': 'parent'}
+
+
+def test_cached_login_needs_the_hash_it_was_verified_against():
+    sessions = SessionCache()
+    token = sessions.issue("parent", "password123", USER, "hash-1")
+    assert sessions.lookup_credentials("parent", "password123", "hash-1")['session_token'] == token
+    assert sessions.lookup_credentials("parent", "wrong", "hash-1") is None
+
+    # Password changed: the cached login and its token are both revoked
+    assert sessions.lookup_credentials("parent", "password123", "hash-2") is None
+    assert sessions.lookup_token(token) is None
+    assert sessions.lookup_credentials("parent", "password123", "hash-1") is None
+
+
+def test_deleted_user_loses_cached_login_and_sessions():
+    sessions = SessionCache()
+    token = sessions.issue("parent", "password123", USER, "hash-1")
+    assert sessions.lookup_credentials("parent", "password123", None) is None
+    assert sessions.lookup_token(token) is None
+
+
+def test_login_under_a_new_hash_ends_older_sessions():
+    sessions = SessionCache()
+    old_token = sessions.issue("parent", "password123", USER, "hash-1")
+    other_device = sessions.issue("parent", "password123", USER, "hash-1")
+    assert sessions.lookup_token(other_device) and not sessions.lookup_token(old_token)
+
+    new_token = sessions.issue("parent", "new password", USER, "hash-2")
+    assert sessions.lookup_token(other_device) is None
+    assert sessions.lookup_token(new_token)['user_id'] == USER['user_id']
+
+
+def test_revoke_user_ends_sessions_and_cached_logins():
+    sessions = SessionCache()
+    token = sessions.issue("parent", "password123", USER, "hash-1")
+    child = sessions.issue("child", "password123", {'user_id': 2, 'user_type': 'child'}, "hash-3")
+    sessions.revoke_user(USER['user_id'])
+    assert sessions.lookup_token(token) is None
+    assert sessions.lookup_credentials("parent", "password123", "hash-1") is None
+    assert sessions.lookup_token(child)['user_id'] == 2
+
+
+@pytest.fixture
+def database(tmp_path, fast_hasher):
+    database = DatabaseManager(str(tmp_path / "passwords.db"), password_hasher=fast_hasher)
+    assert database.initialize_database()
+    yield database
+    database.close_pool()
+
+
+def _execute(database, sql, params):
+    connection = sqlite3.connect(database.database_path)
+    with connection:
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.execute(sql, params)
+    connection.close()
+
+
+def test_password_change_in_database_invalidates_cached_login(database, fast_hasher):
+    user_id = database.add_user("parent", "password123", "parent")
+    login = database.authenticate_user("parent", "password123")
+    assert database.authenticate_user("parent", "password123") == login
+
+    _execute(database, "UPDATE users SET password = ? WHERE user_id = ?", (fast_hasher.hash("new password"), user_id))
+    assert database.authenticate_user("parent", "password123") is None
+    assert database.authenticate_session(login['session_token']) is None
+    assert database.authenticate_user("parent", "new password")['user_id'] == user_id
+
+
+def test_deleted_user_cannot_log_in_from_cache(database):
+    user_id = database.add_user("parent", "password123", "parent")
+    login = database.authenticate_user("parent", "password123")
+
+    _execute(database, "DELETE FROM users WHERE user_id = ?", (user_id,))
+    assert database.authenticate_user("parent", "password123") is None
+    assert database.authenticate_session(login['session_token']) is None
+
+
+def test_legacy_password_is_rehashed_and_the_login_cached(database):
+    user_id = database.add_user("parent", "password123", "parent")
+    _execute(database, "UPDATE users SET password = ? WHERE user_id = ?", ("password123", user_id))
+
+    login = database.authenticate_user("parent", "password123")
+    assert login['user_id'] == user_id
+    assert database.authenticate_user("parent", "password123") == login
+
+
+def test_accounts_are_created_on_the_verifier_thread(database):
+    verifier = CredentialVerifier(database)
+    threads = []
+    try:
+        user_id = verifier.create_account("parent", "password123", "parent",
+                                          lambda result: threads.append(threading.current_thread().name)).result(10)
+        assert verifier.create_account("parent", "other", "parent").result(10) is False
+        login = verifier.verify("parent", "password123").result(10)
+    finally:
+        verifier.shutdown()
+    assert isinstance(user_id, int) and login['user_id'] == user_id
+    assert threads and threads[0].startswith("CredentialVerifier")
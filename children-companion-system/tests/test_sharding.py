@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+from src.database.passwords import PasswordHasher
+from src.database.sharding import ShardedDatabaseManager
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    database = ShardedDatabaseManager(str(tmp_path / "shards"),
+                                      catalog_options={'password_hasher': PasswordHasher(n=2 ** 4)})
+    assert database.initialize_database()
+    yield database
+    database.close_pool()
+
+
+@pytest.fixture
+def family(sharded):
+    parent_id = sharded.add_user("parent", "password123", "parent")
+    child_id = sharded.add_user("child", "password123", "child", parent_id=parent_id)
+    assert sharded.add_child_info(child_id, parent_id, "Xiaoming", 6)
+    resource_id = sharded.add_content_resource("Little Red Riding Hood", "story", "content/stories/red.json")
+    return parent_id, child_id, resource_id
+
+
+def stored_usage_records(sharded, child_id, record_ids):
+    connection = sqlite3.connect(sharded.shard_for_user(child_id).database_path)
+    try:
+        placeholders = ', '.join('?' for record_id in record_ids)
+        return connection.execute(
+            f"""SELECT record_id, user_id, resource_id, activity_type, start_time, end_time, duration,
+            completion_status FROM usage_records WHERE record_id IN ({placeholders}) ORDER BY record_id""",
+            record_ids
+        ).fetchall()
+    finally:
+        connection.close()
+
+
+def test_usage_records_bulk_tuple_round_trip(sharded, family):
+    parent_id, child_id, resource_id = family
+    record_ids = sharded.add_usage_records_bulk([
+        (child_id, resource_id, 'play', '2024-03-01 10:00:00', '2024-03-01 10:10:00', 600, 'completed'),
+        (child_id, None, 'browse', '2024-03-01 11:00:00', None, None, None),
+    ])
+
+    assert stored_usage_records(sharded, child_id, record_ids) == [
+        (record_ids[0], child_id, resource_id, 'play', '2024-03-01 10:00:00', '2024-03-01 10:10:00', 600,
+         'completed'),
+        (record_ids[1], child_id, None, 'browse', '2024-03-01 11:00:00', None, None, None),
+    ]
+
+
+def test_usage_records_bulk_dict_keeps_duration(sharded, family):
+    parent_id, child_id, resource_id = family
+    record_ids = sharded.add_usage_records_bulk([
+        {'user_id': child_id, 'resource_id': resource_id, 'activity_type': 'learn',
+         'start_time': '2024-03-02 09:00:00', 'end_time': '2024-03-02 09:30:00', 'duration': 1500,
+         'completion_status': 'interrupted'},
+    ])
+
+    (row,) = stored_usage_records(sharded, child_id, record_ids)
+    assert row[6:] == (1500, 'interrupted')
+    assert sharded.get_usage_statistics(child_id, '2024-03-02', '2024-03-02')['total_usage_duration'] == 1500
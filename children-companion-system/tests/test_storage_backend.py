@@ -0,0 +1,234 @@
+import pytest
+
+from src.database.database_system import DatabaseManager
+from src.database.storage_backend import StorageBackend
+
+# The StorageBackend contract, run against every implementation: the same
+# calls must give the same results (ids aside) on SQLite and PostgreSQL.
+
+BACKENDS = ['sqlite', 'postgres']
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, tmp_path, fast_hasher):
+    if request.param == 'sqlite':
+        database = DatabaseManager(str(tmp_path / "contract.db"), password_hasher=fast_hasher)
+    else:
+        from src.database.postgres_backend import PostgresDatabaseManager
+        database = PostgresDatabaseManager(request.getfixturevalue('postgres_dsn'), max_pool_size=2, timeout=10,
+                                           password_hasher=fast_hasher)
+    assert database.initialize_database()
+    yield database
+    database.close_pool()
+
+
+@pytest.fixture
+def family(backend):
+    parent_id = backend.add_user("parent", "password123", "parent")
+    child_id = backend.add_user("child", "password123", "child")
+    assert backend.add_child_info(child_id, parent_id, "Xiaoming", 6, "male", "drawing,dinosaurs")
+    return parent_id, child_id
+
+
+def test_backends_implement_the_interface(backend):
+    assert isinstance(backend, StorageBackend)
+
+
+def test_users_and_children(backend, family):
+    parent_id, child_id = family
+    assert isinstance(parent_id, int) and isinstance(child_id, int)
+    assert backend.add_user("parent", "other", "parent") is False
+
+    user = backend.get_user_info(username="child")
+    assert (user['user_id'], user['user_type']) == (child_id, 'child')
+    assert backend.get_user_info(user_id=parent_id)['username'] == "parent"
+    assert backend.get_user_info(username="nobody") is None
+
+    child = backend.get_child_info(child_id)
+    assert (child['name'], child['age'], child['username']) == ("Xiaoming", 6, "child")
+    assert [row['child_id'] for row in backend.get_parent_children_list(parent_id)] == [child_id]
+    assert backend.get_child_info(child_id + 1000) is None
+    assert backend.get_parent_children_list(child_id + 1000) == []
+
+
+def test_authentication_and_sessions(backend, family):
+    parent_id, child_id = family
+    assert backend.authenticate_user("child", "wrong") is None
+    assert backend.authenticate_user("nobody", "password123") is None
+
+    user = backend.authenticate_user("child", "password123")
+    assert (user['user_id'], user['user_type']) == (child_id, 'child')
+    assert backend.authenticate_session(user['session_token'])['user_id'] == child_id
+    backend.end_session(user['session_token'])
+    assert backend.authenticate_session(user['session_token']) is None
+
+
+def test_content_listing_and_search(backend):
+    red = backend.add_content_resource("Little Red Riding Hood", "story", "content/stories/red.json",
+                                       subtype="fairy tale", description="A girl walks through the forest",
+                                       tags="fairy tale,classic,forest")
+    song = backend.add_content_resource("Twinkle Twinkle", "song", "content/songs/twinkle.json",
+                                        description="Night sky song", tags="classic,night")
+
+    assert {row['resource_id'] for row in backend.get_content_resources()} == {red, song}
+    assert [row['resource_id'] for row in backend.get_content_resources(type="song")] == [song]
+    assert [row['resource_id'] for row in backend.get_content_resources(tags="classic,forest")] == [red]
+    assert {row['resource_id'] for row in backend.get_content_resources(tags="forest,night", tag_match="any")} == {red, song}
+    assert backend.get_content_resources(tags="rain") == []
+
+    results = backend.search_content("riding")
+    assert [row['resource_id'] for row in results] == [red]
+    assert results[0]['title_highlight'] == "Little Red <b>Riding</b> Hood"
+    assert backend.search_content("forest", type="song") == []
+    assert backend.search_content("   ") == []
+
+
+def test_usage_records_and_statistics(backend, family):
+    parent_id, child_id = family
+    resource_id = backend.add_content_resource("Counting Game", "game", "content/games/count.json")
+
+    record_id = backend.add_usage_record(child_id, resource_id, "game")
+    assert isinstance(record_id, int)
+    assert backend.update_usage_record(record_id, completion_status="completed") is True
+    assert backend.update_usage_record(record_id + 1000, completion_status="completed") is False
+
+    record_ids = backend.add_usage_records_bulk([
+        (child_id, resource_id, 'play', '2024-03-01 10:00:00', '2024-03-01 10:10:00', 600, 'completed'),
+        {'user_id': child_id, 'resource_id': None, 'activity_type': 'browse', 'start_time': '2024-03-01 11:00:00',
+         'end_time': '2024-03-01 11:05:00', 'completion_status': 'interrupted'},
+        (child_id, resource_id, 'play', '2024-03-02 08:00:00'),
+    ])
+    assert len(record_ids) == 3 and len(set(record_ids)) == 3
+    assert backend.add_usage_records_bulk([]) == []
+
+    statistics = backend.get_usage_statistics(child_id, '2024-03-01', '2024-03-02')
+    assert statistics['total_usage_duration'] == 900
+    assert statistics['activity_statistics'] == {'play': 600, 'browse': 300}
+    assert statistics['date_statistics'] == {'2024-03-01': 900}
+    assert [(row['resource_id'], row['usage_duration']) for row in statistics['frequent_content']] == [(resource_id, 600)]
+    assert backend.get_usage_statistics(child_id, '2023-01-01', '2023-01-31')['total_usage_duration'] == 0
+
+
+def test_learning_progress_keeps_the_highest_rate(backend, family):
+    parent_id, child_id = family
+    progress_id = backend.add_learning_progress(child_id, "literacy", "basic characters", 1, 80)
+    assert backend.add_learning_progress(child_id, "literacy", "basic characters", 1, 60) == progress_id
+    assert backend.add_learning_progress(child_id, "literacy", "basic characters", 1, 90) == progress_id
+
+    ids = backend.upsert_learning_progress_bulk([
+        (child_id, "literacy", "basic characters", 1, 70),
+        {'child_id': child_id, 'subject': "arithmetic", 'topic': "counting", 'level': 1, 'completion_rate': 40},
+    ])
+    assert ids[0] == progress_id
+
+    rates = {row['subject']: row['completion_rate'] for row in backend.get_learning_progress(child_id)}
+    assert rates == {'arithmetic': 40, 'literacy': 90}
+    assert [row['topic'] for row in backend.get_learning_progress(child_id, "arithmetic")] == ["counting"]
+
+
+def test_habits_and_completions(backend, family):
+    parent_id, child_id = family
+    habit_id = backend.add_habit(child_id, "brush teeth", "daily", "morning and evening", "07:30,19:30")
+    assert isinstance(backend.record_habit_completion(habit_id, "completed", "on own initiative"), int)
+    record_ids = backend.record_habit_completions_bulk([
+        (habit_id, "completed", None, '2024-03-01 07:30:00'),
+        {'habit_id': habit_id, 'completion_status': "not completed", 'completion_time': '2024-03-02 07:30:00'},
+    ])
+    assert len(record_ids) == 2
+
+    (habit,) = backend.get_habit_list(child_id)
+    assert (habit['habit_id'], habit['habit_name'], habit['completion_count']) == (habit_id, "brush teeth", 2)
+    assert habit['longest_streak'] == 1
+    assert backend.get_habit_list(child_id + 1000) == []
+
+
+def test_parental_control_updates_merge(backend, family):
+    parent_id, child_id = family
+    setting_id = backend.set_parental_control(parent_id, child_id, 120, '[{"start":"22:00", "end":"06:00"}]',
+                                              "medium", '["story"]')
+    assert backend.set_parental_control(parent_id, child_id, daily_time_limit=60) == setting_id
+
+    settings = backend.get_parental_control_settings(parent_id, child_id)
+    assert (settings['daily_time_limit'], settings['content_filter_level']) == (60, "medium")
+    assert settings['disabled_periods'] == '[{"start":"22:00", "end":"06:00"}]'
+    assert backend.get_parental_control_settings(parent_id, parent_id) is None
+
+
+def test_errors_become_failure_values(backend, family):
+    parent_id, child_id = family
+    # Foreign key violations and malformed input never raise into the caller
+    assert backend.add_child_info(child_id + 1000, parent_id, "Nobody") is False
+    assert backend.add_habit(child_id + 1000, "read", "daily") is False
+    assert backend.add_usage_records_bulk([(child_id + 1000, None, 'play')]) is False
+    assert backend.get_usage_statistics(child_id, 'not a date', '2024-03-01') == {}
+    assert backend.get_usage_statistics(child_id, '2024-03-01', '2024-02-30') == {}
+
+
+# PostgresDatabaseManager over a stubbed asyncpg whose pool fails every call:
+# whatever the driver raises, callers get DatabaseManager's failure values.
+
+class InterfaceError(Exception):
+    """Stands in for asyncpg.InterfaceError, which is not a PostgresError"""
+
+
+class FailingPool:
+    def __init__(self, error):
+        self.error = error
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise self.error
+        return fail
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture(params=[InterfaceError("connection is closed"), ValueError("bad argument"),
+                        ConnectionResetError("connection reset by peer")], ids=lambda e: type(e).__name__)
+def failing_postgres(request, monkeypatch, fast_hasher):
+    from types import SimpleNamespace
+    from src.database import postgres_backend
+
+    async def create_pool(dsn, **kwargs):
+        return FailingPool(request.param)
+
+    monkeypatch.setattr(postgres_backend, "_require_asyncpg", lambda: SimpleNamespace(create_pool=create_pool))
+    database = postgres_backend.PostgresDatabaseManager("postgresql://stub/children_companion", timeout=5,
+                                                        password_hasher=fast_hasher)
+    yield database
+    database.close_pool()
+
+
+def test_postgres_driver_errors_become_failure_values(failing_postgres):
+    database = failing_postgres
+    assert database.initialize_database() is False
+    assert database.add_user("parent", "password123", "parent") is False
+    assert database.add_child_info(2, 1, "Xiaoming") is False
+    assert database.add_content_resource("Story", "story", "content/stories/story.json") is False
+    assert database.add_usage_record(2, None, "browse") is False
+    assert database.update_usage_record(1) is False
+    assert database.add_learning_progress(2, "literacy", "basic characters", 1, 50) is False
+    assert database.add_habit(2, "read", "daily") is False
+    assert database.record_habit_completion(1, "completed") is False
+    assert database.set_parental_control(1, 2, 60) is False
+    assert database.add_usage_records_bulk([(2, None, 'play')]) is False
+    assert database.record_habit_completions_bulk([(1, "completed")]) is False
+    assert database.upsert_learning_progress_bulk([(2, "literacy", "basic characters", 1, 50)]) is False
+
+    assert database.get_user_info(username="parent") is None
+    assert database.get_child_info(2) is None
+    assert database.get_parental_control_settings(1, 2) is None
+    assert database.authenticate_user("parent", "password123") is None
+    assert database.get_parent_children_list(1) == []
+    assert database.get_content_resources() == []
+    assert database.get_learning_progress(2) == []
+    assert database.get_habit_list(2) == []
+    assert database.search_content("story") == []
+    assert database.get_usage_statistics(2, '2024-03-01', '2024-03-31') == {}
+
+
+def test_postgres_argument_errors_become_failure_values(failing_postgres):
+    # Raised in the coroutine before the pool is touched
+    assert failing_postgres.get_usage_statistics(2, 'not a date', '2024-03-01') == {}
+    assert failing_postgres.update_usage_record(1, 'yesterday') is False
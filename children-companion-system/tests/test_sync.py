@@ -0,0 +1,224 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.database.database_system import DatabaseManager
+from src.database.sync import DeltaSync, decode_batch
+
+STORY = "content/stories/little_red_riding_hood.json"
+
+ROLLUP_FROM_RECORDS_SQL = """
+SELECT user_id, date(start_time), activity_type, COALESCE(resource_id, 0), SUM(duration), COUNT(*)
+FROM usage_records WHERE duration IS NOT NULL
+GROUP BY user_id, date(start_time), activity_type, COALESCE(resource_id, 0)
+ORDER BY 1, 2, 3, 4
+"""
+
+
+class Device:
+    """One device database with a parent, a child and a story"""
+
+    def __init__(self, path, password_hasher):
+        self.database = DatabaseManager(path, password_hasher=password_hasher)
+        assert self.database.initialize_database()
+        parent_id = self.database.add_user("parent", "password123", "parent")
+        self.child_id = self.database.add_user("child", "password123", "child")
+        self.database.add_child_info(self.child_id, parent_id, "Xiaoming", 6)
+        self.resource_id = self.database.add_content_resource("Little Red Riding Hood", "story", STORY)
+        self.sync = DeltaSync(self.database, password_hasher=password_hasher)
+
+    def query(self, sql, params=()):
+        connection = sqlite3.connect(self.database.database_path)
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+    def snapshot(self):
+        """Synced data and derived counters, without the sync bookkeeping"""
+        return {table: self.query(f"SELECT * FROM {table} ORDER BY 1, 2")
+                for table in ('users', 'children_info', 'habit_formation', 'habit_completion_records',
+                              'usage_records', 'learning_progress', 'usage_daily_rollup', 'habit_stats')}
+
+    def rates(self):
+        return {(row['subject'], row['topic']): row['completion_rate']
+                for row in self.database.get_learning_progress(self.child_id)}
+
+    def play(self, minutes, close=True):
+        record_id = self.database.add_usage_record(self.child_id, self.resource_id, "play")
+        if close:
+            self.close(record_id, minutes)
+        return record_id
+
+    def close(self, record_id, minutes):
+        end_time = (datetime.now() + timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S')
+        assert self.database.update_usage_record(record_id, end_time, "completed")
+
+
+@pytest.fixture
+def tablet(tmp_path, fast_hasher):
+    device = Device(str(tmp_path / "tablet.db"), fast_hasher)
+    yield device
+    device.database.close_pool()
+
+
+@pytest.fixture
+def phone(tmp_path, fast_hasher):
+    device = Device(str(tmp_path / "phone.db"), fast_hasher)
+    yield device
+    device.database.close_pool()
+
+
+def test_replaying_a_batch_is_a_no_op(tablet, phone):
+    tablet.database.add_learning_progress(tablet.child_id, "literacy", "basic characters", 1, 80)
+    habit_id = tablet.database.add_habit(tablet.child_id, "brush teeth", "daily")
+    tablet.database.record_habit_completion(habit_id, "completed")
+    tablet.play(20)
+    tablet.play(0, close=False)
+
+    payloads = list(tablet.sync.export_batches(peer_id=phone.sync.device_id))
+    first = [phone.sync.apply_batch(payload) for payload in payloads]
+    assert sum(sum(result['applied'].values()) for result in first) > 0
+    before = phone.snapshot()
+
+    replayed = [phone.sync.apply_batch(payload) for payload in payloads]
+    assert all(sum(result['applied'].values()) == 0 for result in replayed)
+    assert phone.snapshot() == before
+    assert phone.sync.pull(tablet.sync) == {}
+
+
+def test_learning_progress_conflict_keeps_the_highest_rate(tablet, phone):
+    tablet.database.add_learning_progress(tablet.child_id, "literacy", "basic characters", 1, 80)
+    phone.database.add_learning_progress(phone.child_id, "literacy", "basic characters", 1, 60)
+    tablet.database.add_learning_progress(tablet.child_id, "arithmetic", "counting", 1, 30)
+    phone.database.add_learning_progress(phone.child_id, "arithmetic", "counting", 1, 45)
+
+    tablet.sync.sync_with(phone.sync)
+    expected = {("literacy", "basic characters"): 80, ("arithmetic", "counting"): 45}
+    assert tablet.rates() == expected
+    assert phone.rates() == expected
+
+    # A lower rate recorded later does not win on the other device either
+    phone.database.add_learning_progress(phone.child_id, "literacy", "basic characters", 1, 50)
+    tablet.sync.sync_with(phone.sync)
+    assert tablet.rates() == phone.rates() == expected
+
+
+def test_session_closes_exactly_once(tablet, phone):
+    record_id = phone.play(0, close=False)
+    open_payloads = list(phone.sync.export_batches(peer_id=tablet.sync.device_id))
+    tablet.sync.pull(phone.sync)
+    assert tablet.query("SELECT duration FROM usage_records WHERE origin IS NOT NULL") == [(None,)]
+
+    phone.close(record_id, 20)
+    tablet.sync.pull(phone.sync)
+    tablet.sync.pull(phone.sync)
+    for payload in open_payloads:
+        tablet.sync.apply_batch(payload)  # a stale open copy never reopens it
+
+    ((duration,),) = tablet.query("SELECT duration FROM usage_records WHERE origin IS NOT NULL")
+    assert duration >= 20 * 60
+    assert tablet.query("SELECT total_duration, session_count FROM usage_daily_rollup") == [(duration, 1)]
+    assert tablet.database.get_usage_statistics(tablet.child_id)['total_usage_duration'] == duration
+
+
+def test_rows_received_from_a_peer_are_not_echoed_back(tablet, phone):
+    tablet.database.add_learning_progress(tablet.child_id, "literacy", "basic characters", 1, 80)
+    phone.database.add_learning_progress(phone.child_id, "literacy", "basic characters", 1, 60)
+    habit_id = tablet.database.add_habit(tablet.child_id, "brush teeth", "daily")
+    tablet.database.record_habit_completion(habit_id, "completed")
+    tablet.play(20)
+    phone.sync.pull(tablet.sync)
+
+    def exported(peer_id):
+        rows = {}
+        for payload in phone.sync.export_batches(peer_id=peer_id):
+            for table, entry in decode_batch(payload)['tables'].items():
+                rows[table] = rows.get(table, 0) + len(entry['rows'])
+        return rows
+
+    everything = exported(None)
+    assert all(everything.get(table) for table in ('learning_progress', 'habit_completion_records', 'usage_records'))
+    to_tablet = exported(tablet.sync.device_id)
+    assert not any(to_tablet.get(table) for table in ('learning_progress', 'habit_completion_records',
+                                                        'usage_records', 'habit_formation'))
+    assert tablet.sync.pull(phone.sync).get('learning_progress', 0) == 0
+
+
+def test_rollup_matches_raw_records_after_sync(tablet, phone):
+    tablet.play(10)
+    tablet.play(25)
+    phone.play(15)
+    open_record = phone.play(0, close=False)
+    phone.database.add_usage_records_bulk([
+        (phone.child_id, phone.resource_id, 'play', '2024-03-01 10:00:00', '2024-03-01 10:10:00', 600, 'completed'),
+        (phone.child_id, None, 'browse', '2024-03-01 11:00:00', '2024-03-01 11:05:00', 300, 'interrupted'),
+    ])
+
+    tablet.sync.sync_with(phone.sync)
+    phone.close(open_record, 5)
+    tablet.sync.sync_with(phone.sync)
+    tablet.sync.sync_with(phone.sync)
+
+    for device in (tablet, phone):
+        assert device.query("SELECT COUNT(*) FROM usage_records") == [(6,)]
+        assert device.query("SELECT * FROM usage_daily_rollup ORDER BY 1, 2, 3, 4") == \
+            device.query(ROLLUP_FROM_RECORDS_SQL)
+    assert tablet.database.get_usage_statistics(tablet.child_id, '2024-03-01') == \
+        phone.database.get_usage_statistics(phone.child_id, '2024-03-01')
+
+
+def test_applied_rows_are_published_on_the_change_feed(tablet, phone):
+    tablet.database.add_learning_progress(tablet.child_id, "literacy", "basic characters", 1, 80)
+    habit_id = tablet.database.add_habit(tablet.child_id, "brush teeth", "daily")
+    tablet.database.record_habit_completion(habit_id, "completed")
+    record_id = tablet.play(0, close=False)
+    payloads = list(tablet.sync.export_batches(peer_id=phone.sync.device_id))
+
+    events = []
+    phone.database.changes.subscribe(events.append,
+                                     tables=['usage_records', 'learning_progress', 'habit_completion_records'])
+    for payload in payloads:
+        phone.sync.apply_batch(payload)
+    assert sorted((event.table, event.op) for event in events) == [
+        ('habit_completion_records', 'insert'), ('learning_progress', 'upsert'), ('usage_records', 'insert')]
+    for event in events:
+        key = phone.query(f"SELECT {event.primary_key} FROM {event.table} WHERE origin IS NOT NULL") \
+            if event.table != 'learning_progress' else [(event.primary_key,)]
+        assert key == [(event.primary_key,)]
+    progress = next(event for event in events if event.table == 'learning_progress')
+    assert (progress.row['child_id'], progress.row['completion_rate']) == (phone.child_id, 80)
+
+    # Replaying changes nothing, so nothing is published
+    del events[:]
+    for payload in payloads:
+        phone.sync.apply_batch(payload)
+    assert events == []
+
+    # Closing the session on the sender closes the copy
+    tablet.close(record_id, 20)
+    phone.sync.pull(tablet.sync)
+    (closed,) = events
+    assert (closed.table, closed.op, closed.changed_columns) == \
+        ('usage_records', 'update', ('end_time', 'duration', 'completion_status'))
+    assert closed.row['duration'] >= 20 * 60
+
+
+def test_rolled_back_batch_publishes_nothing(tablet, phone):
+    habit_id = tablet.database.add_habit(tablet.child_id, "brush teeth", "daily")
+    tablet.database.record_habit_completion(habit_id, "completed")
+    tablet.play(20)
+    tablet.database.add_learning_progress(tablet.child_id, "literacy", "basic characters", 1, 80)
+    connection = sqlite3.connect(phone.database.database_path)
+    connection.execute("""CREATE TRIGGER reject_progress BEFORE INSERT ON learning_progress
+                          BEGIN SELECT RAISE(ABORT, 'rejected'); END""")
+    connection.close()
+
+    events = []
+    phone.database.changes.subscribe(events.append)
+    payloads = list(tablet.sync.export_batches(peer_id=phone.sync.device_id))
+    assert len(payloads) == 1
+    assert phone.sync.apply_batch(payloads[0]) is None
+    assert events == []
+    assert phone.query("SELECT COUNT(*) FROM usage_records WHERE origin IS NOT NULL") == [(0,)]